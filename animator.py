@@ -1,281 +1,890 @@
 import os
 import subprocess
+import concurrent.futures
 import datetime
+import tempfile
+import functools
+import glob
+import re
 import sys
+import time
 import json
 import shutil
+import logging
+
+from render_cache import RenderCache, get_manim_version
+from render_daemon import RenderWorkerPool
+import tex_cache
+from deduplicator import Deduplicator
+from manim_process import run_manim
+from contact_sheet import build_contact_sheet
+from video_assembly import concat_videos
+from render_plan import RenderPlan, TimingLog, TimingModel, estimate_frames, timing_key
+from render_journal import RenderJournal
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Pasta de resolução que o Manim cria para cada flag de qualidade
+QUALITY_DIRS = {
+    "-ql": "480p15",
+    "-qm": "720p30",
+    "-qh": "1080p60",
+    "-qp": "1440p60",
+    "-qk": "2160p60",
+}
+
+# Módulo de cena genérico: todas as equações são renderizadas a partir dele (ver generic_scene.py)
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+GENERIC_SCENE_FILE = os.path.join(PROJECT_DIR, "generic_scene.py")
+GENERIC_SCENE_MODULE = "generic_scene"
+# Pré-compilação do LaTeX de um documento inteiro em uma execução (ver tex_precompile.py)
+TEX_PRECOMPILE_FILE = os.path.join(PROJECT_DIR, "tex_precompile.py")
+# Equações por documento pré-compilado quando a origem das equações não é conhecida
+PRECOMPILE_CHUNK_SIZE = 300
+# Variáveis de ambiente lidas pelo módulo genérico (mesmos nomes de generic_scene.py,
+# que não é importado aqui porque carregaria o Manim)
+SCENE_DATA_FILE_ENV = "NIV_SCENE_DATA_FILE"
+SCENE_CLASSES_ENV = "NIV_SCENE_CLASSES"
+TEX_CACHE_DIR_ENV = "NIV_TEX_CACHE_DIR"
+TEX_CACHE_MAX_BYTES_ENV = "NIV_TEX_CACHE_MAX_BYTES"
+# Tentativas de criar um arquivo em temp/ quando outro processo remove a pasta vazia no meio
+TEMP_CREATE_ATTEMPTS = 20
+
+
+def _retry_temp_create(create):
+    # Várias execuções (ex: shards na mesma máquina) compartilham temp/ e cada uma remove as
+    # pastas vazias ao terminar (remove_empty_dirs), então uma pasta recém-criada pode sumir
+    # antes de receber o seu conteúdo; nesse caso ela é criada de novo.
+    for attempt in range(1, TEMP_CREATE_ATTEMPTS + 1):
+        try:
+            return create()
+        except FileNotFoundError:
+            if attempt == TEMP_CREATE_ATTEMPTS:
+                raise
+
+
+def make_temp_dir(path):
+    """Cria a pasta (ex: a pasta de mídia de um job em temp/media/) e devolve o seu caminho."""
+    def create():
+        os.makedirs(path, exist_ok=True)
+        return path
+    return _retry_temp_create(create)
+
+
+def make_temp_file(prefix, suffix, temp_dir="temp"):
+    """
+    tempfile.mkstemp em temp_dir, criando a pasta.
+
+    Returns:
+        tuple: (descritor, caminho), como tempfile.mkstemp.
+    """
+    def create():
+        os.makedirs(temp_dir, exist_ok=True)
+        return tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=temp_dir)
+    return _retry_temp_create(create)
+
+
+def remove_empty_dirs(*paths):
+    """
+    Remove as pastas vazias, da mais interna para a mais externa (ex: 'temp/media', 'temp').
+    O os.rmdir é tentado direto, sem conferir antes: uma pasta que outro processo já removeu é
+    ignorada, e uma que recebeu arquivos de outro processo fica, junto com as que a contêm.
+    """
+    for path in paths:
+        try:
+            os.rmdir(path)
+            logger.debug(f"Pasta temporária '{path}' removida.")
+        except FileNotFoundError:
+            continue
+        except OSError:
+            return
 
 class Animator:
-    def __init__(self):
-        print("Animator inicializado.")
+    def __init__(self, quality="-ql", cache_dir=".render_cache", cache_max_size_mb=2048,
+                 render_workers=1, render_timeout=None, render_retries=0, batch_size=1,
+                 render_backend="subprocess", worker_max_jobs=50,
+                 tex_cache_dir=".tex_cache", tex_cache_max_size_mb=512, deduplicate=False,
+                 manim_verbosity="INFO", render_log_dir="render_logs", log_tail_lines=200,
+                 progress_callback=None, preview=False, assemble_documents=False, timings_path=".render_timings.json",
+                 precompile_tex=False, journal_path=None, resume=False):
+        """
+        Args:
+            quality (str): Flag de qualidade do Manim (ver QUALITY_DIRS).
+            cache_dir (str): Pasta do cache de vídeos. Se None, o cache é desativado.
+            cache_max_size_mb (int): Tamanho máximo do cache; os vídeos menos usados são removidos.
+            render_workers (int): Número de processos do Manim executados em paralelo.
+            render_timeout (float): Tempo máximo em segundos de cada renderização (None = sem limite).
+            render_retries (int): Quantas vezes uma renderização que falhou é repetida.
+            batch_size (int): Número de equações renderizadas por invocação do Manim. Com
+                              batch_size > 1 cada lote é renderizado por um único processo,
+                              com uma classe de cena por equação, pagando a inicialização do
+                              Manim uma só vez.
+            render_backend (str): "subprocess" (um processo do Manim por cena ou lote) ou
+                                  "daemon" (pool de workers que importam o Manim uma vez e
+                                  recebem os jobs por pipe; ver render_daemon.py).
+            worker_max_jobs (int): No backend "daemon", jobs atendidos por worker antes de ele ser reciclado.
+            tex_cache_dir (str): Cache de SVGs do LaTeX compartilhado entre execuções e workers
+                                 (ver tex_cache.py). Se None, cada cena compila seus próprios SVGs.
+            tex_cache_max_size_mb (int): Tamanho máximo do cache de SVGs.
+            deduplicate (bool): Se True, generate_all_scenes renderiza uma única vez cada grupo de
+                                equações idênticas e distribui o vídeo para os demais IDs
+                                (ver deduplicator.py).
+            manim_verbosity (str): Verbosidade do processo do Manim ("DEBUG", "INFO", "WARNING", ...).
+                                   Os eventos de animação concluída e arquivo gravado exigem "INFO".
+            render_log_dir (str): Pasta onde o log completo de uma renderização que falhou é salvo.
+                                  Renderizações bem-sucedidas não deixam log.
+            log_tail_lines (int): Linhas finais da saída do Manim mantidas em memória por renderização.
+            progress_callback (callable): Recebe (rótulo, evento) para cada evento de progresso
+                                          (ver manim_process.parse_event). Por padrão, as animações
+                                          concluídas e os arquivos gravados são exibidos.
+            preview (bool): Se True, renderiza apenas o último quadro de cada equação como PNG
+                            (save_last_frame do Manim), sem codificar vídeo. As imagens ficam em
+                            output_dir/images/ e não passam pelo cache de vídeos.
+            assemble_documents (bool): Se True, generate_all_scenes junta os vídeos de cada arquivo
+                                       .tex, na ordem do documento, em output_dir/documents/
+                                       (ver assemble_document_videos).
+            timings_path (str): JSON com os tempos dos jobs já renderizados, usado para estimar a
+                                duração dos próximos (ver render_plan.py). Se None, os tempos não
+                                são gravados e as estimativas usam os coeficientes padrão.
+            precompile_tex (bool): Se True, antes de renderizar, as equações de cada arquivo .tex
+                                   são compiladas juntas (um latex e um dvisvgm por documento) e os
+                                   SVGs vão para o cache de tex_cache_dir (ver tex_precompile.py).
+            journal_path (str): Journal JSONL onde o estado de cada job (queued, running, done,
+                                failed) é acrescentado assim que muda (ver render_journal.py).
+                                Se None, nenhum journal é gravado.
+            resume (bool): Se True, generate_all_scenes pula as equações que o journal registra
+                           como concluídas (mesmo conteúdo e saída ainda presente), continuando
+                           uma execução interrompida. Requer journal_path.
+        """
+        logger.debug("Animator inicializado.")
         # Dicionários para manter o controle dos arquivos e dados
-        self.generated_scene_files = {} # {eq_id: path_to_temp_scene.py}
+        self.scene_jobs = []            # IDs renderizados um por processo a partir de generic_scene.py
         self.temp_json_data_file = None # Path para o arquivo JSON global de dados
         self.equations_data = {}        # Dados das equações do Reader (para uso interno)
         self.animation_setups = {}      # Setups do Designer (para uso interno)
+        self.quality = quality
+        self.render_cache = RenderCache(cache_dir, cache_max_size_mb * 1024 * 1024) if cache_dir else None
+        self.cache_keys = {}            # {eq_id: chave do cache} das cenas pendentes de renderização
+        self.render_workers = render_workers
+        self.render_timeout = render_timeout
+        self.render_retries = render_retries
+        self.batch_size = batch_size
+        self.generated_batches = {}     # {nome_do_lote: {"scenes": {eq_id: classe}}}
+        self.rendered_ids = []          # IDs renderizados com sucesso na última chamada de _render_all_equations_
+        self.render_backend = render_backend
+        self.worker_max_jobs = worker_max_jobs
+        self.render_pool = None         # RenderWorkerPool, criado sob demanda no backend "daemon"
+        self.daemon_jobs = []           # IDs a renderizar pelo pool de workers
+        self.tex_cache_dir = os.path.abspath(tex_cache_dir) if tex_cache_dir else None
+        self.tex_cache_max_size_mb = tex_cache_max_size_mb
+        self.deduplicator = Deduplicator() if deduplicate else None
+        self.manim_verbosity = manim_verbosity
+        self.render_log_dir = render_log_dir
+        self.log_tail_lines = log_tail_lines
+        self.progress_callback = progress_callback or self._log_progress
+        self.preview = preview
+        self.assemble_documents = assemble_documents
+        self._render_event_state = {}   # {rótulo: instantes dos eventos} para as métricas por fase
+        self.timing_log = TimingLog(timings_path) if timings_path else None
+        self.precompile_tex = precompile_tex
+        self._tex_stats_snapshot = None # Posição dos logs do cache de SVGs no início da execução
+        self.journal = RenderJournal(journal_path) if journal_path else None
+        self.resume = resume
+
+    def _build_scene_jobs(self, pending_equations):
+        """
+        Registra uma renderização por equação. Nenhum arquivo .py é criado: todas usam o
+        módulo genérico generic_scene.py, que recebe o eq_id em tempo de execução.
 
-    def _build_temp_scenes(self, equations_data_from_reader, template_dir="templates", template_name="scene_template.py"):
+        Returns:
+            list: self.scene_jobs
         """
-        Cria cópias do template de cena Manim para cada bloco de equação.
+        self.scene_jobs = list(pending_equations)
+        logger.info(f"{len(self.scene_jobs)} cena(s) de equação registradas para renderização")
+        return self.scene_jobs
 
-        Args:
-            equations_data_from_reader (dict): Dicionário de equações do Reader.
-            template_dir (str): Diretório onde o template está localizado.
-            template_name (str): Nome do arquivo de template.
+    def _build_batch_scenes(self, pending_equations):
+        """
+        Agrupa as equações em lotes de self.batch_size. Cada lote é renderizado em uma única
+        invocação do Manim, com uma classe de cena por equação criada pelo módulo genérico.
 
         Returns:
-            dict: Um dicionário onde a chave é o ID do bloco da equação e o valor
-                  é o caminho completo para o arquivo de cena Manim temporário criado.
+            dict: self.generated_batches
         """
-        self.generated_scene_files = {} # Resetar para cada nova chamada
-        
-        temp_dir = "temp"
-        os.makedirs(temp_dir, exist_ok=True)
-        print(f"  Pasta de arquivos temporários '{temp_dir}/' garantida.")
-        
-        template_full_path = os.path.join(template_dir, template_name)
-        if not os.path.exists(template_full_path):
-            print(f"Erro: Arquivo de template '{template_full_path}' não encontrado. Nenhuma cena será criada.")
-            return {}
+        self.generated_batches = {}
+
+        logger.info(f"Agrupando as cenas em lotes de até {self.batch_size} equações")
+
+        eq_ids = list(pending_equations)
+        for batch_index, start in enumerate(range(0, len(eq_ids), self.batch_size)):
+            batch_name = f"scene_batch_{batch_index:04d}"
+            used_class_names = set()
+            scenes = {eq_id: self._scene_class_name(eq_id, used_class_names) for eq_id in eq_ids[start:start + self.batch_size]}
+            self.generated_batches[batch_name] = {"scenes": scenes}
+            logger.debug(f"Lote '{batch_name}' com {len(scenes)} cena(s).")
+
+        logger.info(f"Total de {len(self.generated_batches)} lotes criados.")
+        return self.generated_batches
+
+    def _scene_class_name(self, eq_id, used_class_names):
+        # Nome de classe Python válido e único dentro do módulo do lote
+        class_name = "Scene_" + re.sub(r'\W', '_', eq_id)
+        candidate = class_name
+        suffix = 1
+        while candidate in used_class_names:
+            suffix += 1
+            candidate = f"{class_name}_{suffix}"
+        used_class_names.add(candidate)
+        return candidate
+
+    def _scene_base_name(self, eq_id):
+        # Gerar nome de arquivo seguro para cada cena
+        safe_eq_id = eq_id.replace('.', '_').replace('-', '_').replace(':', '_').replace(' ', '_')
+        return f"scene_{safe_eq_id}"
+
+    def _expected_video_path(self, eq_id, output_dir):
+        """Caminho onde o Manim grava o vídeo da cena de eq_id."""
+        base_name = self._scene_base_name(eq_id)
+        return os.path.join(output_dir, 'videos', base_name, QUALITY_DIRS.get(self.quality, '480p15'), f'{base_name}.mp4')
+
+    def _expected_image_path(self, eq_id, output_dir):
+        """Caminho do PNG de pré-visualização da cena de eq_id."""
+        return os.path.join(output_dir, 'images', f'{self._scene_base_name(eq_id)}.png')
+
+    def _expected_output_path(self, eq_id, output_dir):
+        """Arquivo final da cena de eq_id: PNG no modo de pré-visualização, senão o vídeo."""
+        if self.preview:
+            return self._expected_image_path(eq_id, output_dir)
+        return self._expected_video_path(eq_id, output_dir)
+
+    def _manim_output_flags(self):
+        # -s: o Manim pula as animações e salva só o último quadro como PNG
+        return [self.quality, "-s"] if self.preview else [self.quality]
+
+    def _manim_command(self, scene_class_names, media_dir, output_name=None):
+        """Linha de comando do Manim para as classes do módulo genérico (output_name só com uma cena)."""
+        return [
+            sys.executable, "-m", "manim",
+            GENERIC_SCENE_FILE,
+            *scene_class_names,
+            "--media_dir", os.path.join(os.getcwd(), media_dir),
+            *(["-o", output_name] if output_name else []),
+            *self._manim_output_flags(),
+            "--disable_caching",
+            "--verbosity", self.manim_verbosity,
+        ]
 
-        print("\n--- Construindo arquivos de cena Manim temporários a partir das equações ---")
-        
-        for eq_id, _ in equations_data_from_reader.items():
-            # Gerar nome de arquivo seguro e único para cada cena
-            safe_eq_id = eq_id.replace('.', '_').replace('-', '_').replace(':', '_').replace(' ', '_')
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            temp_scene_file_name = f"scene_{safe_eq_id}_{timestamp}.py"
-            temp_scene_full_path = os.path.join(temp_dir, temp_scene_file_name)
+    def _find_produced_output(self, media_dir, output_name):
+        """Arquivo gravado pelo Manim para output_name (nome passado em -o ou da classe), ou None."""
+        if self.preview:
+            images_dir = os.path.join(media_dir, 'images', GENERIC_SCENE_MODULE)
+            # Sem -o, o Manim acrescenta a versão ao nome do PNG (ex: Scene_x_ManimCE_v0.18.0.png)
+            candidates = [os.path.join(images_dir, f'{output_name}.png')] + sorted(
+                glob.glob(os.path.join(glob.escape(images_dir), f'{glob.escape(output_name)}_ManimCE_v*.png')))
+        else:
+            candidates = [os.path.join(media_dir, 'videos', GENERIC_SCENE_MODULE, QUALITY_DIRS.get(self.quality, '480p15'), f'{output_name}.mp4')]
+        return next((path for path in candidates if os.path.exists(path)), None)
 
-            try:
-                shutil.copyfile(template_full_path, temp_scene_full_path)
-                print(f"  Template para '{eq_id}' copiado para '{temp_scene_full_path}'.")
-                self.generated_scene_files[eq_id] = temp_scene_full_path
-            except Exception as e:
-                print(f"Erro ao copiar template para '{eq_id}': {e}")
-                continue # Continua para a próxima equação mesmo com erro
+    def _serve_from_cache(self, output_dir):
+        """
+        Coloca no output_dir os vídeos já presentes no cache e devolve apenas as equações
+        que ainda precisam ser renderizadas. Guarda as chaves em self.cache_keys para que
+        os vídeos novos sejam adicionados ao cache após a renderização.
+
+        Returns:
+            dict: {eq_id: linhas} das equações sem vídeo em cache.
+        """
+        self.cache_keys = {}
+        if self.render_cache is None or self.preview:
+            return dict(self.equations_data)
+
+        cache_context = self._render_cache_context()
+        pending = {}
+        with METRICS.timer("stage_seconds", stage="cache_lookup"):
+            for eq_id, eq_lines in self.equations_data.items():
+                key = self._render_cache_key(eq_lines, self.animation_setups.get(eq_id, {}), cache_context)
+                if self.render_cache.materialize(key, self._expected_video_path(eq_id, output_dir)):
+                    logger.debug(f"Cache: vídeo de '{eq_id}' reaproveitado.")
+                    continue
+                self.cache_keys[eq_id] = key
+                pending[eq_id] = eq_lines
+        METRICS.inc("render_cache_total", len(self.equations_data) - len(pending), result="hit")
+        METRICS.inc("render_cache_total", len(pending), result="miss")
+
+        logger.info(f"Cache de renderização: {len(self.equations_data) - len(pending)} reaproveitada(s), {len(pending)} a renderizar.")
+        return pending
+
+    def _render_cache_context(self):
+        # O código da cena faz parte da chave: mudar a animação invalida os vídeos antigos
+        try:
+            with open(GENERIC_SCENE_FILE, 'r', encoding='utf-8') as f:
+                template_content = f.read()
+        except OSError:
+            template_content = ""
+        return template_content, get_manim_version()
 
-        print(f"Total de {len(self.generated_scene_files)} arquivos de cena temporários criados.")
-        return self.generated_scene_files # Retorna os caminhos dos arquivos criados
+    def _render_cache_key(self, eq_lines, setup, cache_context):
+        template_content, manim_version = cache_context
+        return RenderCache.make_key(eq_lines, setup, template_content, manim_version, [self.quality])
 
-    def _inject_content(self, scene_file_path, eq_id, equations_data, animation_setups, temp_json_data_file):
+    def _write_scene_data(self, pending_equations, temp_dir="temp"):
         """
-        Injeta o conteúdo LaTeX da equação e os dados de setup no arquivo de cena Manim temporário.
+        Grava em um único JSON os dados das equações pendentes. O módulo de cena genérico
+        recebe o caminho desse arquivo e lê apenas o bloco de cada cena.
 
-        Args:
-            scene_file_path (str): Caminho para o arquivo de cena Manim temporário.
-            eq_id (str): O ID único do bloco da equação a ser injetado.
-            equations_data (dict): Dicionário completo de equações do Reader.
-            animation_setups (dict): Dicionário completo de setups de animação do Designer.
-            temp_json_data_file (str): Caminho para o arquivo JSON global de dados.
         Returns:
-            bool: True se a injeção foi bem-sucedida, False caso contrário.
+            bool: True se o arquivo foi gravado.
         """
+        if not pending_equations:
+            logger.warning("Nenhuma cena para renderizar.")
+            return False
+        if not self.equations_data or not self.animation_setups:
+            logger.warning("Dados de equações ou setups ausentes. Não é possível popular cenas.")
+            return False
+
         try:
-            with open(scene_file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            self.temp_json_data_file = self._dump_scene_data(self.equations_data, self.animation_setups, pending_equations, temp_dir)
+        except OSError as e:
+            logger.error(f"Erro ao gravar os dados das cenas: {e}")
+            return False
+        logger.debug(f"Dados de {len(pending_equations)} equação(ões) salvos em: {self.temp_json_data_file}")
+        return True
+
+    def _dump_scene_data(self, equations_data, animation_setups, pending_equations, temp_dir="temp"):
+        """Grava o JSON de dados das equações pendentes e devolve o seu caminho."""
+        # O registro padrão dos setups é gravado uma vez; cada equação leva só os campos que diferem dele.
+        # As linhas da equação já estão em equations_data e não são repetidas no setup.
+        setup_defaults = {key: value for key, value in getattr(animation_setups, "defaults", {}).items()
+                          if key != "equation_latex_lines" and value is not None}
+        data_to_pass = {
+            "equations_data": {eq_id: equations_data[eq_id] for eq_id in pending_equations},
+            "setup_defaults": setup_defaults,
+            "animation_setups": {eq_id: self._compact_setup(animation_setups.get(eq_id, {}), setup_defaults)
+                                 for eq_id in pending_equations},
+        }
+        # Nome único por execução: duas execuções simultâneas nunca compartilham o arquivo
+        fd, data_file = make_temp_file("manim_data_", ".json", temp_dir)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data_to_pass, f)
+        return data_file
+
+    @staticmethod
+    def _compact_setup(setup, setup_defaults):
+        return {key: value for key, value in setup.items()
+                if key != "equation_latex_lines" and (key not in setup_defaults or setup_defaults[key] != value)}
+
+    def _scene_env(self, scene_classes, data_file=None):
+        """Variáveis de ambiente que dizem ao módulo genérico quais cenas expor e onde estão os dados."""
+        env = dict(os.environ)
+        env[SCENE_DATA_FILE_ENV] = os.path.abspath(data_file or self.temp_json_data_file)
+        env[SCENE_CLASSES_ENV] = json.dumps(scene_classes)
+        if self.tex_cache_dir:
+            env[TEX_CACHE_DIR_ENV] = self.tex_cache_dir
+            env[TEX_CACHE_MAX_BYTES_ENV] = str(self.tex_cache_max_size_mb * 1024 * 1024)
+        return env
+
+    def _render_scene(self, eq_id, output_dir, timeout=None, media_dir=None):
+        """
+        Renderiza a cena de uma equação a partir do módulo de cena genérico.
 
-            # --- Injetar caminho do JSON de dados ---
-            json_data_filename_in_scene = repr(os.path.basename(temp_json_data_file))
-            content = content.replace(
-                "MANIM_DATA_FILE_PLACEHOLDER_FILLED", json_data_filename_in_scene
-            )
+        Args:
+            eq_id (str): ID do bloco da equação (presente no JSON de dados).
+            output_dir (str): Diretório onde o vídeo final será salvo.
+            timeout (float): Tempo máximo em segundos para o processo do Manim (None = sem limite).
+            media_dir (str): Pasta de mídia exclusiva desta renderização. Se informada, o Manim
+                             trabalha nela e apenas o vídeo final é movido para o output_dir.
+        """
+        output_file_name_base = self._scene_base_name(eq_id)
+        logger.debug(f"Renderizando cena: '{output_file_name_base}'")
 
-            # --- Gerar e injetar lógica de animação para o bloco específico ---
-            # Esta lógica usará o 'eq_id' para buscar os dados de 'equations_data' e 'animation_setups'
-            # dentro da cena Manim, que por sua vez lerá do JSON global.
-            
-            animation_logic_for_block = f"""
-        # Lógica de animação para o bloco: {eq_id}
-        current_block_id = "{eq_id}"
-        
-        if current_block_id in equations_data and current_block_id in animation_setups:
-            eq_lines = equations_data[current_block_id]
-            setup = animation_setups[current_block_id]
+        scene_class_name = self._scene_class_name(eq_id, set())
+        media_dir = media_dir or output_dir
 
-            print(f"  Animando bloco na cena: {{current_block_id}}")
-            
-            manim_latex_string = "\\n".join(eq_lines)
-            
-            math_tex_obj = MathTex(
-                manim_latex_string,
-                color=setup.get("color", WHITE)
-            ).scale(setup.get("scale", 1.0))
-
-            position = setup.get("position")
-            if position:
-                if isinstance(position, list) and len(position) == 3:
-                     math_tex_obj.move_to(position)
-                else:
-                     print(f"Aviso: Posição inválida para {{current_block_id}}: {{position}}. Usando padrão.")
-
-
-            self.wait(setup.get("delay_before", 0.5))
-
-            animation_type = setup.get("animation_type", "Write")
-            duration = setup.get("duration", 1.5)
-
-            if animation_type == "Write":
-                self.play(Write(math_tex_obj, run_time=duration))
-            elif animation_type == "FadeIn":
-                self.play(FadeIn(math_tex_obj, run_time=duration))
-            elif animation_type == "Create":
-                self.play(Create(math_tex_obj, run_time=duration))
-            elif animation_type == "Transform":
-                print(f"Aviso: Tipo de animação '{{animation_type}}' requer lógica mais complexa. Usando Write.")
-                self.play(Write(math_tex_obj, run_time=duration))
-            else:
-                print(f"Aviso: Tipo de animação '{{animation_type}}' não reconhecido. Usando Write.")
-                self.play(Write(math_tex_obj, run_time=duration))
+        manim_command = self._manim_command([scene_class_name], media_dir, output_name=output_file_name_base)
 
-            self.wait(setup.get("delay_after", 1.0))
+        logger.debug(f"Executando comando Manim: {' '.join(manim_command)}")
+        log_path = os.path.join(self.render_log_dir, f"{output_file_name_base}.log")
 
-            if not setup.get("show_equation_after", True):
-                self.play(FadeOut(math_tex_obj))
-        else:
-            print(f"Aviso: Bloco '{{current_block_id}}' não encontrado nos dados ou setups da cena. Nenhuma animação.")
-        
-        self.wait(1) # Espera final para esta cena individual
-"""
-            placeholder_string = "# --- INICIO_BLOCO_DE_ANIMACAO_DO_MANIM ---\n        # --- FIM_BLOCO_DE_ANIMACAO_DO_MANIM ---"
-            if placeholder_string not in content:
-                print(f"Erro: Placeholder '{placeholder_string}' não encontrado no template da cena para '{eq_id}'.")
+        self._render_event_state[eq_id] = {"start": time.monotonic()}
+        try:
+            run_manim(manim_command, env=self._scene_env({scene_class_name: eq_id}), timeout=timeout,
+                      on_event=functools.partial(self._handle_render_event, eq_id),
+                      tail_lines=self.log_tail_lines, failure_log_path=log_path)
+
+            logger.debug("Comando Manim executado com sucesso!")
+            # O Manim grava o arquivo na pasta do módulo genérico; ele é movido para o caminho da equação
+            produced_path = self._find_produced_output(media_dir, output_file_name_base)
+            if produced_path is None:
+                logger.error(f"O Manim terminou sem gravar a saída de '{eq_id}'.")
                 return False
-                
-            content = content.replace(placeholder_string, animation_logic_for_block)
-
-            # --- Escrever o conteúdo modificado de volta no arquivo ---
-            with open(scene_file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            print(f"  Conteúdo injetado no arquivo de cena: {scene_file_path}")
-            return True
+            final_video_path = self._expected_output_path(eq_id, output_dir)
+            os.makedirs(os.path.dirname(final_video_path), exist_ok=True)
+            shutil.move(produced_path, final_video_path)
+            remove_empty_dirs(os.path.dirname(produced_path))
+            logger.debug(f"Verifique o resultado em: {final_video_path}")
+            return True # Retorna True para indicar sucesso
 
+        except subprocess.TimeoutExpired as e:
+            logger.error(f"A renderização excedeu o tempo limite de {e.timeout} s e foi interrompida.")
+            self._log_failure(e.output, log_path)
+            return False
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Erro ao renderizar a animação (Manim falhou): {e}")
+            self._log_failure(e.output, log_path)
+            return False
+        except FileNotFoundError:
+            logger.error("O comando 'manim' (ou 'python') não foi encontrado.")
+            logger.error("Certifique-se de que o Manim CLI e o Python estão acessíveis no PATH do seu ambiente virtual.")
+            return False
         except Exception as e:
-            print(f"Erro ao injetar conteúdo no arquivo de cena '{scene_file_path}' para '{eq_id}': {e}")
+            logger.error(f"Um erro inesperado ocorreu: {e}")
             return False
+        finally:
+            self._render_event_state.pop(eq_id, None)
 
-    def _populate_scenes(self):
+    def _handle_render_event(self, label, event):
         """
-        Popula os arquivos de cena Manim temporários com o conteúdo e setups das equações.
-        Assume que self.generated_scene_files já foi preenchido por _build_temp_scenes.
+        Converte os eventos de progresso de um processo do Manim em métricas por fase e os
+        repassa ao progress_callback. Fases: 'startup' (até o primeiro quadro: importação do
+        Manim, construção da cena e compilação LaTeX), 'animation' (quadros e arquivo parcial de
+        cada animação) e 'combine' (junção dos arquivos parciais no vídeo final).
         """
-        if not self.generated_scene_files:
-            print("Aviso: Nenhum arquivo de cena temporário para popular.")
-            return False
-        if not self.equations_data or not self.animation_setups:
-            print("Aviso: Dados de equações ou setups ausentes. Não é possível popular cenas.")
+        state = self._render_event_state.setdefault(label, {})
+        now = event["time"]
+        if event["type"] == "progress":
+            if "first_progress" not in state and "start" in state:
+                METRICS.observe("render_phase_seconds", now - state["start"], phase="startup")
+            state.setdefault("first_progress", now)
+            state.setdefault(("animation", event["animation"]), now)
+        elif event["type"] == "animation_done":
+            animation_start = state.pop(("animation", event["animation"]), None)
+            if animation_start is not None:
+                METRICS.observe("render_phase_seconds", now - animation_start, phase="animation")
+            state["last_animation_done"] = now
+        elif event["type"] == "file_written":
+            last_done = state.pop("last_animation_done", None)
+            if last_done is not None:
+                METRICS.observe("render_phase_seconds", now - last_done, phase="combine")
+        self.progress_callback(label, event)
+
+    def _log_progress(self, label, event):
+        """Tratador padrão dos eventos de progresso: registra só os marcos, não cada quadro."""
+        if event["type"] == "animation_done":
+            logger.debug(f"[{label}] Animação {event['animation']} concluída.")
+        elif event["type"] == "file_written":
+            logger.debug(f"[{label}] Arquivo gravado: {event['path']}")
+
+    def _log_failure(self, tail, log_path):
+        logger.error(f"Últimas linhas da saída do Manim:\n{tail}")
+        if os.path.exists(log_path):
+            logger.error(f"Log completo salvo em: {log_path}")
+
+    def _render_all_equations_(self, output_dir):
+        """
+        Renderiza todas as cenas registradas (cenas individuais, lotes e jobs do pool).
+
+        Com self.render_workers > 1 os jobs são renderizados em paralelo, cada um em um
+        processo do Manim com pasta de mídia própria (os arquivos parciais de uma cena
+        nunca sobrescrevem os de outra). Cada job tem tempo limite e número de tentativas
+        próprios, e a falha de um job não interrompe os demais.
+        """
+        self.rendered_ids = []
+        if not self.scene_jobs and not self.generated_batches and not self.daemon_jobs:
+            logger.warning("Nenhuma cena para renderizar. Certifique-se de que as cenas foram registradas e os dados gravados.")
             return False
-            
-        print("\n--- Populando arquivos de cena Manim com conteúdo e setups ---")
 
-        # Gerar o arquivo JSON de dados UMA VEZ para todos os blocos
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.temp_json_data_file = os.path.join("temp", f"manim_data_{timestamp}.json")
-        
-        data_to_pass = {
-            "equations_data": self.equations_data,
-            "animation_setups": self.animation_setups
-        }
-        with open(self.temp_json_data_file, 'w', encoding='utf-8') as f:
-            json.dump(data_to_pass, f, indent=4)
-        print(f"  Dados globais de equações e setups salvos em: {self.temp_json_data_file}")
+        # Cada job: (rótulo, modo, IDs cobertos, função que devolve os IDs renderizados)
+        jobs = []
+        for eq_id in self.scene_jobs:
+            jobs.append((eq_id, "single", [eq_id], functools.partial(self._render_job, eq_id, output_dir)))
+        for batch_name, batch in self.generated_batches.items():
+            jobs.append((batch_name, "batch", list(batch["scenes"]), functools.partial(self._render_batch_job, batch_name, batch, output_dir)))
+        for eq_id in self.daemon_jobs:
+            jobs.append((eq_id, "daemon", [eq_id], functools.partial(self._render_daemon_job, eq_id, output_dir)))
+        self.daemon_jobs = []
+
+        # Os jobs mais longos começam primeiro: o pool atende os jobs na ordem de submissão, e um
+        # job longo deixado para o fim faria os demais workers esperarem ociosos
+        models = {}
+        estimates = [self._estimate_job(mode, eq_ids, models) for _, mode, eq_ids, _ in jobs]
+        order = sorted(range(len(jobs)), key=lambda index: estimates[index][1], reverse=True)
+
+        total_equations = sum(len(eq_ids) for _, _, eq_ids, _ in jobs)
+        workers = max(1, min(self.render_workers, len(jobs)))
+        self._isolate_media = workers > 1
+        logger.info(f"Iniciando a renderização de {total_equations} cenas de equação em {len(jobs)} job(s) ({workers} worker(s)), "
+                    f"estimativa: {sum(seconds for _, seconds in estimates):.0f} s somando os jobs")
+        os.makedirs(output_dir, exist_ok=True) # Garante o diretório de saída principal
 
+        if self.journal is not None:
+            self.journal.queued([(jobs[index][0], jobs[index][2]) for index in order],
+                                self._journal_keys([eq_id for _, _, eq_ids, _ in jobs for eq_id in eq_ids]))
+
+        start_time = time.monotonic()
+        failed_ids = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for index in order:
+                label, mode, eq_ids, render_fn = jobs[index]
+                futures[pool.submit(self._timed_job, mode, render_fn, (len(eq_ids), estimates[index][0]))] = (label, eq_ids)
+            for future in concurrent.futures.as_completed(futures):
+                label, eq_ids = futures[future]
+                try:
+                    rendered = future.result()
+                except Exception as e:
+                    logger.error(f"Erro inesperado no job '{label}': {e}")
+                    rendered = []
+                if self.journal is not None:
+                    self.journal.finished(eq_ids, rendered)
+                self.rendered_ids.extend(rendered)
+                failed_ids.extend(eq_id for eq_id in eq_ids if eq_id not in rendered)
+
+        # Remove a pasta das mídias isoladas se nenhum job deixou resíduos
+        remove_empty_dirs(os.path.join("temp", "media"))
+
+        if self.timing_log is not None:
+            self.timing_log.save()
+
+        successful_renders = len(self.rendered_ids)
+        elapsed = time.monotonic() - start_time
+        throughput = successful_renders / elapsed * 60 if elapsed > 0 else 0.0
+        METRICS.observe("stage_seconds", elapsed, stage="render")
+        METRICS.inc("render_equations_total", successful_renders, result="ok")
+        METRICS.inc("render_equations_total", len(failed_ids), result="failed")
+        logger.info(f"Renderização de todas as cenas concluída. {successful_renders} de {total_equations} renderizadas com sucesso.")
+        logger.info(f"Tempo total: {elapsed:.1f} s | Throughput: {throughput:.1f} equações/minuto")
+        if failed_ids:
+            logger.warning(f"Falharam: {', '.join(sorted(failed_ids))}")
+            self._warn_chronic_failures(failed_ids)
+        if self.tex_cache_dir:
+            # Só os eventos desde _prepare_scenes (inclui a pré-compilação do LaTeX)
+            tex_stats = tex_cache.read_stats(self.tex_cache_dir, since=self._tex_stats_snapshot)
+            tex_cache.rotate_stats(self.tex_cache_dir)
+            METRICS.set_gauge("tex_cache_hits", tex_stats["hits"])
+            METRICS.set_gauge("tex_cache_misses", tex_stats["misses"])
+            METRICS.set_gauge("latex_compile_seconds_total", tex_stats["compile_seconds"])
+            logger.info(f"Cache de SVGs do LaTeX nesta execução: {tex_stats['hits']} acerto(s), {tex_stats['misses']} falta(s) "
+                        f"({tex_stats['hit_rate']:.0%} de acerto), {tex_stats['compile_seconds']:.1f} s compilando LaTeX")
+        return successful_renders > 0
 
-        successful_injections = 0
-        for eq_id, scene_file_path in self.generated_scene_files.items():
-            if self._inject_content(scene_file_path, eq_id, self.equations_data, self.animation_setups, self.temp_json_data_file):
-                successful_injections += 1
-            else:
-                # Se a injeção falhar, remova o arquivo da lista de renderização
-                print(f"  Falha ao injetar conteúdo em '{scene_file_path}'. Removendo da fila de renderização.")
-                if os.path.exists(scene_file_path):
-                    os.remove(scene_file_path)
-                if eq_id in self.generated_scene_files:
-                    del self.generated_scene_files[eq_id]
-        
-        print(f"Total de {successful_injections} arquivos de cena populados com sucesso.")
-        return successful_injections > 0 # Retorna True se pelo menos um foi populado
+    def _timed_job(self, mode, render_fn, job_size=None):
+        """
+        Executa um job de renderização registrando sua duração e seu resultado nas métricas.
+        Com job_size = (cenas, quadros), o tempo de um job que renderizou todas as cenas é
+        gravado no timing_log para calibrar as próximas estimativas.
+        """
+        start_time = time.perf_counter()
+        rendered = []
+        try:
+            rendered = render_fn()
+            return rendered
+        finally:
+            elapsed = time.perf_counter() - start_time
+            METRICS.observe("render_job_seconds", elapsed, mode=mode)
+            METRICS.inc("render_jobs_total", mode=mode, result="ok" if rendered else "failed")
+            if self.timing_log is not None and job_size is not None and len(rendered) == job_size[0]:
+                self.timing_log.record(timing_key(mode, self.quality, self.preview), job_size[0], job_size[1], elapsed)
+
+    def _journal_keys(self, eq_ids):
+        """Chave de conteúdo de cada equação no journal: a mesma do cache de renderização."""
+        keys = {eq_id: self.cache_keys[eq_id] for eq_id in eq_ids if eq_id in self.cache_keys}
+        missing = [eq_id for eq_id in eq_ids if eq_id not in keys]
+        if missing:
+            cache_context = self._render_cache_context()
+            for eq_id in missing:
+                keys[eq_id] = self._render_cache_key(self.equations_data[eq_id], self.animation_setups.get(eq_id, {}), cache_context)
+        return keys
+
+    def _skip_completed(self, pending_equations, output_dir):
+        """Retira de pending_equations as equações que o journal registra como concluídas."""
+        if self.journal is None:
+            logger.warning("A retomada (resume=True) requer journal_path. Todas as equações serão renderizadas.")
+            return pending_equations
+        completed = {eq_id for eq_id in self.journal.completed(self._journal_keys(list(pending_equations)))
+                     if os.path.exists(self._expected_output_path(eq_id, output_dir))}
+        if completed:
+            logger.info(f"Retomada: {len(completed)} equação(ões) já concluída(s) no journal, "
+                        f"{len(pending_equations) - len(completed)} a renderizar.")
+        return {eq_id: eq_lines for eq_id, eq_lines in pending_equations.items() if eq_id not in completed}
+
+    def _warn_chronic_failures(self, failed_ids, min_runs=2):
+        if self.journal is None:
+            return
+        failed_ids = set(failed_ids)
+        chronic = [item for item in self.journal.failure_report(min_runs) if item["eq_id"] in failed_ids]
+        if chronic:
+            logger.warning(f"{len(chronic)} equação(ões) falham há {min_runs} ou mais execuções seguidas "
+                           f"(ver 'python render_journal.py {self.journal.path}'): "
+                           f"{', '.join(item['eq_id'] for item in chronic[:10])}{' ...' if len(chronic) > 10 else ''}")
+
+    def _estimate_job(self, mode, eq_ids, models):
+        """(quadros, segundos) estimados para um job; models guarda os modelos já calibrados por modo."""
+        model = models.get(mode)
+        if model is None:
+            model = models[mode] = self._timing_model(mode)
+        frames = sum(estimate_frames(self.animation_setups.get(eq_id, {}), self.quality, self.preview) for eq_id in eq_ids)
+        return frames, model.estimate(len(eq_ids), frames)
+
+    def _timing_model(self, mode):
+        if self.timing_log is not None:
+            return self.timing_log.model(mode, self.quality, self.preview)
+        return TimingModel.default(mode, self.quality, self.preview)
+
+    def _plan_jobs(self, pending_equations):
+        """Jobs (rótulo, modo, IDs) que _register_scenes criaria, sem gravar nenhum arquivo."""
+        eq_ids = list(pending_equations)
+        if self.render_backend == "daemon":
+            return [(eq_id, "daemon", [eq_id]) for eq_id in eq_ids]
+        if self.batch_size > 1:
+            return [(f"scene_batch_{batch_index:04d}", "batch", eq_ids[start:start + self.batch_size])
+                    for batch_index, start in enumerate(range(0, len(eq_ids), self.batch_size))]
+        return [(eq_id, "single", [eq_id]) for eq_id in eq_ids]
+
+    def plan_render(self, equations_data_from_reader, animation_setups_from_designer, output_dir="generated_animations_final"):
+        """
+        Dry-run de generate_all_scenes: monta os mesmos jobs (descontando o cache e a deduplicação)
+        e estima quadros e tempo de cada um, sem renderizar nem gravar arquivos.
 
+        Returns:
+            RenderPlan: Jobs na ordem em que seriam iniciados (os mais longos primeiro) e totais.
+        """
+        equations, setups = equations_data_from_reader, animation_setups_from_designer
+        if self.deduplicator is not None:
+            equations, setups = self.deduplicator.deduplicate(equations, setups)
 
-    def _render_scene(self, scene_file_path, output_dir):
+        pending = list(equations)
+        if self.render_cache is not None and not self.preview:
+            cache_context = self._render_cache_context()
+            pending = [eq_id for eq_id in equations
+                       if not self.render_cache.contains(self._render_cache_key(equations[eq_id], setups.get(eq_id, {}), cache_context))]
+
+        previous_setups, self.animation_setups = self.animation_setups, setups
+        try:
+            models = {}
+            jobs = []
+            for label, mode, eq_ids in self._plan_jobs(pending):
+                frames, seconds = self._estimate_job(mode, eq_ids, models)
+                jobs.append({"label": label, "mode": mode, "equations": eq_ids, "frames": frames, "seconds": seconds})
+        finally:
+            self.animation_setups = previous_setups
+        jobs.sort(key=lambda job: job["seconds"], reverse=True)
+        return RenderPlan(jobs, max(1, self.render_workers), cached=len(equations) - len(pending), models=models)
+
+    def export_manifest(self, equations_data_from_reader, animation_setups_from_designer, manifest_path, equation_locations=None):
         """
-        Renderiza um único arquivo de cena Manim temporário.
-        Esta é a funcionalidade anteriormente em render_manim_file.
+        Grava o manifesto JSONL da renderização, para dividi-la entre máquinas (ver render_manifest.py).
+        Cada job traz eq_id, linhas, setup, origem e a saída esperada relativa ao output_dir.
+        O arquivo é determinístico: as mesmas equações e setups geram sempre os mesmos bytes.
+
+        Args:
+            equation_locations (dict): Origem das equações (padrão: a do EquationStore), usada para
+                                       montar os vídeos dos documentos após o merge.
+
+        Returns:
+            str: manifest_path
         """
-        print(f"\n--- Renderizando cena: '{os.path.basename(scene_file_path)}' ---")
+        from render_manifest import write_manifest
+
+        if equation_locations is None:
+            equation_locations = getattr(equations_data_from_reader, "locations", None) or {}
+        jobs = []
+        for eq_id in sorted(equations_data_from_reader):
+            setup = animation_setups_from_designer.get(eq_id, {})
+            jobs.append({
+                "eq_id": eq_id,
+                "lines": list(equations_data_from_reader[eq_id]),
+                "setup": {key: value for key, value in setup.items() if key != "equation_latex_lines"},
+                "location": equation_locations.get(eq_id),
+                "output": self._expected_output_path(eq_id, ""),
+            })
+        write_manifest(manifest_path, {"quality": self.quality, "preview": self.preview}, jobs)
+        logger.info(f"Manifesto com {len(jobs)} job(s) salvo em: {manifest_path}")
+        return manifest_path
+
+    def _render_job(self, eq_id, output_dir):
+        """Renderiza uma cena com tentativas limitadas e limpa sua pasta de mídia exclusiva."""
+        logger.debug(f"Renderizando cena para o bloco: {eq_id}")
+        media_dir = None
+        if self._isolate_media:
+            media_dir = make_temp_dir(os.path.join("temp", "media", self._scene_base_name(eq_id)))
+
+        success = False
+        try:
+            for attempt in range(1, self.render_retries + 2):
+                if attempt > 1:
+                    logger.info(f"Nova tentativa ({attempt}/{self.render_retries + 1}) para '{eq_id}'.")
+                    METRICS.inc("render_retries_total", mode="single")
+                if self.journal is not None:
+                    self.journal.running([eq_id], attempt)
+                if self._render_scene(eq_id, output_dir, timeout=self.render_timeout, media_dir=media_dir):
+                    success = True
+                    break
+        finally:
+            if media_dir and os.path.exists(media_dir):
+                shutil.rmtree(media_dir, ignore_errors=True)
+
+        if success and self.render_cache is not None and eq_id in self.cache_keys:
+            self.render_cache.put(self.cache_keys[eq_id], self._expected_video_path(eq_id, output_dir))
+        return [eq_id] if success else []
+
+    def _get_render_pool(self):
+        if self.render_pool is None:
+            self.render_pool = RenderWorkerPool(
+                workers=self.render_workers,
+                max_jobs_per_worker=self.worker_max_jobs,
+                quality=self.quality,
+                verbosity=self.manim_verbosity,
+            )
+        return self.render_pool
+
+    def _render_daemon_job(self, eq_id, output_dir):
+        """Renderiza uma equação em um worker quente do pool, com tentativas limitadas."""
+        final_video_path = self._expected_output_path(eq_id, output_dir)
+        class_name = self._scene_class_name(eq_id, set())
+        job = {
+            "eq_id": eq_id,
+            "lines": self.equations_data[eq_id],
+            "setup": dict(self.animation_setups.get(eq_id, {})),
+            "class_name": class_name,
+            "output_path": os.path.join(os.getcwd(), final_video_path),
+            "tex_cache_dir": self.tex_cache_dir,
+            "tex_cache_max_size_bytes": self.tex_cache_max_size_mb * 1024 * 1024,
+            "preview": self.preview,
+        }
 
-        # Extrair o nome da classe da cena (assumimos 'GeneratedScene' do template)
-        scene_class_name = "GeneratedScene"
-        
-        # O nome do arquivo de saída base será o nome do arquivo da cena temporária
-        base_file_name = os.path.splitext(os.path.basename(scene_file_path))[0]
-        output_file_name_base = base_file_name
+        pool = self._get_render_pool()
+        for attempt in range(1, self.render_retries + 2):
+            if attempt > 1:
+                logger.info(f"Nova tentativa ({attempt}/{self.render_retries + 1}) para '{eq_id}'.")
+                METRICS.inc("render_retries_total", mode="daemon")
+            if self.journal is not None:
+                self.journal.running([eq_id], attempt)
+            result = pool.render(job, timeout=self.render_timeout)
+            if result.get("ok"):
+                logger.debug(f"Cena '{eq_id}' renderizada pelo pool em {result.get('elapsed', 0):.1f} s: {final_video_path}")
+                if self.render_cache is not None and eq_id in self.cache_keys:
+                    self.render_cache.put(self.cache_keys[eq_id], final_video_path)
+                return [eq_id]
+            logger.error(f"Erro ao renderizar '{eq_id}' no pool: {result.get('error')}")
+        return []
+
+    def render_equation(self, eq_id, eq_lines, setup, output_dir="generated_animations_final"):
+        """
+        Renderiza uma única equação, para uso interativo (ex: ao editar slides).
 
-        manim_command = [
-            sys.executable, "-m", "manim",
-            scene_file_path,
-            scene_class_name,
-            "--media_dir", os.path.join(os.getcwd(), output_dir),
-            "-o", output_file_name_base,
-            "-ql",
-            "--disable_caching",
-            "--write_all",
-            "--verbosity", "DEBUG",
-        ]
+        No backend "daemon" o pool de workers continua ativo entre chamadas, então apenas
+        a primeira paga a importação do Manim. Chame shutdown_render_pool() ao terminar.
 
-        print(f"  Executando comando Manim: {' '.join(manim_command)}")
+        Returns:
+            str | None: Caminho do vídeo (ou do PNG, no modo de pré-visualização) gerado, ou None em caso de falha.
+        """
+        self.equations_data = {eq_id: eq_lines}
+        self.animation_setups = {eq_id: setup}
+        try:
+            if self._serve_from_cache(output_dir) and (not self._prepare_scenes(self.equations_data)
+                                                       or not self._render_all_equations_(output_dir)):
+                return None
+            return self._expected_output_path(eq_id, output_dir)
+        finally:
+            self._cleanup_temp_files()
+
+    def shutdown_render_pool(self):
+        """Encerra os workers do backend "daemon", se existirem."""
+        if self.render_pool is not None:
+            self.render_pool.shutdown()
+            self.render_pool = None
+
+    def _render_batch_job(self, batch_name, batch, output_dir):
+        """
+        Renderiza todas as cenas de um lote em uma única invocação do Manim e move cada
+        vídeo para o caminho que ele teria se fosse renderizado individualmente.
+        Nas novas tentativas, apenas as cenas que ainda não têm vídeo são repetidas.
+        """
+        # Os nomes dos lotes se repetem entre execuções simultâneas na mesma pasta (ex: shards)
+        media_dir = make_temp_dir(os.path.join("temp", "media", f"{batch_name}_{os.getpid()}"))
+        remaining = dict(batch["scenes"])
+        rendered = []
+        logger.debug(f"Renderizando lote '{batch_name}' com {len(remaining)} cena(s)")
 
         try:
-            result = subprocess.run(manim_command, capture_output=True, text=True, check=True)
+            for attempt in range(1, self.render_retries + 2):
+                if attempt > 1:
+                    logger.info(f"Nova tentativa ({attempt}/{self.render_retries + 1}) para {len(remaining)} cena(s) do lote '{batch_name}'.")
+                    METRICS.inc("render_retries_total", mode="batch")
+                if self.journal is not None:
+                    self.journal.running(list(remaining), attempt)
+                # O tempo limite é por cena, então escala com o tamanho do lote
+                timeout = self.render_timeout * len(remaining) if self.render_timeout else None
+                self._render_batch(batch_name, {class_name: eq_id for eq_id, class_name in remaining.items()}, media_dir, timeout)
+
+                for eq_id in self._collect_batch_outputs(remaining, media_dir, output_dir, self.cache_keys):
+                    rendered.append(eq_id)
+                    del remaining[eq_id]
+                if not remaining:
+                    break
+        finally:
+            if os.path.exists(media_dir):
+                shutil.rmtree(media_dir, ignore_errors=True)
+            logger.debug(f"Lote '{batch_name}': {len(rendered)} de {len(batch['scenes'])} cena(s) renderizada(s).")
 
-            print("  Saída do Manim (stdout):\n", result.stdout)
-            if result.stderr:
-                print("  Saída do Manim (stderr):\n", result.stderr)
+        return rendered
 
-            print(f"  Comando Manim executado com sucesso! Código de saída: {result.returncode}")
-            final_video_path = os.path.join(output_dir, 'videos', base_file_name, '480p15', f'{output_file_name_base}.mp4')
-            print(f"  Verifique o vídeo em: {final_video_path}")
-            return True # Retorna True para indicar sucesso
-            
+    def _collect_batch_outputs(self, scenes, media_dir, output_dir, cache_keys):
+        """
+        Move para o output_dir as saídas produzidas pelas cenas de um lote ({eq_id: classe}) e
+        as adiciona ao cache de renderização.
+
+        Returns:
+            list: IDs cujas saídas foram encontradas.
+        """
+        collected = []
+        for eq_id, class_name in scenes.items():
+            produced_path = self._find_produced_output(media_dir, class_name)
+            if produced_path is None:
+                continue
+            final_video_path = self._expected_output_path(eq_id, output_dir)
+            os.makedirs(os.path.dirname(final_video_path), exist_ok=True)
+            shutil.move(produced_path, final_video_path)
+            collected.append(eq_id)
+            if self.render_cache is not None and eq_id in cache_keys:
+                self.render_cache.put(cache_keys[eq_id], final_video_path)
+        return collected
+
+    def _render_batch(self, batch_name, scene_classes, media_dir, timeout=None):
+        """Executa o Manim uma vez para várias classes de cena ({classe: eq_id}) do módulo genérico."""
+        manim_command = self._manim_command(scene_classes, media_dir)
+
+        logger.debug(f"Executando comando Manim para {len(scene_classes)} cena(s) do lote '{batch_name}'")
+        log_path = os.path.join(self.render_log_dir, f"{batch_name}.log")
+
+        self._render_event_state[batch_name] = {"start": time.monotonic()}
+        try:
+            run_manim(manim_command, env=self._scene_env(scene_classes), timeout=timeout,
+                      on_event=functools.partial(self._handle_render_event, batch_name),
+                      tail_lines=self.log_tail_lines, failure_log_path=log_path)
+            return True
+        except subprocess.TimeoutExpired as e:
+            logger.error(f"A renderização do lote excedeu o tempo limite de {e.timeout} s e foi interrompida.")
+            self._log_failure(e.output, log_path)
+            return False
         except subprocess.CalledProcessError as e:
-            print(f"  Erro ao renderizar a animação (Manim falhou): {e}")
-            print("    Saída do Manim (stdout):\n", e.stdout)
-            print("    Saída do Manim (stderr):\n", e.stderr)
+            # As cenas renderizadas antes da falha continuam válidas e são aproveitadas
+            logger.error(f"Erro ao renderizar o lote (Manim falhou): {e}")
+            self._log_failure(e.output, log_path)
             return False
         except FileNotFoundError:
-            print("\n  Erro: O comando 'manim' (ou 'python') não foi encontrado.")
-            print("    Certifique-se de que o Manim CLI e o Python estão acessíveis no PATH do seu ambiente virtual.")
+            logger.error("O comando 'manim' (ou 'python') não foi encontrado.")
+            logger.error("Certifique-se de que o Manim CLI e o Python estão acessíveis no PATH do seu ambiente virtual.")
             return False
         except Exception as e:
-            print(f"  Um erro inesperado ocorreu: {e}")
+            logger.error(f"Um erro inesperado ocorreu: {e}")
             return False
+        finally:
+            self._render_event_state.pop(batch_name, None)
 
-    def _render_all_equations_(self, output_dir):
-        """
-        Itera sobre todos os arquivos de cena Manim gerados e os renderiza.
-        """
-        if not self.generated_scene_files:
-            print("Nenhum arquivo de cena para renderizar. Certifique-se de que as cenas foram construídas e populadas.")
-            return False
-
-        print(f"\n--- Iniciando a renderização de {len(self.generated_scene_files)} cenas de equação ---")
-        os.makedirs(output_dir, exist_ok=True) # Garante o diretório de saída principal
-        
-        successful_renders = 0
-        for eq_id, scene_file_path in self.generated_scene_files.items():
-            print(f"\n  Renderizando cena para o bloco: {eq_id}")
-            if self._render_scene(scene_file_path, output_dir):
-                successful_renders += 1
-            
-            # Limpar o arquivo de cena temporário após a renderização
-            if os.path.exists(scene_file_path):
-                os.remove(scene_file_path)
-                print(f"  Arquivo de cena temporário '{scene_file_path}' removido.")
-        
-        print(f"\n--- Renderização de todas as cenas concluída. {successful_renders} de {len(self.generated_scene_files)} renderizadas com sucesso. ---")
-        return successful_renders > 0
-
-    def generate_all_scenes(self, equations_data_from_reader, animation_setups_from_designer, output_dir="generated_animations_final"):
+    def generate_all_scenes(self, equations_data_from_reader, animation_setups_from_designer, output_dir="generated_animations_final",
+                            equation_locations=None):
         """
         Função principal para gerar e renderizar todas as cenas Manim.
 
@@ -283,56 +892,315 @@ class Animator:
             equations_data_from_reader (dict): Dicionário de equações do Reader.
             animation_setups_from_designer (dict): Dicionário de setups de animação do Designer.
             output_dir (str): Diretório onde os vídeos finais serão salvos.
+            equation_locations (dict): Origem das equações para os vídeos por documento (padrão: a do
+                                       EquationStore). Pode incluir equações já renderizadas antes.
         """
-        print("\n--- Orquestrando a geração e renderização de todas as cenas ---")
+        logger.info("Orquestrando a geração e renderização de todas as cenas")
+
+        if self.deduplicator is None:
+            self._generate_all_scenes(equations_data_from_reader, animation_setups_from_designer, output_dir)
+        else:
+            # Renderiza só um representante por grupo de equações idênticas e depois distribui os vídeos
+            unique_equations, unique_setups = self.deduplicator.deduplicate(equations_data_from_reader, animation_setups_from_designer)
+            try:
+                self._generate_all_scenes(unique_equations, unique_setups, output_dir)
+            finally:
+                self.deduplicator.fan_out(lambda eq_id: self._expected_output_path(eq_id, output_dir), output_dir)
+
+        if self.assemble_documents and not self.preview:
+            # Inclui os vídeos vindos do cache; a origem das equações vem do EquationStore do Reader
+            if equation_locations is None:
+                equation_locations = getattr(equations_data_from_reader, "locations", None)
+            if equation_locations is None:
+                logger.warning("As equações não trazem a origem (use um EquationStore do Reader). "
+                               "Chame assemble_document_videos(leitor.equation_locations, output_dir).")
+            else:
+                self.assemble_document_videos(equation_locations, output_dir)
 
+    def _generate_all_scenes(self, equations_data_from_reader, animation_setups_from_designer, output_dir):
         # Armazenar os dados para que os métodos internos possam acessá-los
         self.equations_data = equations_data_from_reader
         self.animation_setups = animation_setups_from_designer
 
-        # 1. Construir os arquivos de cena temporários (cópias do template)
-        # O generated_scene_files será preenchido aqui
-        if not self._build_temp_scenes(equations_data_from_reader):
-            print("Falha na construção dos arquivos de cena temporários. Encerrando.")
+        # 0. Reaproveitar os vídeos já renderizados com exatamente o mesmo conteúdo
+        pending_equations = self._serve_from_cache(output_dir)
+        if not pending_equations:
+            logger.info("Todas as cenas vieram do cache. Nada a renderizar.")
             return
+        if self.resume:
+            pending_equations = self._skip_completed(pending_equations, output_dir)
+            if not pending_equations:
+                logger.info("Todas as cenas já estavam concluídas no journal. Nada a renderizar.")
+                return
 
-        # 2. Popular esses arquivos de cena com o conteúdo e setups (e gerar o JSON global de dados)
-        if not self._populate_scenes():
-            print("Falha ao popular os arquivos de cena. Encerrando.")
-            # Limpar arquivos temporários se algo deu errado após a construção
-            self._cleanup_temp_files()
+        if not self._prepare_scenes(pending_equations):
             return
-        
+
+
         # 3. Renderizar todas as cenas populadas
         if not self._render_all_equations_(output_dir):
-            print("Nenhuma animação foi renderizada com sucesso.")
+            logger.warning("Nenhuma animação foi renderizada com sucesso.")
             # Limpar arquivos temporários restantes
             self._cleanup_temp_files()
             return
             
-        print("\n--- Geração e Renderização de todas as cenas concluída com sucesso! ---")
+        logger.info("Geração e Renderização de todas as cenas concluída com sucesso!")
         self._cleanup_temp_files() # Limpeza final
 
+    def _prepare_scenes(self, pending_equations):
+        """Registra as renderizações das equações pendentes, em lotes ou uma por equação."""
+        if self.tex_cache_dir:
+            self._tex_stats_snapshot = tex_cache.stats_snapshot(self.tex_cache_dir)
+        if self.precompile_tex:
+            self._precompile_tex(pending_equations)
+        with METRICS.timer("stage_seconds", stage="scene_generation"):
+            return self._register_scenes(pending_equations)
+
+    def _precompile_tex(self, pending_equations):
+        """
+        Compila o LaTeX das equações pendentes agrupadas por arquivo .tex, um documento por
+        grupo, em um único processo que importa o Manim uma vez. Os SVGs gerados semeiam o
+        cache de tex_cache_dir; equações que falharem são compiladas normalmente pelas cenas.
+
+        Returns:
+            dict | None: Resumo da pré-compilação ({"documents", "seeded", "failed", ...}).
+        """
+        if not self.tex_cache_dir:
+            logger.warning("A pré-compilação do LaTeX requer tex_cache_dir. Etapa ignorada.")
+            return None
+        # Sem EquationStore (ex: após a deduplicação) as equações são agrupadas em blocos
+        locations = getattr(self.equations_data, "locations", None)
+        documents = {}
+        for index, eq_id in enumerate(pending_equations):
+            group = locations[eq_id]["file"] if locations is not None else index // PRECOMPILE_CHUNK_SIZE
+            documents.setdefault(group, []).append("\n".join(self.equations_data[eq_id]))
+
+        fd, job_file = make_temp_file("tex_precompile_", ".json")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"cache_dir": self.tex_cache_dir, "max_size_bytes": self.tex_cache_max_size_mb * 1024 * 1024,
+                       "workers": max(1, self.render_workers), "timeout": self.render_timeout,
+                       "documents": list(documents.values())}, f)
+        try:
+            with METRICS.timer("stage_seconds", stage="tex_precompile"):
+                result = subprocess.run([sys.executable, TEX_PRECOMPILE_FILE, job_file],
+                                        capture_output=True, text=True, encoding='utf-8', errors='replace')
+            if result.returncode != 0:
+                logger.warning(f"Falha na pré-compilação do LaTeX; as cenas compilarão as equações.\n{result.stderr.strip()[-2000:]}")
+                return None
+            summary = json.loads(result.stdout.strip().splitlines()[-1])
+        except (OSError, ValueError, IndexError) as e:
+            logger.warning(f"Falha na pré-compilação do LaTeX ({e}); as cenas compilarão as equações.")
+            return None
+        finally:
+            os.remove(job_file)
+
+        METRICS.inc("tex_precompiled_total", summary["seeded"], result="seeded")
+        METRICS.inc("tex_precompiled_total", summary["cached"], result="cached")
+        METRICS.inc("tex_precompiled_total", summary["failed"], result="failed")
+        logger.info(f"LaTeX pré-compilado: {summary['documents']} documento(s), {summary['latex_runs']} execução(ões) do LaTeX, "
+                    f"{summary['seeded']} SVG(s) novo(s), {summary['cached']} já em cache, {summary['failed']} falha(s).")
+        return summary
+
+    def _register_scenes(self, pending_equations):
+        if self.render_backend == "daemon":
+            # Os workers recebem os dados da cena pelo pipe: nenhum arquivo é gerado
+            self.daemon_jobs = list(pending_equations)
+            return True
+
+        # 1. Registrar as cenas (uma por equação ou em lotes); nenhum .py é gerado
+        if self.batch_size > 1:
+            self._build_batch_scenes(pending_equations)
+        else:
+            self._build_scene_jobs(pending_equations)
+
+        # 2. Gravar o JSON de dados lido pelo módulo de cena genérico
+        if not self._write_scene_data(pending_equations):
+            logger.error("Falha ao gravar os dados das cenas. Encerrando.")
+            self._cleanup_temp_files()
+            return False
+        return True
+
+    def generate_scenes_from_stream(self, equation_stream, output_dir="generated_animations_final"):
+        """
+        Gera e renderiza as cenas à medida que as equações chegam, em vez de esperar
+        o projeto inteiro ser lido. Apenas um lote (self.batch_size equações) é mantido
+        em memória por vez.
+
+        Args:
+            equation_stream (iterable): Tuplas (eq_id, linhas, setup), ex: Designer.iter_default_anim.
+            output_dir (str): Diretório onde os vídeos finais serão salvos.
+
+        Returns:
+            int: Número de equações renderizadas com sucesso.
+        """
+        logger.info("Gerando e renderizando cenas em streaming")
+
+        successful_renders = 0
+        total = 0
+        chunk_size = max(1, self.batch_size)
+        chunk_equations = {}
+        chunk_setups = {}
+        try:
+            for eq_id, eq_lines_list, setup in equation_stream:
+                total += 1
+                chunk_equations[eq_id] = eq_lines_list
+                chunk_setups[eq_id] = setup
+                if len(chunk_equations) >= chunk_size:
+                    successful_renders += self._render_stream_chunk(chunk_equations, chunk_setups, output_dir)
+                    chunk_equations, chunk_setups = {}, {}
+            if chunk_equations:
+                successful_renders += self._render_stream_chunk(chunk_equations, chunk_setups, output_dir)
+        finally:
+            # Garante a limpeza mesmo se o stream for interrompido (ex: Ctrl-C)
+            self._cleanup_temp_files()
+            self.equations_data = {}
+            self.animation_setups = {}
+
+        logger.info(f"Streaming concluído. {successful_renders} de {total} equações renderizadas com sucesso.")
+        return successful_renders
+
+    def _render_stream_chunk(self, chunk_equations, chunk_setups, output_dir):
+        # Cada chamada trabalha apenas com os dados do bloco atual do stream
+        self.equations_data = chunk_equations
+        self.animation_setups = chunk_setups
+
+        pending_equations = self._serve_from_cache(output_dir)
+        served_from_cache = len(chunk_equations) - len(pending_equations)
+        if not pending_equations:
+            return served_from_cache
+        if not self._prepare_scenes(pending_equations):
+            return served_from_cache
+        self._render_all_equations_(output_dir)
+        self._cleanup_temp_files()
+        return served_from_cache + len(self.rendered_ids)
+
+    def build_contact_sheets(self, equation_locations, output_dir="generated_animations_final", columns=4):
+        """
+        Junta as pré-visualizações de cada arquivo .tex em uma única imagem (folha de contato),
+        na ordem do documento. Requer que as equações tenham sido renderizadas com preview=True.
+
+        Args:
+            equation_locations (dict): Reader.equation_locations ({eq_id: {"file", ...}}).
+            output_dir (str): Mesmo output_dir usado na renderização.
+            columns (int): Número de colunas da grade.
+
+        Returns:
+            dict: {arquivo .tex: caminho da folha de contato}.
+        """
+        images_by_file = {}
+        for eq_id, location in equation_locations.items():
+            image_path = self._expected_image_path(eq_id, output_dir)
+            if os.path.exists(image_path):
+                images_by_file.setdefault(location["file"], []).append((eq_id, image_path))
+
+        sheets = {}
+        sheet_names = self._document_names(images_by_file)
+        for tex_file, entries in images_by_file.items():
+            dest_path = os.path.join(output_dir, 'contact_sheets', f'{sheet_names[tex_file]}.png')
+            build_contact_sheet([path for _, path in entries], dest_path,
+                                labels=[eq_id for eq_id, _ in entries], columns=columns)
+            sheets[tex_file] = dest_path
+            logger.info(f"Folha de contato de '{tex_file}' ({len(entries)} equação(ões)): {dest_path}")
+        return sheets
+
+    def assemble_document_videos(self, equation_locations, output_dir="generated_animations_final", timeout=None):
+        """
+        Junta os vídeos das equações de cada arquivo .tex, na ordem do documento, em um único
+        vídeo por arquivo (output_dir/documents/<arquivo>.mp4). Os streams são copiados sem
+        re-codificação; só há re-codificação quando os clipes diferem em codec ou resolução
+        (ver video_assembly.py). Equações sem vídeo (ex: renderização que falhou) são puladas.
+
+        Args:
+            equation_locations (dict): Reader.equation_locations ({eq_id: {"file", "offset", ...}}).
+            output_dir (str): Mesmo output_dir usado na renderização.
+            timeout (float): Tempo máximo do ffmpeg por documento, em segundos.
+
+        Returns:
+            dict: {arquivo .tex: caminho do vídeo do documento}.
+        """
+        clips_by_file = {}
+        missing = 0
+        for eq_id, location in equation_locations.items():
+            video_path = self._expected_video_path(eq_id, output_dir)
+            if os.path.exists(video_path):
+                clips_by_file.setdefault(location["file"], []).append((location.get("offset") or 0, video_path))
+            else:
+                missing += 1
+        if missing:
+            logger.warning(f"{missing} equação(ões) sem vídeo ficaram fora dos vídeos dos documentos.")
+
+        documents = {}
+        document_names = self._document_names(clips_by_file)
+        with METRICS.timer("stage_seconds", stage="assembly"):
+            for tex_file, clips in clips_by_file.items():
+                clips.sort(key=lambda clip: clip[0])
+                dest_path = os.path.join(output_dir, 'documents', f'{document_names[tex_file]}.mp4')
+                try:
+                    mode = concat_videos([path for _, path in clips], dest_path, timeout=timeout)
+                except FileNotFoundError:
+                    logger.error("O comando 'ffmpeg' (ou 'ffprobe') não foi encontrado. Vídeos dos documentos não gerados.")
+                    break
+                except subprocess.TimeoutExpired as e:
+                    logger.error(f"A montagem do vídeo de '{tex_file}' excedeu o tempo limite de {e.timeout} s.")
+                    continue
+                except subprocess.CalledProcessError as e:
+                    logger.error(f"Erro ao montar o vídeo de '{tex_file}': {(e.stderr or '').strip() or e}")
+                    continue
+                METRICS.inc("assembled_documents_total", mode=mode)
+                documents[tex_file] = dest_path
+                logger.info(f"Vídeo de '{tex_file}' ({len(clips)} equação(ões), "
+                            f"{'sem re-codificação' if mode == 'copy' else 're-codificado'}): {dest_path}")
+        return documents
+
+    def remove_equation_outputs(self, eq_ids, output_dir="generated_animations_final"):
+        """
+        Remove o vídeo e a pré-visualização de equações que deixaram de existir no projeto.
+
+        Returns:
+            int: Número de arquivos removidos.
+        """
+        removed = 0
+        for eq_id in eq_ids:
+            video_dir = os.path.join(output_dir, 'videos', self._scene_base_name(eq_id))
+            if os.path.isdir(video_dir):
+                removed += sum(len(files) for _, _, files in os.walk(video_dir))
+                shutil.rmtree(video_dir, ignore_errors=True)
+            image_path = self._expected_image_path(eq_id, output_dir)
+            if os.path.exists(image_path):
+                os.remove(image_path)
+                removed += 1
+        if removed:
+            logger.debug(f"{removed} arquivo(s) de {len(eq_ids)} equação(ões) removida(s) do '{output_dir}'.")
+        return removed
+
+    @staticmethod
+    def _document_names(tex_files):
+        # Arquivos homônimos em pastas diferentes (varredura recursiva) não se sobrescrevem
+        names = {}
+        used_names = set()
+        for tex_file in tex_files:
+            name = base_name = os.path.splitext(os.path.basename(tex_file))[0]
+            suffix = 1
+            while name in used_names:
+                suffix += 1
+                name = f"{base_name}_{suffix}"
+            used_names.add(name)
+            names[tex_file] = name
+        return names
+
     def _cleanup_temp_files(self):
-        """Limpa arquivos temporários (JSON e .py de cenas) após o processo."""
+        """Limpa o JSON de dados das cenas e os registros de renderização após o processo."""
         # Limpa o arquivo JSON de dados globais
         if self.temp_json_data_file and os.path.exists(self.temp_json_data_file):
             os.remove(self.temp_json_data_file)
-            print(f"Arquivo JSON de dados temporário '{self.temp_json_data_file}' removido.")
-            self.temp_json_data_file = None # Reseta o path
-
-        # Limpa todos os arquivos de cena temporários ainda presentes
-        for eq_id, scene_file_path in list(self.generated_scene_files.items()): # Usar list() para evitar erro de RuntimeError ao deletar
-            if os.path.exists(scene_file_path):
-                os.remove(scene_file_path)
-                print(f"Arquivo de cena temporário '{scene_file_path}' removido.")
-            del self.generated_scene_files[eq_id] # Remove do controle
-        
-        # Opcional: Remover a pasta 'temp' se estiver vazia
-        temp_dir = "temp"
-        if os.path.exists(temp_dir) and not os.listdir(temp_dir):
-            os.rmdir(temp_dir)
-            print(f"Pasta temporária '{temp_dir}' removida.")
+            logger.debug(f"Arquivo JSON de dados temporário '{self.temp_json_data_file}' removido.")
+        self.temp_json_data_file = None # Reseta o path
+
+        self.scene_jobs = []
+        self.generated_batches = {}
+
+        # Remove a pasta 'temp' se estiver vazia (outras execuções podem estar usando a mesma pasta)
+        remove_empty_dirs("temp")
 
 # --- Métodos de teste antigos (para referência, mas não parte do fluxo principal) ---
 # Você pode removê-los se não precisar mais.
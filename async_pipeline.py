@@ -0,0 +1,323 @@
+# async_pipeline.py
+# Orquestração assíncrona do pipeline Reader -> Designer -> Animator.
+#
+# Em generate_all_scenes as etapas rodam em fases: toda a varredura, depois todos os setups,
+# depois todas as renderizações. Aqui as etapas são tarefas asyncio ligadas por filas
+# limitadas: a varredura alimenta a preparação das cenas (setup, cache e JSON de dados), que
+# alimenta os workers de renderização (processos do Manim via asyncio.create_subprocess_exec).
+# Uma fila cheia faz a etapa anterior esperar (backpressure). Ctrl-C cancela todas as tarefas:
+# os processos do Manim são encerrados e os arquivos temporários removidos.
+#
+# Uso: python async_pipeline.py <pasta do projeto> --output videos --workers 4 --batch-size 10
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import itertools
+import logging
+import os
+import shutil
+import subprocess
+import time
+
+from animator import Animator, make_temp_dir, remove_empty_dirs
+from designer import Designer
+from manim_process import run_manim_async
+from metrics import METRICS
+from reader import Reader
+from render_plan import estimate_frames, timing_key
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # Marca o fim de uma fila
+
+
+class AsyncPipeline:
+    def __init__(self, reader=None, designer=None, animator=None, queue_size=256, render_queue_size=None,
+                 scan_chunk_size=64, flush_interval=1.0):
+        """
+        Args:
+            reader, designer, animator: Instâncias configuradas (padrão: construtores sem argumentos).
+                                        Do Animator são usados quality, batch_size, render_workers,
+                                        render_timeout, render_retries, preview, os caches e assemble_documents.
+            queue_size (int): Equações lidas que podem aguardar a preparação.
+            render_queue_size (int): Jobs preparados que podem aguardar um worker
+                                     (padrão: 2 por worker de renderização).
+            scan_chunk_size (int): Equações lidas por vez na thread de varredura.
+            flush_interval (float): Segundos que um lote incompleto espera por mais equações antes
+                                    de ser enviado para renderização.
+        """
+        self.reader = reader or Reader()
+        self.designer = designer or Designer()
+        self.animator = animator or Animator()
+        self.queue_size = queue_size
+        self.render_queue_size = render_queue_size or max(1, self.animator.render_workers) * 2
+        self.scan_chunk_size = scan_chunk_size
+        self.flush_interval = flush_interval
+
+        self.equation_locations = {}  # {eq_id: origem} das equações lidas, para a montagem por documento
+        self.rendered_ids = []
+        self.failed_ids = []
+        self.cached_ids = []
+        self._data_files = set()      # JSONs de dados ainda não renderizados (removidos no cancelamento)
+        self._media_dirs = set()
+        self._job_counter = itertools.count()
+        self._cache_context = None
+
+    async def run(self, tex_files, output_dir="generated_animations_final", scan_workers=1):
+        """
+        Lê, prepara e renderiza as equações de tex_files com as etapas sobrepostas.
+
+        Returns:
+            list: IDs renderizados com sucesso (os servidos pelo cache ficam em self.cached_ids).
+        """
+        if self.animator.deduplicator is not None:
+            logger.warning("A deduplicação não é aplicada no pipeline assíncrono.")
+        if self.animator.render_backend == "daemon":
+            logger.warning("O pipeline assíncrono renderiza com processos do Manim; o backend 'daemon' é ignorado.")
+
+        self.equation_locations = {}
+        self.rendered_ids, self.failed_ids, self.cached_ids = [], [], []
+        render_workers = max(1, self.animator.render_workers)
+        equations_queue = asyncio.Queue(self.queue_size)
+        render_queue = asyncio.Queue(self.render_queue_size)
+        os.makedirs(output_dir, exist_ok=True)
+
+        logger.info(f"Pipeline assíncrono: {len(tex_files)} arquivo(s), {render_workers} worker(s) de renderização")
+        start_time = time.monotonic()
+        tasks = [
+            asyncio.create_task(self._scan(tex_files, equations_queue, scan_workers), name="scan"),
+            asyncio.create_task(self._prepare(equations_queue, render_queue, output_dir, render_workers), name="prepare"),
+            *[asyncio.create_task(self._render_worker(render_queue, output_dir), name=f"render_{index}")
+              for index in range(render_workers)],
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Cancelamento (ex: Ctrl-C) ou erro em uma etapa: as demais são canceladas e cada uma
+            # encerra seu processo do Manim antes da limpeza
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            self._cleanup_temp_files()
+            if self.animator.timing_log is not None:
+                self.animator.timing_log.save()
+
+        elapsed = time.monotonic() - start_time
+        METRICS.observe("stage_seconds", elapsed, stage="pipeline")
+        METRICS.inc("render_equations_total", len(self.rendered_ids), result="ok")
+        METRICS.inc("render_equations_total", len(self.failed_ids), result="failed")
+        logger.info(f"Pipeline concluído em {elapsed:.1f} s: {len(self.equation_locations)} equação(ões), "
+                    f"{len(self.rendered_ids)} renderizada(s), {len(self.cached_ids)} do cache, {len(self.failed_ids)} falha(s).")
+        if self.failed_ids:
+            logger.warning(f"Falharam: {', '.join(sorted(self.failed_ids))}")
+
+        if self.animator.assemble_documents and not self.animator.preview:
+            await asyncio.to_thread(self.animator.assemble_document_videos, self.equation_locations, output_dir)
+        return self.rendered_ids
+
+    async def _scan(self, tex_files, equations_queue, scan_workers):
+        """Etapa 1: varre os arquivos em uma thread e envia (eq_id, linhas, origem) para a fila."""
+        loop = asyncio.get_running_loop()
+        equations = self.reader.iter_equations(tex_files, workers=scan_workers)
+        next_chunk = lambda: list(itertools.islice(equations, self.scan_chunk_size))
+        # Uma única thread: o gerador só é fechado depois do lote em andamento
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="scan")
+        try:
+            with METRICS.timer("stage_seconds", stage="scan"):
+                while True:
+                    chunk = await loop.run_in_executor(executor, next_chunk)
+                    if not chunk:
+                        break
+                    for item in chunk:
+                        await equations_queue.put(item)
+            await equations_queue.put(_DONE)
+        finally:
+            # Fecha o gerador (salvando o índice de varredura) também no cancelamento
+            await asyncio.wrap_future(executor.submit(equations.close))
+            executor.shutdown(wait=False)
+
+    async def _prepare(self, equations_queue, render_queue, output_dir, render_workers):
+        """
+        Etapa 2: cria os setups, agrupa as equações em lotes de animator.batch_size, serve as que
+        estão no cache e grava o JSON de dados de cada lote, que vira um job de renderização.
+        """
+        loop = asyncio.get_running_loop()
+        batch_size = max(1, self.animator.batch_size)
+        chunk = {}
+        deadline = None
+        finished = False
+        while not finished:
+            timeout = max(0.0, deadline - loop.time()) if chunk else None
+            try:
+                item = await asyncio.wait_for(equations_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None  # Lote incompleto esperou flush_interval: é enviado assim mesmo
+            if item is _DONE:
+                finished = True
+            elif item is not None:
+                eq_id, eq_lines, location = item
+                self.equation_locations[eq_id] = location
+                if not chunk:
+                    deadline = loop.time() + self.flush_interval
+                chunk[eq_id] = (eq_lines, self.designer.build_setup(eq_lines, location))
+            if chunk and (finished or item is None or len(chunk) >= batch_size):
+                job = await asyncio.to_thread(self._prepare_job, chunk, output_dir)
+                chunk = {}
+                if job is not None:
+                    self._data_files.add(job["data_file"])
+                    await render_queue.put(job)
+        for _ in range(render_workers):
+            await render_queue.put(_DONE)
+
+    def _prepare_job(self, chunk, output_dir):
+        """Monta o job de um lote ({eq_id: (linhas, setup)}); None se todas vieram do cache."""
+        animator = self.animator
+        equations = {eq_id: eq_lines for eq_id, (eq_lines, _) in chunk.items()}
+        setups = {eq_id: setup for eq_id, (_, setup) in chunk.items()}
+
+        cache_keys = {}
+        pending = list(equations)
+        if animator.render_cache is not None and not animator.preview:
+            if self._cache_context is None:
+                self._cache_context = animator._render_cache_context()
+            pending = []
+            for eq_id, eq_lines in equations.items():
+                key = animator._render_cache_key(eq_lines, setups[eq_id], self._cache_context)
+                if animator.render_cache.materialize(key, animator._expected_video_path(eq_id, output_dir)):
+                    self.cached_ids.append(eq_id)
+                    continue
+                cache_keys[eq_id] = key
+                pending.append(eq_id)
+            METRICS.inc("render_cache_total", len(equations) - len(pending), result="hit")
+            METRICS.inc("render_cache_total", len(pending), result="miss")
+        if not pending:
+            return None
+
+        used_class_names = set()
+        # O pid no rótulo separa a pasta de mídia e o log de pipelines na mesma pasta de trabalho
+        return {
+            "label": f"async_job_{os.getpid()}_{next(self._job_counter):05d}",
+            "scenes": {eq_id: animator._scene_class_name(eq_id, used_class_names) for eq_id in pending},
+            "data_file": animator._dump_scene_data(equations, setups, pending),
+            "cache_keys": cache_keys,
+            "frames": sum(estimate_frames(setups[eq_id], animator.quality, animator.preview) for eq_id in pending),
+        }
+
+    async def _render_worker(self, render_queue, output_dir):
+        """Etapa 3: renderiza os jobs da fila até receber o marcador de fim."""
+        while True:
+            job = await render_queue.get()
+            if job is _DONE:
+                return
+            await self._render_job(job, output_dir)
+
+    async def _render_job(self, job, output_dir):
+        """Renderiza um job com tentativas limitadas; nas novas tentativas só as cenas sem saída são repetidas."""
+        animator = self.animator
+        label = job["label"]
+        remaining = dict(job["scenes"])
+        media_dir = make_temp_dir(os.path.join("temp", "media", label))
+        log_path = os.path.join(animator.render_log_dir, f"{label}.log")
+        self._media_dirs.add(media_dir)
+        start_time = time.perf_counter()
+        try:
+            for attempt in range(1, animator.render_retries + 2):
+                if attempt > 1:
+                    logger.info(f"Nova tentativa ({attempt}/{animator.render_retries + 1}) para {len(remaining)} cena(s) de '{label}'.")
+                    METRICS.inc("render_retries_total", mode="async")
+                # O tempo limite é por cena, então escala com o tamanho do job
+                timeout = animator.render_timeout * len(remaining) if animator.render_timeout else None
+                scene_classes = {class_name: eq_id for eq_id, class_name in remaining.items()}
+                animator._render_event_state[label] = {"start": time.monotonic()}
+                try:
+                    await run_manim_async(animator._manim_command(scene_classes, media_dir),
+                                          env=animator._scene_env(scene_classes, job["data_file"]), timeout=timeout,
+                                          on_event=functools.partial(animator._handle_render_event, label),
+                                          tail_lines=animator.log_tail_lines, failure_log_path=log_path)
+                except subprocess.TimeoutExpired as e:
+                    logger.error(f"A renderização de '{label}' excedeu o tempo limite de {e.timeout} s e foi interrompida.")
+                    animator._log_failure(e.output, log_path)
+                except subprocess.CalledProcessError as e:
+                    # As cenas renderizadas antes da falha continuam válidas e são aproveitadas
+                    logger.error(f"Erro ao renderizar '{label}' (Manim falhou): {e}")
+                    animator._log_failure(e.output, log_path)
+                except FileNotFoundError:
+                    logger.error("O comando 'python' não foi encontrado para executar o Manim.")
+                    break
+                finally:
+                    animator._render_event_state.pop(label, None)
+
+                collected = await asyncio.to_thread(animator._collect_batch_outputs, remaining, media_dir,
+                                                    output_dir, job["cache_keys"])
+                for eq_id in collected:
+                    del remaining[eq_id]
+                    self.rendered_ids.append(eq_id)
+                if not remaining:
+                    break
+        finally:
+            self._discard_job_files(job["data_file"], media_dir)
+            METRICS.observe("render_job_seconds", time.perf_counter() - start_time, mode="async")
+        METRICS.inc("render_jobs_total", mode="async", result="failed" if remaining else "ok")
+        if animator.timing_log is not None and not remaining:
+            # Um job assíncrono é um lote em um processo do Manim: calibra as estimativas de "batch"
+            animator.timing_log.record(timing_key("batch", animator.quality, animator.preview), len(job["scenes"]),
+                                       job["frames"], time.perf_counter() - start_time)
+        self.failed_ids.extend(remaining)
+
+    def _discard_job_files(self, data_file, media_dir):
+        if os.path.exists(data_file):
+            os.remove(data_file)
+        self._data_files.discard(data_file)
+        if os.path.exists(media_dir):
+            shutil.rmtree(media_dir, ignore_errors=True)
+        self._media_dirs.discard(media_dir)
+
+    def _cleanup_temp_files(self):
+        """Remove os JSONs de dados e as pastas de mídia que sobraram (ex: após um cancelamento)."""
+        for data_file in list(self._data_files):
+            if os.path.exists(data_file):
+                os.remove(data_file)
+        for media_dir in list(self._media_dirs):
+            shutil.rmtree(media_dir, ignore_errors=True)
+        self._data_files.clear()
+        self._media_dirs.clear()
+        remove_empty_dirs(os.path.join("temp", "media"), "temp")
+
+
+def run_pipeline(tex_files, output_dir="generated_animations_final", scan_workers=1, **pipeline_options):
+    """Executa o AsyncPipeline até o fim. Com Ctrl-C, as tarefas são canceladas e os temporários removidos."""
+    pipeline = AsyncPipeline(**pipeline_options)
+    return asyncio.run(pipeline.run(tex_files, output_dir, scan_workers))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline Reader -> Designer -> Animator com as etapas sobrepostas.")
+    parser.add_argument("project_dir", help="Pasta do projeto LaTeX.")
+    parser.add_argument("--output", default="generated_animations_final", help="Pasta dos vídeos.")
+    parser.add_argument("--recursive", action="store_true", help="Inclui os subdiretórios.")
+    parser.add_argument("--workers", type=int, default=1, help="Processos do Manim simultâneos.")
+    parser.add_argument("--batch-size", type=int, default=1, help="Equações por processo do Manim.")
+    parser.add_argument("--timeout", type=float, default=None, help="Tempo limite por cena, em segundos.")
+    parser.add_argument("--retries", type=int, default=0, help="Novas tentativas por job.")
+    parser.add_argument("--preview", action="store_true", help="Gera apenas o PNG do último quadro.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-7s %(name)s: %(message)s", datefmt="%H:%M:%S")
+    reader = Reader(index_path=".scan_index.json")
+    reader.verify_path(args.project_dir)
+    tex_files = reader.get_tex_files(args.project_dir, recursive=args.recursive)
+    animator = Animator(render_workers=args.workers, batch_size=args.batch_size, render_timeout=args.timeout,
+                        render_retries=args.retries, preview=args.preview)
+    try:
+        run_pipeline(tex_files, args.output, reader=reader, animator=animator)
+    except KeyboardInterrupt:
+        logger.warning("Interrompido. Renderizações em andamento canceladas e temporários removidos.")
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
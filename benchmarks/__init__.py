@@ -0,0 +1,2 @@
+# benchmarks
+# Benchmarks de throughput do pipeline (ver benchmarks/run.py) e gerador de corpus sintético.
@@ -0,0 +1,94 @@
+# benchmarks/corpus.py
+# Gerador de projetos LaTeX sintéticos para medir o throughput do pipeline.
+import os
+import random
+
+# Peso de cada ambiente no sorteio; ambientes com peso 0 não aparecem
+DEFAULT_ENVIRONMENTS = {
+    "equation": 4,
+    "equation*": 1,
+    "align": 2,
+    "align*": 2,
+    "eqnarray": 1,
+    "gather": 1,
+    "multline": 1,
+}
+
+# Ambientes cujas linhas são separadas por '\\' (os demais têm uma única linha lógica)
+_MULTILINE_ENVIRONMENTS = {"align", "align*", "eqnarray", "eqnarray*", "gather", "gather*", "multline", "multline*"}
+
+_SYMBOLS = ["x", "y", "z", "a", "b", "c", r"\alpha", r"\beta", r"\lambda", r"\omega"]
+_PROSE_WORDS = ["seja", "temos", "então", "logo", "onde", "função", "valor", "conjunto", "para", "todo", "dado"]
+
+
+def _random_term(rng):
+    symbol = rng.choice(_SYMBOLS)
+    form = rng.randrange(5)
+    if form == 0:
+        return f"{symbol}^{{{rng.randint(2, 9)}}}"
+    if form == 1:
+        return f"{symbol}_{{{rng.choice('ijkn')}}}"
+    if form == 2:
+        return rf"\frac{{{symbol}}}{{{rng.choice(_SYMBOLS)}}}"
+    if form == 3:
+        return rf"\sqrt{{{symbol} + {rng.randint(1, 9)}}}"
+    return f"{rng.randint(1, 99)}{symbol}"
+
+
+def _random_line(rng, aligned):
+    left = " + ".join(_random_term(rng) for _ in range(rng.randint(1, 3)))
+    right = " - ".join(_random_term(rng) for _ in range(rng.randint(1, 3)))
+    return f"{left} {'&=' if aligned else '='} {right}"
+
+
+def _random_prose(rng, lines):
+    return [" ".join(rng.choice(_PROSE_WORDS) for _ in range(rng.randint(6, 14))) + "." for _ in range(lines)]
+
+
+def generate_corpus(output_dir, files=10, equations_per_file=50, environments=None,
+                    min_lines=1, max_lines=4, prose_lines=3, seed=0):
+    """
+    Gera arquivos .tex sintéticos em output_dir.
+
+    Args:
+        output_dir (str): Pasta do corpus (criada se não existir).
+        files (int): Número de arquivos .tex.
+        equations_per_file (int): Número de blocos de equação por arquivo.
+        environments (dict): {ambiente: peso} usado no sorteio (padrão: DEFAULT_ENVIRONMENTS).
+        min_lines, max_lines (int): Faixa do número de linhas dos ambientes multilinha.
+        prose_lines (int): Linhas de texto entre dois blocos de equação (densidade).
+        seed (int): Semente do gerador; o mesmo conjunto de parâmetros gera sempre o mesmo corpus.
+
+    Returns:
+        list: Caminhos dos arquivos gerados.
+    """
+    rng = random.Random(seed)
+    environments = {name: weight for name, weight in (environments or DEFAULT_ENVIRONMENTS).items() if weight > 0}
+    names = list(environments)
+    weights = [environments[name] for name in names]
+    os.makedirs(output_dir, exist_ok=True)
+
+    tex_files = []
+    for file_index in range(files):
+        lines = [r"\documentclass{article}", r"\usepackage{amsmath}", r"\begin{document}", ""]
+        for _ in range(equations_per_file):
+            lines.extend(_random_prose(rng, prose_lines))
+            environment = rng.choices(names, weights)[0]
+            lines.append(rf"\begin{{{environment}}}")
+            if environment in _MULTILINE_ENVIRONMENTS:
+                line_count = rng.randint(min_lines, max_lines)
+                equation_lines = [_random_line(rng, aligned=True) for _ in range(line_count)]
+                lines.extend(line + r" \\" for line in equation_lines[:-1])
+                lines.append(equation_lines[-1])
+            else:
+                lines.append(_random_line(rng, aligned=False))
+            lines.append(rf"\end{{{environment}}}")
+            lines.append("")
+        lines.append(r"\end{document}")
+
+        tex_path = os.path.join(output_dir, f"cap_{file_index:04d}.tex")
+        with open(tex_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        tex_files.append(tex_path)
+
+    return tex_files
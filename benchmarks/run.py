@@ -0,0 +1,199 @@
+# benchmarks/run.py
+# Executa os benchmarks do pipeline sobre um corpus sintético e grava os resultados em JSON.
+#
+# Uso: python -m benchmarks.run --files 20 --equations-per-file 100 --output resultados.json
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from reader import Reader
+from designer import Designer
+from animator import Animator
+from metrics import METRICS
+from style_rules import load_rules
+from benchmarks.corpus import DEFAULT_ENVIRONMENTS, generate_corpus
+
+
+def _timed(fn, repeat):
+    """Executa fn repeat vezes e devolve (tempos em segundos, último resultado)."""
+    seconds = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+    return seconds, result
+
+
+def _summary(seconds, items):
+    best = min(seconds)
+    return {
+        "seconds": seconds,
+        "best": best,
+        "mean": sum(seconds) / len(seconds),
+        "items": items,
+        "items_per_second": items / best if best > 0 else None,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except Exception:
+        return None
+
+
+def bench_reader(tex_files, repeat, workers):
+    def run():
+        return Reader(index_path=None).find_equations_in_files(tex_files, workers=workers)
+    seconds, equations = _timed(run, repeat)
+    return _summary(seconds, len(equations)), equations
+
+
+def bench_designer(equations, repeat, rules=None):
+    """Criação dos setups e leitura de todos eles (os campos derivados só são calculados na leitura)."""
+    def run():
+        setups = Designer(rules=rules).set_deafult_anim(equations)
+        for eq_id in setups:
+            dict(setups[eq_id])
+        return setups
+    seconds, setups = _timed(run, repeat)
+    return _summary(seconds, len(setups)), setups
+
+
+def bench_scene_prep(equations, setups, repeat, batch_size):
+    """Preparação das cenas no Animator (registro dos jobs e gravação do JSON de dados)."""
+    def run():
+        animator = Animator(cache_dir=None, tex_cache_dir=None, batch_size=batch_size)
+        animator.equations_data = equations
+        animator.animation_setups = setups
+        try:
+            if not animator._prepare_scenes(equations):
+                raise RuntimeError("Falha na preparação das cenas.")
+        finally:
+            animator._cleanup_temp_files()
+    seconds, _ = _timed(run, repeat)
+    return _summary(seconds, len(equations))
+
+
+def bench_render(equations, setups, count, workers, batch_size):
+    """Renderização real de count equações (exige o Manim instalado)."""
+    subset = dict(list(equations.items())[:count])
+    animator = Animator(cache_dir=None, tex_cache_dir=None, render_workers=workers, batch_size=batch_size)
+    start = time.perf_counter()
+    animator.generate_all_scenes(subset, {eq_id: setups[eq_id] for eq_id in subset}, output_dir="render_output")
+    seconds = time.perf_counter() - start
+    summary = _summary([seconds], len(animator.rendered_ids))
+    summary["requested"] = len(subset)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline Reader -> Designer -> Animator.")
+    parser.add_argument("--files", type=int, default=20, help="Número de arquivos .tex do corpus.")
+    parser.add_argument("--equations-per-file", type=int, default=100, help="Blocos de equação por arquivo.")
+    parser.add_argument("--min-lines", type=int, default=1)
+    parser.add_argument("--max-lines", type=int, default=4)
+    parser.add_argument("--prose-lines", type=int, default=3, help="Linhas de texto entre as equações.")
+    parser.add_argument("--env", action="append", default=[], metavar="AMBIENTE=PESO",
+                        help="Peso de um ambiente no corpus (pode ser repetido). Ex: --env align*=3")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições de cada benchmark (vale o melhor tempo).")
+    parser.add_argument("--workers", type=int, default=1, help="Workers do Reader e da renderização.")
+    parser.add_argument("--batch-size", type=int, default=1, help="batch_size do Animator.")
+    parser.add_argument("--rules", default=None, help="JSON com regras de estilo aplicadas no benchmark do Designer.")
+    parser.add_argument("--render", type=int, default=0, metavar="N",
+                        help="Renderiza também as N primeiras equações (exige o Manim).")
+    parser.add_argument("--output", default=None, help="Arquivo JSON de resultados (padrão: benchmark_<data>.json).")
+    parser.add_argument("--verbose", action="store_true", help="Mostra as mensagens dos módulos durante a medição.")
+    args = parser.parse_args(argv)
+
+    environments = dict(DEFAULT_ENVIRONMENTS)
+    if args.env:
+        environments = {}
+        for item in args.env:
+            name, _, weight = item.partition("=")
+            environments[name] = float(weight or 1)
+
+    config = {
+        "files": args.files,
+        "equations_per_file": args.equations_per_file,
+        "min_lines": args.min_lines,
+        "max_lines": args.max_lines,
+        "prose_lines": args.prose_lines,
+        "environments": environments,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "batch_size": args.batch_size,
+        "rules": args.rules,
+        "render": args.render,
+    }
+    rules = load_rules(args.rules) if args.rules else None
+    output_path = os.path.abspath(args.output or f"benchmark_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    results = {}
+
+    # As mensagens por equação dos módulos dominariam o tempo medido; por padrão são descartadas
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG, format="%(levelname)-7s %(name)s: %(message)s")
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="niv_bench_") as workspace:
+        corpus_dir = os.path.join(workspace, "corpus")
+        tex_files = generate_corpus(corpus_dir, files=args.files, equations_per_file=args.equations_per_file,
+                                    environments=environments, min_lines=args.min_lines, max_lines=args.max_lines,
+                                    prose_lines=args.prose_lines, seed=args.seed)
+        corpus_bytes = sum(os.path.getsize(path) for path in tex_files)
+        print(f"Corpus sintético: {len(tex_files)} arquivo(s), {corpus_bytes / 1024:.0f} KiB.")
+
+        # O Animator grava seus temporários na pasta atual: tudo fica dentro do workspace
+        os.chdir(workspace)
+        try:
+            with quiet:
+                results["reader"], equations = bench_reader(tex_files, args.repeat, args.workers)
+                results["reader"]["bytes_per_second"] = corpus_bytes / results["reader"]["best"]
+                results["designer"], setups = bench_designer(equations, args.repeat, rules)
+                results["scene_prep"] = bench_scene_prep(equations, setups, args.repeat, args.batch_size)
+            if args.render:
+                if importlib.util.find_spec("manim") is None:
+                    print("Aviso: Manim não instalado. Benchmark de renderização ignorado.")
+                    results["render"] = {"skipped": "manim não instalado"}
+                else:
+                    with quiet:
+                        results["render"] = bench_render(equations, setups, args.render, args.workers, args.batch_size)
+        finally:
+            os.chdir(original_cwd)
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+        # Métricas internas acumuladas em todas as repetições (tempos por etapa, por arquivo, etc.)
+        "metrics": METRICS.snapshot(),
+    }
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+
+    for stage, summary in results.items():
+        if "best" in summary:
+            print(f"  {stage:<11} {summary['best']:.4f} s  ({summary['items']} itens, {summary['items_per_second']:.0f} itens/s)")
+    print(f"Resultados salvos em: {output_path}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
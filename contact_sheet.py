@@ -0,0 +1,53 @@
+# contact_sheet.py
+# Monta uma única imagem com as pré-visualizações (PNGs do último quadro) de várias equações,
+# em grade e na ordem recebida. Usa o Pillow, que já é uma dependência do Manim.
+import math
+import os
+
+
+def build_contact_sheet(image_paths, dest_path, labels=None, columns=4, cell_width=480, padding=16,
+                        label_height=24, background="black", label_color="white"):
+    """
+    Args:
+        image_paths (list): PNGs a incluir, na ordem desejada (ex: ordem do documento).
+        dest_path (str): Caminho da imagem gerada.
+        labels (list): Texto exibido abaixo de cada imagem (ex: o eq_id). Opcional.
+        columns (int): Número de colunas da grade.
+        cell_width (int): Largura de cada célula; as imagens são reduzidas mantendo a proporção.
+
+    Returns:
+        str | None: dest_path, ou None se não houver imagens.
+    """
+    from PIL import Image, ImageDraw
+
+    if not image_paths:
+        return None
+    labels = labels or [None] * len(image_paths)
+
+    thumbnails = []
+    for path in image_paths:
+        with Image.open(path) as image:
+            image = image.convert("RGB")
+            scale = cell_width / image.width
+            thumbnails.append(image.resize((cell_width, max(1, round(image.height * scale)))))
+
+    columns = max(1, min(columns, len(thumbnails)))
+    rows = math.ceil(len(thumbnails) / columns)
+    cell_height = max(thumbnail.height for thumbnail in thumbnails) + (label_height if any(labels) else 0)
+    sheet = Image.new("RGB", (
+        padding + columns * (cell_width + padding),
+        padding + rows * (cell_height + padding),
+    ), background)
+    draw = ImageDraw.Draw(sheet)
+
+    for index, (thumbnail, label) in enumerate(zip(thumbnails, labels)):
+        row, column = divmod(index, columns)
+        x = padding + column * (cell_width + padding)
+        y = padding + row * (cell_height + padding)
+        sheet.paste(thumbnail, (x, y))
+        if label:
+            draw.text((x, y + thumbnail.height + 4), str(label), fill=label_color)
+
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+    sheet.save(dest_path)
+    return dest_path
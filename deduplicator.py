@@ -0,0 +1,160 @@
+# deduplicator.py
+import json
+import logging
+import os
+import re
+import shutil
+
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Espaços ao redor destes caracteres não mudam o resultado em modo matemático
+_OPERATOR_SPACING_PATTERN = re.compile(r'(?<!\\)\s*([+\-=*/^_{}()\[\],&<>|])\s*')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+# Argumentos em modo texto (ou de nomes de operadores) mantêm os espaços: '\text{a b}' e
+# '\text{ab}' renderizam diferente. '\\\\' entra na alternância para que uma quebra de linha
+# seguida de 'text{' não seja confundida com o comando.
+_TEXT_ARGUMENT_PATTERN = re.compile(
+    r'\\\\|\\(?:text(?:rm|it|bf|sf|tt|up|normal)?|mbox|hbox|mathrm|operatorname\*?)(?![A-Za-z])\s*(?=\{)')
+
+
+class Deduplicator:
+    """
+    Agrupa equações idênticas (mesmo LaTeX normalizado e mesmo setup efetivo) para que cada
+    grupo seja renderizado uma única vez. O vídeo do representante do grupo é depois
+    distribuído para os demais IDs, e o mapeamento fica registrado em um manifesto.
+    """
+
+    def __init__(self):
+        self.groups = {}    # {id_representante: [todos os IDs do grupo, incluindo o representante]}
+
+    @staticmethod
+    def _text_argument_end(line, brace_start):
+        """Índice logo após a '}' que fecha a '{' em brace_start (ou o fim da linha)."""
+        depth = 0
+        index = brace_start
+        while index < len(line):
+            char = line[index]
+            if char == '\\':
+                index += 2 # '\{', '\}' e '\\' não abrem nem fecham grupos
+                continue
+            if char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    return index + 1
+            index += 1
+        return len(line)
+
+    @classmethod
+    def normalize_latex(cls, eq_lines):
+        """
+        Normaliza as linhas LaTeX de forma que diferenças só de espaçamento em modo matemático
+        não contem. Os argumentos de \\text, \\mathrm, \\operatorname (e similares) ficam intactos.
+        """
+        normalized_lines = []
+        for line in eq_lines:
+            line = line.strip()
+            parts = []
+            position = 0
+            for match in _TEXT_ARGUMENT_PATTERN.finditer(line):
+                if match.start() < position or match.group() == '\\\\':
+                    continue
+                end = cls._text_argument_end(line, match.end())
+                parts.append(cls._normalize_math(line[position:match.start()], strip_start=bool(parts), strip_end=True))
+                parts.append(line[match.start():end])
+                position = end
+            parts.append(cls._normalize_math(line[position:], strip_start=bool(parts)))
+            normalized_lines.append("".join(parts))
+        return "\\\\".join(normalized_lines)
+
+    @staticmethod
+    def _normalize_math(text, strip_start=False, strip_end=False):
+        # Em modo matemático os espaços junto a um argumento de texto também não contam
+        text = _OPERATOR_SPACING_PATTERN.sub(r'\1', _WHITESPACE_PATTERN.sub(' ', text))
+        if strip_start:
+            text = text.lstrip()
+        if strip_end:
+            stripped = text.rstrip()
+            # Exceto o espaço de controle ('\ '): um número ímpar de '\' antes do espaço
+            if (len(stripped) - len(stripped.rstrip('\\'))) % 2 == 0:
+                text = stripped
+        return text
+
+    @staticmethod
+    def effective_setup(setup):
+        # As linhas da equação já entram pela normalização; o resto do setup define o vídeo
+        return json.dumps({k: v for k, v in setup.items() if k != "equation_latex_lines"}, sort_keys=True, default=str)
+
+    def deduplicate(self, equations_data, animation_setups):
+        """
+        Args:
+            equations_data (dict): {eq_id: linhas} do Reader.
+            animation_setups (dict): {eq_id: setup} do Designer.
+
+        Returns:
+            tuple: (equações únicas, setups únicos), apenas com os representantes de cada grupo.
+        """
+        self.groups = {}
+        representative_by_key = {}
+        unique_equations = {}
+        unique_setups = {}
+
+        for eq_id, eq_lines in equations_data.items():
+            setup = animation_setups.get(eq_id, {})
+            key = (self.normalize_latex(eq_lines), self.effective_setup(setup))
+            representative = representative_by_key.get(key)
+            if representative is None:
+                representative_by_key[key] = eq_id
+                self.groups[eq_id] = [eq_id]
+                unique_equations[eq_id] = eq_lines
+                unique_setups[eq_id] = setup
+            else:
+                self.groups[representative].append(eq_id)
+
+        removed = len(equations_data) - len(unique_equations)
+        METRICS.inc("dedup_renders_avoided_total", removed)
+        if equations_data:
+            logger.info(f"Deduplicação: {len(equations_data)} equações -> {len(unique_equations)} únicas "
+                        f"({removed} renderizações evitadas, {removed / len(equations_data):.0%}).")
+        return unique_equations, unique_setups
+
+    def fan_out(self, video_path_for, output_dir, manifest_name="dedup_manifest.json"):
+        """
+        Disponibiliza o vídeo de cada representante para os outros IDs do grupo (hard link
+        ou cópia) e grava o manifesto em output_dir.
+
+        Args:
+            video_path_for (callable): Recebe um eq_id e devolve o caminho do vídeo dele.
+            output_dir (str): Diretório de saída dos vídeos.
+
+        Returns:
+            dict: {eq_id: caminho do vídeo} para todos os IDs com vídeo disponível.
+        """
+        videos = {}
+        for representative, eq_ids in self.groups.items():
+            source_path = video_path_for(representative)
+            if not os.path.exists(source_path):
+                continue
+            videos[representative] = source_path
+            for eq_id in eq_ids:
+                if eq_id == representative:
+                    continue
+                dest_path = video_path_for(eq_id)
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                if os.path.exists(dest_path):
+                    os.remove(dest_path)
+                try:
+                    os.link(source_path, dest_path)
+                except OSError:
+                    shutil.copy2(source_path, dest_path)
+                videos[eq_id] = dest_path
+
+        os.makedirs(output_dir, exist_ok=True)
+        manifest_path = os.path.join(output_dir, manifest_name)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({"groups": self.groups, "videos": videos}, f, indent=4, ensure_ascii=False)
+        logger.debug(f"Manifesto de deduplicação salvo em: {manifest_path}")
+        return videos
@@ -1,38 +1,120 @@
 # designer.py
+import collections.abc
+import logging
 import os
 
+from equation_store import AnimationSetups
+from metrics import METRICS
+from style_rules import RuleEngine, estimate_duration
+
+logger = logging.getLogger(__name__)
+
+# Setup padrão, compartilhado por todas as equações; cada setup guarda só o que altera
+DEFAULT_SETUP = {
+    "equation_latex_lines": None,    # Derivado: as linhas da equação original
+    "animation_type": "Write",       # Tipo de animação padrão (ex: escrita)
+    "color": "#FFFFFF",              # Cor padrão (branco)
+    "position": (0, 0, 0),           # Posição padrão (centro da tela); tupla para não ser alterada por engano
+    "scale": 1.0,                    # Escala padrão
+    "duration": None,                # Derivado: duração baseada na complexidade da equação
+    "delay_before": 0.5,             # Pequeno atraso antes de animar
+    "delay_after": 1.0,              # Atraso após a animação
+    "show_equation_after": True,     # Manter a equação na tela após animar
+}
+
+# Campos calculados a partir das linhas da equação
+DERIVED_SETUP_FIELDS = {
+    "equation_latex_lines": lambda eq_lines_list: eq_lines_list,
+    "duration": estimate_duration,
+}
+
 class Designer:
-    def __init__(self):
+    def __init__(self, rules=None):
+        """
+        Args:
+            rules (list): Regras de estilo (StyleRule ou {"match": {...}, "style": {...}}) aplicadas
+                          sobre o setup padrão, na ordem; ver style_rules.py.
+        """
         # O dicionário de setup padrão será armazenado aqui
         self.anim_setups = {}
+        self.rule_engine = RuleEngine(rules) if rules else None
 
-    def set_deafult_anim(self, equations_data_from_reader):
+    def set_deafult_anim(self, equations_data_from_reader, locations=None):
+        """
+        Args:
+            equations_data_from_reader (Mapping): {eq_id: linhas} do Reader.
+            locations (Mapping): Reader.equation_locations, usado pelas regras por arquivo ou ambiente
+                                 (dispensável quando as equações vêm em um EquationStore).
+        """
 
-        if not isinstance(equations_data_from_reader, dict):
-            print("Erro: O 'equations_data_from_reader' deve ser um dicionário.")
+        if not isinstance(equations_data_from_reader, collections.abc.Mapping):
+            logger.error("O 'equations_data_from_reader' deve ser um dicionário.")
             return {}
 
         if not equations_data_from_reader:
-            print("Aviso: O dicionário de equações do Reader está vazio. Nenhum setup será criado.")
+            logger.warning("O dicionário de equações do Reader está vazio. Nenhum setup será criado.")
             return {}
 
-        print("Iniciando a criação de setups padrão para as equações...")
+        logger.debug("Iniciando a criação de setups padrão para as equações...")
         
-        for eq_id, eq_lines_list in equations_data_from_reader.items():
-            # Definindo um setup padrão para cada bloco de equação
-            default_setup = {
-                "equation_latex_lines": eq_lines_list, # Mantém as linhas da equação original
-                "animation_type": "Write",             # Tipo de animação padrão (ex: escrita)
-                "color": "#FFFFFF",                    # Cor padrão (branco)
-                "position": [0, 0, 0],                 # Posição padrão (centro da tela)
-                "scale": 1.0,                          # Escala padrão
-                "duration": len(eq_lines_list) * 1.5,  # Duração baseada no número de linhas
-                "delay_before": 0.5,                   # Pequeno atraso antes de animar
-                "delay_after": 1.0,                    # Atraso após a animação
-                "show_equation_after": True,           # Manter a equação na tela após animar
-            }
-            self.anim_setups[eq_id] = default_setup
-            print(f" - Setup padrão criado para: {eq_id}")
-
-        print(f"Total de {len(self.anim_setups)} setups padrão criados.")
-        return self.anim_setups
\ No newline at end of file
+        with METRICS.timer("stage_seconds", stage="design"):
+            # Nenhum dict é criado por equação: os setups são visões sobre o registro padrão
+            self.anim_setups = AnimationSetups(equations_data_from_reader, DEFAULT_SETUP, DERIVED_SETUP_FIELDS)
+            if self.rule_engine is not None:
+                self._apply_rule_engine(self.rule_engine, locations)
+        METRICS.inc("designer_setups_total", len(equations_data_from_reader))
+
+        logger.info(f"Total de {len(self.anim_setups)} setups padrão criados.")
+        return self.anim_setups
+
+    def apply_rules(self, rules, locations=None):
+        """
+        Aplica regras de estilo a todos os setups criados por set_deafult_anim, em uma passagem.
+        Os estilos de regras anteriores são substituídos; as alterações feitas à mão são mantidas.
+
+        Returns:
+            AnimationSetups: self.anim_setups
+        """
+        if not isinstance(self.anim_setups, AnimationSetups):
+            logger.warning("Nenhum setup padrão criado. Chame set_deafult_anim antes de aplicar regras.")
+            return self.anim_setups
+        with METRICS.timer("stage_seconds", stage="style_rules"):
+            self._apply_rule_engine(RuleEngine(rules), locations)
+        return self.anim_setups
+
+    def _apply_rule_engine(self, rule_engine, locations):
+        styles = rule_engine.apply(self.anim_setups.equations, locations)
+        self.anim_setups.set_styles(styles)
+        METRICS.inc("designer_styled_total", len(styles))
+        logger.info(f"Regras de estilo: {len(styles)} de {len(self.anim_setups)} equação(ões) estilizada(s) "
+                    f"com {len(rule_engine.rules)} regra(s).")
+
+    def iter_default_anim(self, equations_stream):
+        """
+        Versão em streaming de set_deafult_anim, para consumir Reader.iter_equations.
+
+        Os setups não são acumulados em self.anim_setups, mantendo a memória limitada
+        independentemente do tamanho do projeto.
+
+        Args:
+            equations_stream (iterable): Tuplas (eq_id, linhas, source_location) do Reader.
+
+        Yields:
+            tuple: (eq_id, linhas, setup)
+        """
+        for eq_id, eq_lines_list, *location in equations_stream:
+            yield eq_id, eq_lines_list, self.build_setup(eq_lines_list, location[0] if location else None)
+
+    def build_setup(self, eq_lines_list, location=None):
+        """Setup (dict independente) de uma única equação: padrão mais as regras de estilo que casarem."""
+        setup = self._build_default_setup(eq_lines_list)
+        if self.rule_engine is not None:
+            setup.update(self.rule_engine.style_for(eq_lines_list, location) or {})
+        return setup
+
+    def _build_default_setup(self, eq_lines_list):
+        # Setup padrão de um único bloco de equação, como dict independente
+        setup = dict(DEFAULT_SETUP)
+        for field, derive in DERIVED_SETUP_FIELDS.items():
+            setup[field] = derive(eq_lines_list)
+        return setup
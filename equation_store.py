@@ -0,0 +1,253 @@
+# equation_store.py
+# Armazenamento compacto das equações do Reader e dos setups do Designer.
+#
+# Com centenas de milhares de equações, um dict de listas de str (e um dict de nove chaves
+# por setup) custa centenas de MB. Aqui as linhas ficam em uma única lista de strings
+# internadas e os dados de origem em arrays; os setups guardam um registro padrão
+# compartilhado e apenas o que cada equação altera. As duas classes se comportam como os
+# dicionários antigos ({eq_id: linhas} e {eq_id: setup}), então o resto do pipeline não muda.
+import collections.abc
+import sys
+from array import array
+
+
+class EquationStore(collections.abc.Mapping):
+    """
+    Mapeamento {eq_id: [linhas]} com as linhas internadas e a origem de cada bloco em arrays.
+
+    store[eq_id] devolve uma lista nova a cada acesso; alterá-la não altera o store.
+    A origem dos blocos fica em store.locations ({eq_id: {"file", "environment", "offset", "line"}}).
+    """
+    __slots__ = ("_index", "_lines", "_line_starts", "_files", "_file_ids", "_file_index",
+                 "_environments", "_environment_ids", "_environment_index", "_offsets", "_line_numbers",
+                 "locations")
+
+    def __init__(self, equations=None):
+        self._index = {}                    # {eq_id: posição}
+        self._lines = []                    # Linhas de todas as equações, em sequência
+        self._line_starts = array('L', [0]) # Linhas da posição i: _lines[_line_starts[i]:_line_starts[i + 1]]
+        self._files = []
+        self._file_ids = {}
+        self._file_index = array('L')
+        self._environments = []
+        self._environment_ids = {}
+        self._environment_index = array('H')
+        self._offsets = array('Q')
+        self._line_numbers = array('L')
+        self.locations = _LocationsView(self)
+        for eq_id, lines in (equations or {}).items():
+            self.add(eq_id, lines)
+
+    @staticmethod
+    def _intern(value, values, ids):
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(values)
+            values.append(value)
+        return value_id
+
+    def add(self, eq_id, lines, location=None):
+        """
+        Args:
+            eq_id (str): ID da equação; um ID repetido substitui o anterior.
+            lines (list): Linhas LaTeX da equação.
+            location (dict): {"file", "environment", "offset", "line"} do Reader. Opcional.
+        """
+        location = location or {}
+        self._index[sys.intern(eq_id)] = len(self._line_starts) - 1
+        self._lines.extend(sys.intern(line) for line in lines)
+        self._line_starts.append(len(self._lines))
+        self._file_index.append(self._intern(location.get("file"), self._files, self._file_ids))
+        self._environment_index.append(self._intern(location.get("environment"), self._environments, self._environment_ids))
+        self._offsets.append(location.get("offset") or 0)
+        self._line_numbers.append(location.get("line") or 0)
+
+    def line_count(self, eq_id):
+        position = self._index[eq_id]
+        return self._line_starts[position + 1] - self._line_starts[position]
+
+    def location(self, eq_id):
+        position = self._index[eq_id]
+        return {
+            "file": self._files[self._file_index[position]],
+            "environment": self._environments[self._environment_index[position]],
+            "offset": self._offsets[position],
+            "line": self._line_numbers[position],
+        }
+
+    def iter_sources(self):
+        """Percorre as equações em ordem, devolvendo (eq_id, linhas, arquivo, ambiente)."""
+        lines, starts = self._lines, self._line_starts
+        files, file_index = self._files, self._file_index
+        environments, environment_index = self._environments, self._environment_index
+        for eq_id, position in self._index.items():
+            yield (eq_id, lines[starts[position]:starts[position + 1]],
+                   files[file_index[position]], environments[environment_index[position]])
+
+    def __getitem__(self, eq_id):
+        position = self._index[eq_id]
+        return self._lines[self._line_starts[position]:self._line_starts[position + 1]]
+
+    def __contains__(self, eq_id):
+        return eq_id in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return f"EquationStore({len(self)} equação(ões), {len(self._files)} arquivo(s))"
+
+
+class _LocationsView(collections.abc.Mapping):
+    """Visão {eq_id: {"file", "environment", "offset", "line"}} sobre um EquationStore."""
+    __slots__ = ("_store",)
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, eq_id):
+        return self._store.location(eq_id)
+
+    def __contains__(self, eq_id):
+        return eq_id in self._store
+
+    def __iter__(self):
+        return iter(self._store)
+
+    def __len__(self):
+        return len(self._store)
+
+
+class AnimationSetups(collections.abc.Mapping):
+    """
+    Mapeamento {eq_id: setup} formado por um registro padrão compartilhado, campos derivados
+    das linhas da equação, estilos atribuídos por regras (dicts compartilhados entre as
+    equações que casam com as mesmas regras) e os campos alterados por equação (overrides esparsos).
+
+    Cada valor é um SetupView, que se comporta como o dict de setup antigo: atribuir um campo
+    grava um override daquela equação, e remover um campo volta ao valor padrão.
+
+    Args:
+        equations (Mapping): {eq_id: linhas}; define as chaves do mapeamento.
+        defaults (dict): Registro padrão, na ordem em que os campos devem aparecer.
+        derived (dict): {campo: função(linhas)} para campos que dependem da equação. Cada valor
+                        é calculado uma vez por conteúdo de equação e guardado (o setup é lido
+                        várias vezes, ex: ao gravar o JSON de dados e ao estimar os quadros).
+    """
+    __slots__ = ("defaults", "derived", "_equations", "_styles", "_overrides", "_derived_values")
+
+    def __init__(self, equations, defaults, derived=None):
+        self.defaults = defaults
+        self.derived = derived or {}
+        self._equations = equations
+        self._styles = {}     # {eq_id: estilo compartilhado}, apenas para as equações com regras
+        self._overrides = {}  # {eq_id: {campo: valor}}, apenas para as equações alteradas
+        # {campo: {linhas: valor}}; a chave são as linhas, então um ID substituído no
+        # EquationStore com outro conteúdo não reaproveita o valor antigo
+        self._derived_values = {}
+
+    @property
+    def equations(self):
+        return self._equations
+
+    def resolve(self, eq_id, field):
+        """Valor efetivo de field: override da equação, estilo das regras, campo derivado ou valor padrão."""
+        overrides = self._overrides.get(eq_id)
+        if overrides and field in overrides:
+            return overrides[field]
+        style = self._styles.get(eq_id)
+        if style and field in style:
+            return style[field]
+        if field in self.derived:
+            eq_lines = self._equations[eq_id]
+            values = self._derived_values.setdefault(field, {})
+            key = tuple(eq_lines)
+            try:
+                return values[key]
+            except KeyError:
+                value = values[key] = self.derived[field](eq_lines)
+                return value
+        return self.defaults[field]
+
+    def fields(self, eq_id):
+        extra = {**self._styles.get(eq_id, {}), **self._overrides.get(eq_id, {})}
+        return list(self.defaults) + [field for field in self.derived if field not in self.defaults] + \
+            [field for field in extra if field not in self.defaults and field not in self.derived]
+
+    def set_styles(self, styles):
+        """Substitui os estilos atribuídos por regras ({eq_id: estilo}); os overrides são mantidos."""
+        self._styles = dict(styles)
+
+    def overrides(self, eq_id):
+        """Cópia dos campos alterados de eq_id (vazia se a equação usa só o padrão)."""
+        return dict(self._overrides.get(eq_id, {}))
+
+    def override(self, eq_id, **fields):
+        if eq_id not in self._equations:
+            raise KeyError(eq_id)
+        self._overrides.setdefault(eq_id, {}).update(fields)
+
+    def clear_override(self, eq_id, field=None):
+        """Remove um campo alterado de eq_id (ou todos, se field for None)."""
+        overrides = self._overrides.get(eq_id)
+        if overrides is None:
+            return
+        if field is None:
+            del self._overrides[eq_id]
+            return
+        overrides.pop(field, None)
+        if not overrides:
+            del self._overrides[eq_id]
+
+    def __getitem__(self, eq_id):
+        if eq_id not in self._equations:
+            raise KeyError(eq_id)
+        return SetupView(self, eq_id)
+
+    def __contains__(self, eq_id):
+        return eq_id in self._equations
+
+    def __iter__(self):
+        return iter(self._equations)
+
+    def __len__(self):
+        return len(self._equations)
+
+    def __repr__(self):
+        return f"AnimationSetups({len(self)} setup(s), {len(self._styles)} com regras, {len(self._overrides)} com alterações)"
+
+
+class SetupView(collections.abc.MutableMapping):
+    """Setup de uma equação dentro de um AnimationSetups. Use dict(view) para uma cópia independente."""
+    __slots__ = ("_setups", "eq_id")
+
+    def __init__(self, setups, eq_id):
+        self._setups = setups
+        self.eq_id = eq_id
+
+    def __getitem__(self, field):
+        try:
+            return self._setups.resolve(self.eq_id, field)
+        except KeyError:
+            raise KeyError(field) from None
+
+    def __setitem__(self, field, value):
+        self._setups.override(self.eq_id, **{field: value})
+
+    def __delitem__(self, field):
+        # Um campo do registro padrão não pode sumir: apenas deixa de ser alterado
+        if field not in self._setups.overrides(self.eq_id):
+            raise KeyError(field)
+        self._setups.clear_override(self.eq_id, field)
+
+    def __iter__(self):
+        return iter(self._setups.fields(self.eq_id))
+
+    def __len__(self):
+        return len(self._setups.fields(self.eq_id))
+
+    def __repr__(self):
+        return f"SetupView({self.eq_id!r}, {dict(self)!r})"
@@ -0,0 +1,136 @@
+# generic_scene.py
+# Módulo de cena único e importável, usado por todas as renderizações do Animator.
+# Nenhum arquivo .py é gerado por equação: os parâmetros do job (quais equações animar e
+# onde estão os dados) são lidos em tempo de execução a partir de variáveis de ambiente
+# (renderização pela linha de comando do Manim) ou passados diretamente (pool de workers).
+import collections
+import json
+import logging
+import os
+import sys
+
+from manim import Scene, MathTex, Write, FadeIn, Create, FadeOut, WHITE
+
+logger = logging.getLogger(__name__)
+
+# JSON com {"equations_data": {...}, "setup_defaults": {...}, "animation_setups": {...}} escrito pelo
+# Animator; cada setup traz só os campos que diferem de setup_defaults
+DATA_FILE_ENV = "NIV_SCENE_DATA_FILE"
+# JSON {nome_da_classe: eq_id} com as cenas que este processo deve expor ao Manim
+SCENES_ENV = "NIV_SCENE_CLASSES"
+# Cache compartilhado de SVGs do LaTeX (ver tex_cache.py); opcional
+TEX_CACHE_DIR_ENV = "NIV_TEX_CACHE_DIR"
+TEX_CACHE_MAX_BYTES_ENV = "NIV_TEX_CACHE_MAX_BYTES"
+
+# O Manim carrega este arquivo pelo caminho: os módulos do projeto (ex: tex_cache) precisam estar no sys.path
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+if _PROJECT_DIR not in sys.path:
+    sys.path.insert(0, _PROJECT_DIR)
+
+_loaded_data = {} # {caminho: (equations_data, animation_setups)}, lido uma vez por processo
+
+
+def load_job_data(data_file):
+    """Carrega (e memoriza) o JSON de dados; um lote com várias cenas o lê uma única vez."""
+    if data_file not in _loaded_data:
+        with open(data_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        setup_defaults = data.get("setup_defaults", {})
+        animation_setups = {eq_id: collections.ChainMap(setup, setup_defaults)
+                            for eq_id, setup in data["animation_setups"].items()}
+        _loaded_data[data_file] = (data["equations_data"], animation_setups)
+    return _loaded_data[data_file]
+
+
+def install_tex_cache(cache_dir=None, max_size_bytes=None):
+    """Instala o cache de SVGs no processo atual, se houver um diretório configurado."""
+    cache_dir = cache_dir or os.environ.get(TEX_CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+    if max_size_bytes is None:
+        max_size_bytes = int(os.environ.get(TEX_CACHE_MAX_BYTES_ENV, 512 * 1024 ** 2))
+    import tex_cache
+    return tex_cache.install(cache_dir, max_size_bytes)
+
+
+def animate_block(scene, current_block_id, equations_data, animation_setups):
+    """Anima o bloco current_block_id na cena, de acordo com o seu setup do Designer."""
+    if current_block_id in equations_data and current_block_id in animation_setups:
+        eq_lines = equations_data[current_block_id]
+        setup = animation_setups[current_block_id]
+
+        logger.debug(f"Animando bloco na cena: {current_block_id}")
+
+        manim_latex_string = "\n".join(eq_lines)
+
+        math_tex_obj = MathTex(
+            manim_latex_string,
+            color=setup.get("color", WHITE)
+        ).scale(setup.get("scale", 1.0))
+
+        position = setup.get("position")
+        if position:
+            if isinstance(position, (list, tuple)) and len(position) == 3:
+                math_tex_obj.move_to(position)
+            else:
+                logger.warning(f"Posição inválida para {current_block_id}: {position}. Usando padrão.")
+
+        scene.wait(setup.get("delay_before", 0.5))
+
+        animation_type = setup.get("animation_type", "Write")
+        duration = setup.get("duration", 1.5)
+
+        if animation_type == "Write":
+            scene.play(Write(math_tex_obj, run_time=duration))
+        elif animation_type == "FadeIn":
+            scene.play(FadeIn(math_tex_obj, run_time=duration))
+        elif animation_type == "Create":
+            scene.play(Create(math_tex_obj, run_time=duration))
+        elif animation_type == "Transform":
+            logger.warning(f"Tipo de animação '{animation_type}' requer lógica mais complexa. Usando Write.")
+            scene.play(Write(math_tex_obj, run_time=duration))
+        else:
+            logger.warning(f"Tipo de animação '{animation_type}' não reconhecido. Usando Write.")
+            scene.play(Write(math_tex_obj, run_time=duration))
+
+        scene.wait(setup.get("delay_after", 1.0))
+
+        if not setup.get("show_equation_after", True):
+            scene.play(FadeOut(math_tex_obj))
+    else:
+        logger.warning(f"Bloco '{current_block_id}' não encontrado nos dados ou setups da cena. Nenhuma animação.")
+
+    scene.wait(1) # Espera final para esta cena individual
+
+
+class GenericEquationScene(Scene):
+    """
+    Cena que anima um único bloco de equação. As subclasses criadas por make_scene_class
+    definem block_id e, opcionalmente, os próprios dados; sem dados, eles são lidos do
+    arquivo indicado em NIV_SCENE_DATA_FILE.
+    """
+    block_id = None
+    equations_data = None
+    animation_setups = None
+
+    def construct(self):
+        install_tex_cache()
+        equations_data, animation_setups = self.equations_data, self.animation_setups
+        if equations_data is None:
+            equations_data, animation_setups = load_job_data(os.environ[DATA_FILE_ENV])
+        animate_block(self, self.block_id, equations_data, animation_setups)
+
+
+def make_scene_class(class_name, eq_id, equations_data=None, animation_setups=None):
+    """Cria a classe de cena de eq_id, com o nome que o Manim receberá na linha de comando."""
+    return type(class_name, (GenericEquationScene,), {
+        "__module__": __name__,
+        "block_id": eq_id,
+        "equations_data": equations_data,
+        "animation_setups": animation_setups,
+    })
+
+
+# Na linha de comando, o Manim procura as cenas pelos nomes dos atributos deste módulo
+for _class_name, _eq_id in json.loads(os.environ.get(SCENES_ENV, "{}")).items():
+    globals()[_class_name] = make_scene_class(_class_name, _eq_id)
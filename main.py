@@ -1,21 +1,40 @@
 from reader import Reader
 from designer import Designer
 from animator import Animator
+from metrics import METRICS
+import argparse
+import logging
 import sys
 import os
 import re
 
 if __name__ == "__main__":
-    # Defina o caminho do projeto LaTeX a ser processado
-    caminho_do_projeto_latex = r"C:\Users\Madjer\Documents\Nivelamento\2026\manim_py"
+    parser = argparse.ArgumentParser(description="Gera as animações das equações de um projeto LaTeX.")
+    # Caminho padrão do projeto LaTeX a ser processado
+    parser.add_argument("project_dir", nargs="?", default=r"C:\Users\Madjer\Documents\Nivelamento\2026\manim_py",
+                        help="Pasta do projeto LaTeX.")
+    parser.add_argument("--recursive", action="store_true", help="Inclui os subdiretórios.")
+    parser.add_argument("--output", default="generated_animations_final", help="Pasta dos vídeos.")
+    parser.add_argument("--journal", help="Journal de renderização (JSONL), ex: render_journal.jsonl.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continua uma execução interrompida: pula as equações concluídas no journal.")
+    args = parser.parse_args()
+    if args.resume and not args.journal:
+        parser.error("--resume requer --journal.")
+
+    # Mensagens dos módulos: use logging.DEBUG para ver o andamento de cada equação
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-7s %(name)s: %(message)s", datefmt="%H:%M:%S")
+
+    caminho_do_projeto_latex = args.project_dir
 
     print(f"--- Iniciando processamento para o diretório: {caminho_do_projeto_latex} ---")
     print("-" * 30)
 
     # FASE 1: Leitura dos arquivos .tex e extração das equações
-    leitor = Reader()
+    # O índice de varredura evita reprocessar arquivos .tex que não mudaram desde a última execução
+    leitor = Reader(index_path=".scan_index.json")
     leitor.verify_path(caminho_do_projeto_latex)
-    tex_files_encontrados = leitor.get_tex_files(caminho_do_projeto_latex)
+    tex_files_encontrados = leitor.get_tex_files(caminho_do_projeto_latex, recursive=args.recursive)
     equacoes_encontradas = leitor.find_equations_in_files(tex_files_encontrados)
 
     print("\n--- Equações Encontradas pelo Reader: ---")
@@ -57,15 +76,12 @@ if __name__ == "__main__":
             print("Nenhum bloco para animar. Encerrando.")
             exit(0)
 
-        animador = Animator()
-        #animador.test_hello_manim(output_dir="minhas_animacoes_de_teste")
-        # Define o caminho para o seu arquivo de cena Manim de teste (o prefab)
-        manim_file_to_test = "manim_scene_template.py"
-        
-        # Define o diretório onde o vídeo será salvo
-        output_test_dir = "direto_do_manim_template"
-        
-        # Chama a nova função para renderizar o arquivo Manim
-        animador.render_manim_file(manim_file_to_test, output_test_dir)
+        # Com --journal, o estado de cada job é registrado; com --resume, os já concluídos são pulados
+        animador = Animator(journal_path=args.journal, resume=args.resume)
+        animador.generate_all_scenes(equacoes_encontradas, setups_animacao_padrao, args.output)
+        print(f"Vídeos salvos em: {args.output}")
 
+    # Tempos por etapa e contadores da execução (o .prom pode ser lido pelo node_exporter)
+    METRICS.write_json("metrics.json")
+    METRICS.write_prometheus("metrics.prom")
     print("\n--- Processamento concluído ---")
@@ -0,0 +1,245 @@
+# manim_process.py
+# Execução de um processo do Manim com a saída lida linha a linha. Apenas as últimas linhas
+# ficam em memória (buffer circular); o log completo vai para um arquivo temporário em disco
+# e só é preservado quando a renderização falha.
+import asyncio
+import codecs
+import collections
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Barra de progresso do Manim: "Animation 0: Write(MathTex(...)):  45%|####5     | 27/60 [...]"
+_PROGRESS_PATTERN = re.compile(r'Animation\s+(\d+)\s*:.*?(\d+)%\|[^|]*\|\s*(\d+)/(\d+)')
+# "Animation 0 : Partial movie file written in '...'"
+_PARTIAL_WRITTEN_PATTERN = re.compile(r'Animation\s+(\d+)\s*:\s*Partial movie file written')
+# "File ready at '.../scene_x.mp4'"
+_FILE_READY_PATTERN = re.compile(r"File ready at\s*'?([^']+?)'?\s*$")
+_ANSI_PATTERN = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+_LINE_SPLIT_PATTERN = re.compile(r'\r\n|\r|\n')
+# Após um kill, espera máxima pela leitura do restante da saída (netos do Manim, como o
+# ffmpeg, podem manter o pipe aberto depois que o próprio processo morreu)
+READER_JOIN_TIMEOUT = 30
+
+
+def parse_event(line):
+    """
+    Converte uma linha da saída do Manim em um evento de progresso.
+
+    Returns:
+        dict | None: {"type": "progress", "animation", "percent", "frame", "total_frames"},
+                     {"type": "animation_done", "animation"} ou {"type": "file_written", "path"}.
+                     run_manim acrescenta "time" (time.monotonic() do momento da leitura).
+    """
+    if "Animation" in line:
+        match = _PROGRESS_PATTERN.search(line)
+        if match:
+            return {
+                "type": "progress",
+                "animation": int(match.group(1)),
+                "percent": int(match.group(2)),
+                "frame": int(match.group(3)),
+                "total_frames": int(match.group(4)),
+            }
+        match = _PARTIAL_WRITTEN_PATTERN.search(line)
+        if match:
+            return {"type": "animation_done", "animation": int(match.group(1))}
+    if "File ready at" in line:
+        match = _FILE_READY_PATTERN.search(line)
+        if match:
+            return {"type": "file_written", "path": match.group(1).strip()}
+    return None
+
+
+class _OutputLog:
+    """Destino das linhas de um processo do Manim: buffer circular, log completo em disco e eventos."""
+
+    def __init__(self, tail_lines, on_event):
+        self.tail = collections.deque(maxlen=tail_lines)
+        self.on_event = on_event
+        self.full_log = tempfile.TemporaryFile('w+', encoding='utf-8')
+        # A thread de leitura pode ainda estar viva quando finish fecha o log (ver run_manim)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def add(self, line):
+        with self._lock:
+            if self._closed:
+                return
+            self.full_log.write(line + "\n")
+            line = _ANSI_PATTERN.sub('', line)
+            if not line.strip():
+                return
+            self.tail.append(line)
+        if self.on_event is not None:
+            event = parse_event(line)
+            if event is not None:
+                event["time"] = time.monotonic()
+                try:
+                    self.on_event(event)
+                except Exception as e:
+                    # Parar de ler a saída travaria o Manim com o pipe cheio
+                    logger.error(f"Erro ao tratar evento de progresso: {e}")
+
+    def tail_text(self):
+        return "\n".join(self.tail)
+
+    def finish(self, succeeded, failure_log_path):
+        """
+        Descarta o log completo ou o preserva em failure_log_path, conforme o resultado.
+        Linhas recebidas depois disso são ignoradas.
+        """
+        with self._lock:
+            self._closed = True
+            self._finish(succeeded, failure_log_path)
+
+    def _finish(self, succeeded, failure_log_path):
+        try:
+            if succeeded:
+                # O log de uma tentativa anterior que falhou não descreve mais o resultado
+                if failure_log_path and os.path.exists(failure_log_path):
+                    os.remove(failure_log_path)
+            elif failure_log_path:
+                os.makedirs(os.path.dirname(failure_log_path) or ".", exist_ok=True)
+                self.full_log.flush()
+                self.full_log.seek(0)
+                with open(failure_log_path, 'w', encoding='utf-8') as f:
+                    shutil.copyfileobj(self.full_log, f)
+        finally:
+            self.full_log.close()
+
+
+def _manim_env(env):
+    env = dict(os.environ if env is None else env)
+    # Sem terminal, o rich quebra as linhas em 80 colunas e os padrões deixariam de casar
+    env["COLUMNS"] = "1000"
+    return env
+
+
+def run_manim(command, env=None, timeout=None, on_event=None, tail_lines=200, failure_log_path=None):
+    """
+    Executa o Manim lendo stdout e stderr em streaming.
+
+    Args:
+        command (list): Linha de comando do Manim.
+        env (dict): Ambiente do processo (None = ambiente atual).
+        timeout (float): Tempo máximo em segundos (None = sem limite).
+        on_event (callable): Chamado com cada evento de parse_event.
+        tail_lines (int): Número de linhas finais mantidas em memória.
+        failure_log_path (str): Onde gravar o log completo se o Manim falhar.
+
+    Returns:
+        str: As últimas tail_lines linhas da saída.
+
+    Raises:
+        subprocess.CalledProcessError / subprocess.TimeoutExpired: com as últimas linhas em
+        'output' e o log completo gravado em failure_log_path (se informado).
+    """
+    output = _OutputLog(tail_lines, on_event)
+    succeeded = False
+    process = None
+    try:
+        # O modo texto converte os '\r' das barras de progresso em quebras de linha
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   text=True, encoding='utf-8', errors='replace', env=_manim_env(env))
+
+        def consume():
+            for line in process.stdout:
+                output.add(line.rstrip('\n'))
+
+        reader = threading.Thread(target=consume, daemon=True)
+        reader.start()
+        try:
+            returncode = process.wait(timeout=timeout)
+            timed_out = False
+        except subprocess.TimeoutExpired:
+            process.kill()
+            returncode = process.wait()
+            timed_out = True
+        # A saída só é dada como completa (tail e log de falha) depois que a thread de leitura
+        # terminou; após um kill, netos do Manim (ex: ffmpeg) podem manter o pipe aberto
+        reader.join(READER_JOIN_TIMEOUT if timed_out else None)
+        if reader.is_alive():
+            # Fechar o pipe com a thread lendo dele faria a leitura falhar; ela termina sozinha
+            # quando o pipe fechar, e as linhas que chegarem depois de finish são descartadas
+            logger.warning(f"A saída do Manim continuou aberta {READER_JOIN_TIMEOUT} s após o fim do processo; log truncado.")
+        else:
+            process.stdout.close()
+        succeeded = not timed_out and returncode == 0
+    finally:
+        # Sem processo (ex: executável não encontrado) não há log a preservar
+        output.finish(succeeded, failure_log_path if process is not None else None)
+
+    if succeeded:
+        return output.tail_text()
+    if timed_out:
+        raise subprocess.TimeoutExpired(command, timeout, output=output.tail_text())
+    raise subprocess.CalledProcessError(returncode, command, output=output.tail_text())
+
+
+async def run_manim_async(command, env=None, timeout=None, on_event=None, tail_lines=200, failure_log_path=None):
+    """
+    Versão asyncio de run_manim (asyncio.create_subprocess_exec), com os mesmos argumentos,
+    retorno e exceções. Se a tarefa for cancelada (ex: Ctrl-C), o processo do Manim é encerrado
+    antes de o cancelamento ser propagado.
+    """
+    output = _OutputLog(tail_lines, on_event)
+    succeeded = False
+    timed_out = False
+    cancelled = False
+    process = reader = None
+    try:
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.STDOUT, env=_manim_env(env))
+
+        async def consume():
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            pending = ""
+            while True:
+                chunk = await process.stdout.read(65536)
+                if not chunk:
+                    break
+                # Como no modo texto de run_manim, '\r' (barras de progresso) também separa linhas
+                lines = _LINE_SPLIT_PATTERN.split(pending + decoder.decode(chunk))
+                pending = lines.pop()
+                for line in lines:
+                    output.add(line)
+            if pending:
+                output.add(pending)
+
+        reader = asyncio.ensure_future(consume())
+        try:
+            returncode = await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            returncode = await process.wait()
+            timed_out = True
+        try:
+            await asyncio.wait_for(reader, 5 if timed_out else None)
+        except asyncio.TimeoutError:
+            pass
+        succeeded = not timed_out and returncode == 0
+    except asyncio.CancelledError:
+        cancelled = True
+        if process is not None and process.returncode is None:
+            process.kill()
+            await asyncio.shield(process.wait())
+        if reader is not None:
+            reader.cancel()
+        raise
+    finally:
+        # Uma renderização interrompida (ou que nem começou) não deixa log de falha
+        output.finish(succeeded, failure_log_path if process is not None and not cancelled else None)
+
+    if succeeded:
+        return output.tail_text()
+    if timed_out:
+        raise subprocess.TimeoutExpired(command, timeout, output=output.tail_text())
+    raise subprocess.CalledProcessError(returncode, command, output=output.tail_text())
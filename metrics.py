@@ -0,0 +1,192 @@
+# metrics.py
+# Instrumentação leve do pipeline: contadores, gauges e histogramas com rótulos, exportáveis
+# como JSON ou no formato textfile do Prometheus (para o node_exporter).
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+import uuid
+
+# Limites (em segundos) dos histogramas de tempo: de milissegundos até vários minutos
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "bucket_counts", "count", "sum", "min", "max")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[index] += 1
+                break
+
+    def cumulative_counts(self):
+        total = 0
+        for count in self.bucket_counts:
+            total += count
+            yield total
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.cumulative_counts())},
+        }
+
+
+class Metrics:
+    """
+    Registro de métricas em memória, seguro entre threads.
+
+    Os nomes seguem a convenção do Prometheus (ex: 'render_job_seconds'); na exportação é
+    acrescentado o prefixo (padrão 'niv_'). Os rótulos são passados como argumentos nomeados:
+
+        METRICS.inc("renders_total", mode="batch")
+        with METRICS.timer("stage_seconds", stage="scan"):
+            ...
+    """
+
+    def __init__(self, prefix="niv_", buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.default_buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}     # {nome: {rótulos: valor}}
+        self._gauges = {}       # {nome: {rótulos: valor}}
+        self._histograms = {}   # {nome: {rótulos: _Histogram}}
+        self._help = {}         # {nome: descrição}
+
+    def describe(self, name, help_text):
+        """Descrição exibida no '# HELP' do Prometheus."""
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.default_buckets)
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Mede o tempo do bloco 'with' e o registra no histograma name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {"counters", "gauges", "histograms"}, cada um {nome: [{"labels", ...}]}.
+        """
+        with self._lock:
+            return {
+                "counters": {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                             for name, series in self._counters.items()},
+                "gauges": {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                           for name, series in self._gauges.items()},
+                "histograms": {name: [dict(histogram.as_dict(), labels=dict(key)) for key, histogram in series.items()]
+                               for name, series in self._histograms.items()},
+            }
+
+    def to_prometheus(self):
+        """Texto no formato de exposição do Prometheus."""
+        lines = []
+        with self._lock:
+            for kind, registry in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(registry.items()):
+                    full_name = self.prefix + name
+                    if name in self._help:
+                        lines.append(f"# HELP {full_name} {self._help[name]}")
+                    lines.append(f"# TYPE {full_name} {kind}")
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{full_name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                full_name = self.prefix + name
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} histogram")
+                for key, histogram in sorted(series.items()):
+                    for bound, count in zip(histogram.buckets, histogram.cumulative_counts()):
+                        lines.append(f"{full_name}_bucket{_format_labels(key, [('le', str(bound))])} {count}")
+                    lines.append(f"{full_name}_bucket{_format_labels(key, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        self._write_atomic(path, json.dumps(self.snapshot(), indent=4, ensure_ascii=False))
+        return path
+
+    def write_prometheus(self, path):
+        """Grava o textfile (ex: para o diretório do textfile collector do node_exporter)."""
+        self._write_atomic(path, self.to_prometheus())
+        return path
+
+    @staticmethod
+    def _write_atomic(path, content):
+        # O node_exporter pode ler o arquivo a qualquer momento: nunca deve vê-lo pela metade
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+# Registro global usado por Reader, Designer e Animator
+METRICS = Metrics()
@@ -1,10 +1,119 @@
 # reader.py
+import collections
+import concurrent.futures
+import fnmatch
+import hashlib
+import logging
+import mmap
 import os
 import re
+import time
+
+from equation_store import EquationStore
+from metrics import METRICS
+from scan_index import ScanIndex, file_digest
+
+logger = logging.getLogger(__name__)
+
+# Ambientes de equação reconhecidos e se eles suportam múltiplas linhas
+EQUATION_ENVIRONMENTS = {
+    "equation": False,
+    "equation*": False,
+    "eqnarray": True,
+    "eqnarray*": True,
+    "align": True,
+    "align*": True,
+    "gather": True,
+    "gather*": True,
+    "multline": True,
+    "multline*": True,
+    "split": True,
+}
+
+# Tokenizador único: escapes (\\ e \%), comentários e qualquer \begin{...}/\end{...}.
+# O nome do ambiente é verificado no dicionário acima, então o custo da varredura
+# não cresce com o número de ambientes suportados.
+_TOKEN_PATTERN = re.compile(r'\\[\\%]|%[^\n]*|\\(begin|end)\s*\{([A-Za-z]+\*?)\}')
+_COMMENT_PATTERN = re.compile(r'\\[\\%]|%[^\n]*')
+_LINE_BREAK_PATTERN = re.compile(r'\\\\\s*')
+_INPUT_PATTERN = re.compile(r'\\(?:input|include)\s*\{([^}]+)\}')
+# Mesma tokenização sobre bytes, usada na varredura via mmap
+_TOKEN_PATTERN_BYTES = re.compile(_TOKEN_PATTERN.pattern.encode('ascii'))
+_NEWLINE_COUNT_CHUNK = 1 << 20
+
+
+def _strip_comment(match):
+    # Mantém escapes e remove apenas os comentários de fato
+    token = match.group(0)
+    return token if token.startswith('\\') else ''
+
+
+def _matches_any(rel_path, name, patterns):
+    # Um padrão casa tanto com o caminho relativo à raiz quanto com o nome do arquivo
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+# Resultado do parse de um arquivo; digest e stat alimentam o índice de varredura
+# elapsed: segundos gastos na varredura (None quando o resultado veio do índice)
+ParsedFile = collections.namedtuple("ParsedFile", "tex_file blocks error block_errors digest stat elapsed", defaults=(None,))
+
+
+def _parse_tex_file(tex_file, encoding='utf-8'):
+    """
+    Lê e varre um único arquivo .tex. Função de módulo para poder ser usada em ProcessPoolExecutor.
+
+    O arquivo é mapeado em memória (mmap) e varrido como bytes; apenas o corpo de cada
+    bloco encontrado é decodificado. Um erro de codificação descarta só o bloco afetado.
+
+    Returns:
+        ParsedFile: blocos [(ambiente, linhas, offset, linha)], erro, avisos por bloco, hash e stat do arquivo.
+    """
+    blocks = []
+    block_errors = []
+    start_time = time.perf_counter()
+    try:
+        with open(tex_file, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            # mmap não aceita arquivos vazios
+            if stat.st_size == 0:
+                return ParsedFile(tex_file, blocks, None, block_errors, file_digest(b''), stat, time.perf_counter() - start_time)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                digest = file_digest(content)
+                for env, raw_body, offset, line_number in Reader._scan_equation_blocks(content, tex_file):
+                    try:
+                        body = _COMMENT_PATTERN.sub(_strip_comment, raw_body.decode(encoding))
+                    except UnicodeDecodeError as e:
+                        block_errors.append(f"Bloco '{env}' na linha {line_number} ignorado (erro de codificação: {e})")
+                        continue
+                    blocks.append((env, Reader._split_equation_lines(body, EQUATION_ENVIRONMENTS[env]), offset, line_number))
+        return ParsedFile(tex_file, blocks, None, block_errors, digest, stat, time.perf_counter() - start_time)
+    except Exception as e:
+        return ParsedFile(tex_file, blocks, e, block_errors, None, None)
+
+
+def _count_newlines(content, start, end):
+    # mmap não tem count(); conta em fatias para não copiar trechos grandes de uma vez
+    if isinstance(content, (str, bytes)):
+        return content.count('\n' if isinstance(content, str) else b'\n', start, end)
+    count = 0
+    for chunk_start in range(start, end, _NEWLINE_COUNT_CHUNK):
+        count += content[chunk_start:min(end, chunk_start + _NEWLINE_COUNT_CHUNK)].count(b'\n')
+    return count
+
 
 class Reader:
-    def __init__(self):
-        pass  # Construtor simples; pode ser expandido futuramente para configurações
+    def __init__(self, index_path=None, stable_ids=True, update_index=True):
+        """
+        Args:
+            index_path (str): Caminho do índice de varredura persistente. Se None, todo arquivo é reprocessado.
+            stable_ids (bool): Se True, os IDs são derivados do arquivo e do hash do conteúdo do bloco
+                               (ex: 'cap1.tex_3f2a9c01b7de'); se False, usa o contador global 'arquivo.tex_block_N'.
+            update_index (bool): Se False, o índice é só consultado e nunca regravado (ex: no dry-run).
+        """
+        # Localização de cada bloco encontrado: {eq_id: {"file", "environment", "offset", "line"}}
+        self.equation_locations = {}
+        self.stable_ids = stable_ids
+        self.scan_index = ScanIndex(index_path, read_only=not update_index) if index_path else None
 
     def verify_path(self, caminho_do_diretorio):
         # Normaliza o caminho para o formato do sistema operacional
@@ -12,81 +121,290 @@ class Reader:
 
         # Verifica se o caminho é uma string
         if not isinstance(caminho_do_diretorio, str):
-            print("Erro: O caminho do diretório deve ser uma string.")
+            logger.error("O caminho do diretório deve ser uma string.")
             exit(1)
 
         # Verifica se o caminho existe
         if not os.path.exists(caminho_do_diretorio):
-            print(f"Erro: O diretório '{caminho_do_diretorio}' não existe.")
+            logger.error(f"O diretório '{caminho_do_diretorio}' não existe.")
             exit(1)
 
         # Verifica se o caminho é um diretório
         if not os.path.isdir(caminho_do_diretorio):
-            print(f"Erro: '{caminho_do_diretorio}' não é um diretório válido.")
+            logger.error(f"'{caminho_do_diretorio}' não é um diretório válido.")
             exit(1)
 
-        print(f"Sucesso: O diretório '{caminho_do_diretorio}' é válido e existe.")
+        logger.debug(f"O diretório '{caminho_do_diretorio}' é válido e existe.")
+
+    def get_tex_files(self, caminho_do_diretorio, recursive=False, include=("*.tex",), exclude=(), follow_inputs=False):
+        """
+        Localiza os arquivos .tex do projeto.
+
+        Args:
+            caminho_do_diretorio (str): Diretório raiz do projeto LaTeX.
+            recursive (bool): Se True, percorre também os subdiretórios (via os.scandir).
+            include (tuple): Padrões glob (relativos à raiz) que um arquivo deve casar.
+            exclude (tuple): Padrões glob de arquivos ou diretórios a ignorar.
+            follow_inputs (bool): Se True, adiciona os arquivos referenciados por \\input/\\include.
 
-    def get_tex_files(self, caminho_do_diretorio):
+        Returns:
+            list: Caminhos dos arquivos .tex, em ordem determinística.
+        """
         self.verify_path(caminho_do_diretorio)
+        caminho_do_diretorio = os.path.normpath(caminho_do_diretorio.replace('\\', '/'))
+
         tex_files = []
-        # Lista todos os arquivos .tex no diretório fornecido
-        for file in os.listdir(caminho_do_diretorio):
-            if file.endswith('.tex'):
-                tex_files.append(os.path.join(caminho_do_diretorio, file))
+        pending_dirs = [caminho_do_diretorio]
+        while pending_dirs:
+            current_dir = pending_dirs.pop()
+            try:
+                with os.scandir(current_dir) as entries:
+                    entries = sorted(entries, key=lambda entry: entry.name)
+            except OSError as e:
+                logger.warning(f"Não foi possível listar o diretório '{current_dir}': {e}")
+                continue
+
+            sub_dirs = []
+            for entry in entries:
+                rel_path = os.path.relpath(entry.path, caminho_do_diretorio).replace(os.sep, '/')
+                if _matches_any(rel_path, entry.name, exclude):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        sub_dirs.append(entry.path)
+                elif entry.is_file() and _matches_any(rel_path, entry.name, include):
+                    tex_files.append(entry.path)
+            # Empilha em ordem reversa para visitar os subdiretórios em ordem alfabética
+            pending_dirs.extend(reversed(sub_dirs))
+
+        if follow_inputs:
+            tex_files = self._follow_tex_inputs(tex_files, caminho_do_diretorio)
+
         if not tex_files:
-            print(f"Erro: Nenhum arquivo .tex encontrado no diretório '{caminho_do_diretorio}'.")
+            logger.error(f"Nenhum arquivo .tex encontrado no diretório '{caminho_do_diretorio}'.")
             exit(1)
         return tex_files
 
-    def find_equations_in_files(self, tex_files):
-        all_equations = {}
-        equation_block_counter = 0
-
-        # Define os ambientes de equação e se eles suportam múltiplas linhas
-        equation_environments = [
-            ("equation", "equation", False),
-            ("equation*", "equation*", False),
-            ("eqnarray", "eqnarray", True),
-            ("eqnarray*", "eqnarray*", True),
-            ("align", "align", True),
-            ("align*", "align*", True),
-            # Adicione outros ambientes que comportem múltiplas linhas se necessário, ex: ("gather", "gather", True)
-        ]
-
-        for tex_file in tex_files:
-            file_name = os.path.basename(tex_file)
+    def _follow_tex_inputs(self, tex_files, root_dir):
+        # Percorre \input/\include a partir dos arquivos encontrados, sem repetir arquivos
+        seen = {os.path.normcase(os.path.abspath(path)) for path in tex_files}
+        ordered = list(tex_files)
+        queue = list(tex_files)
+        while queue:
+            tex_file = queue.pop(0)
             try:
-                with open(tex_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
+                # Só os comandos de inclusão interessam aqui; bytes inválidos não impedem a busca
+                with open(tex_file, 'r', encoding='utf-8', errors='replace') as f:
+                    content = _COMMENT_PATTERN.sub(_strip_comment, f.read())
+            except Exception as e:
+                logger.warning(f"Não foi possível seguir as inclusões de '{tex_file}': {e}")
+                continue
+
+            for match in _INPUT_PATTERN.finditer(content):
+                target = match.group(1).strip()
+                if not os.path.splitext(target)[1]:
+                    target += '.tex'
+                # O LaTeX resolve caminhos a partir do documento principal; tenta também a pasta do arquivo
+                for base_dir in (root_dir, os.path.dirname(tex_file)):
+                    candidate = os.path.normpath(os.path.join(base_dir, target))
+                    if os.path.isfile(candidate):
+                        key = os.path.normcase(os.path.abspath(candidate))
+                        if key not in seen:
+                            seen.add(key)
+                            ordered.append(candidate)
+                            queue.append(candidate)
+                        break
+                else:
+                    logger.warning(f"Arquivo incluído '{match.group(1)}' em '{tex_file}' não encontrado.")
+        return ordered
+
+    def find_equations_in_files(self, tex_files, workers=1, executor="thread"):
+        """
+        Extrai as equações dos arquivos .tex.
+
+        Args:
+            tex_files (list): Caminhos dos arquivos .tex.
+            workers (int): Número de workers para o parse em paralelo (1 = sequencial).
+            executor (str): "thread" ou "process".
+
+        Returns:
+            EquationStore: Mapeamento {eq_id: [linhas da equação]}. A ordem e os IDs independem
+                           do número de workers. A origem dos blocos fica em self.equation_locations.
+        """
+        all_equations = EquationStore()
+        self.equation_locations = all_equations.locations
+
+        with METRICS.timer("stage_seconds", stage="scan"):
+            for equation_id, lines, source_location in self.iter_equations(tex_files, workers, executor):
+                all_equations.add(equation_id, lines, source_location)
+        logger.info(f"{len(all_equations)} equação(ões) encontrada(s) em {len(tex_files)} arquivo(s).")
+
+        return all_equations
 
-                for begin_env, end_env, is_multiline in equation_environments:
-                    eqs_found_raw = self._find_equations_by_environment(content, begin_env, end_env)
+    def iter_equations(self, tex_files, workers=1, executor="thread"):
+        """
+        Versão em streaming de find_equations_in_files: devolve cada bloco assim que o
+        arquivo que o contém termina de ser varrido, sem acumular o projeto inteiro em memória.
 
-                    for eq_content_raw in eqs_found_raw:
-                        # Cria um ID único para cada bloco de equação
+        Args:
+            tex_files (iterable): Caminhos dos arquivos .tex.
+            workers (int): Número de workers para o parse em paralelo (1 = sequencial).
+            executor (str): "thread" ou "process".
+
+        Yields:
+            tuple: (eq_id, [linhas da equação], {"file", "environment", "offset", "line"})
+        """
+        equation_block_counter = 0
+
+        try:
+            for parsed in self._parse_files(tex_files, workers, executor):
+                tex_file = parsed.tex_file
+                for block_error in parsed.block_errors:
+                    logger.warning(f"{block_error} em '{tex_file}'.")
+                if parsed.error is not None:
+                    METRICS.inc("reader_files_total", result="error")
+                    logger.error(f"Erro ao ler ou processar o arquivo '{tex_file}': {parsed.error}")
+                    continue
+                if parsed.elapsed is None:
+                    METRICS.inc("reader_files_total", result="cached")
+                else:
+                    METRICS.inc("reader_files_total", result="parsed")
+                    METRICS.inc("reader_bytes_total", parsed.stat.st_size)
+                    METRICS.observe("reader_file_seconds", parsed.elapsed)
+
+                file_name = os.path.basename(tex_file)
+                ids_in_file = {}
+                for env, lines, offset, line_number in parsed.blocks:
+                    # Cria um ID único para cada bloco de equação
+                    if self.stable_ids:
+                        equation_id = self._stable_equation_id(file_name, tex_file, env, lines, ids_in_file)
+                    else:
                         equation_id = f"{file_name}_block_{equation_block_counter}"
+                    equation_block_counter += 1
+                    METRICS.inc("reader_equations_total", environment=env)
+                    yield equation_id, lines, {
+                        "file": tex_file,
+                        "environment": env,
+                        "offset": offset,
+                        "line": line_number,
+                    }
+        finally:
+            if self.scan_index is not None:
+                self.scan_index.save()
+                logger.info(f"Índice de varredura: {self.scan_index.hits} arquivo(s) reaproveitado(s), "
+                            f"{self.scan_index.misses} reprocessado(s).")
 
-                        # Processa o conteúdo dependendo se é multilinha ou não
-                        if is_multiline:
-                            # Divide em linhas se o ambiente for multilinha
-                            lines = [line.strip() for line in re.split(r'\\\\\s*', eq_content_raw) if line.strip()]
-                            all_equations[equation_id] = lines
-                        else:
-                            # Salva como uma lista com uma única string para ambientes de linha única
-                            all_equations[equation_id] = [eq_content_raw.strip()]
+    @staticmethod
+    def _stable_equation_id(file_name, tex_file, env, lines, ids_in_file):
+        # O ID depende só do arquivo e do conteúdo do bloco: editar outro bloco ou outro arquivo não o altera
+        content_hash = hashlib.sha1("\0".join([tex_file, env, *lines]).encode('utf-8')).hexdigest()[:12]
+        equation_id = f"{file_name}_{content_hash}"
+        # Blocos idênticos no mesmo arquivo recebem um sufixo de ocorrência
+        occurrence = ids_in_file.get(equation_id, 0)
+        ids_in_file[equation_id] = occurrence + 1
+        return equation_id if occurrence == 0 else f"{equation_id}_{occurrence}"
 
-                        equation_block_counter += 1
+    def _parse_files(self, tex_files, workers=1, executor="thread"):
+        # Os resultados são sempre devolvidos na ordem de tex_files, garantindo IDs determinísticos
+        if workers is None or workers <= 1:
+            for tex_file in tex_files:
+                cached = self._lookup_index(tex_file)
+                yield cached if cached is not None else self._store_index(_parse_tex_file(tex_file))
+            return
 
-            except Exception as e:
-                print(f"Erro ao ler ou processar o arquivo '{tex_file}': {e}")
+        if executor == "process":
+            pool_class = concurrent.futures.ProcessPoolExecutor
+        elif executor == "thread":
+            pool_class = concurrent.futures.ThreadPoolExecutor
+        else:
+            logger.warning(f"Executor '{executor}' desconhecido. Usando 'thread'.")
+            pool_class = concurrent.futures.ThreadPoolExecutor
+
+        # Janela deslizante de tarefas em andamento: limita a memória a alguns arquivos por worker
+        max_in_flight = workers * 2
+        pending = collections.deque()
+        with pool_class(max_workers=workers) as pool:
+            for tex_file in tex_files:
+                # Arquivos inalterados vêm do índice e entram na fila já resolvidos
+                cached = self._lookup_index(tex_file)
+                pending.append(cached if cached is not None else pool.submit(_parse_tex_file, tex_file))
+                if len(pending) >= max_in_flight:
+                    yield self._resolve_parsed(pending.popleft())
+            while pending:
+                yield self._resolve_parsed(pending.popleft())
+
+    def _resolve_parsed(self, item):
+        if isinstance(item, ParsedFile):
+            return item
+        return self._store_index(item.result())
+
+    def _lookup_index(self, tex_file):
+        if self.scan_index is None:
+            return None
+        blocks = self.scan_index.lookup(tex_file)
+        if blocks is None:
+            return None
+        return ParsedFile(tex_file, blocks, None, [], None, None)
+
+    def _store_index(self, parsed):
+        if self.scan_index is not None and parsed.error is None:
+            self.scan_index.store(parsed.tex_file, parsed.blocks, parsed.digest, parsed.stat)
+        return parsed
+
+    @staticmethod
+    def _scan_equation_blocks(content, source_name="<conteudo>"):
+        """
+        Varre o conteúdo uma única vez e devolve os blocos de equação em ordem de documento.
+
+        Aceita str, bytes ou um mmap. Para bytes/mmap, o corpo de cada bloco é devolvido
+        ainda como bytes, cabendo a quem chama decodificá-lo e remover os comentários.
+        Blocos aninhados (ex: split dentro de equation) são devolvidos como parte do bloco
+        mais externo, e trechos comentados com '%' são ignorados.
+
+        Yields:
+            tuple: (ambiente, conteudo_bruto, offset_do_begin, numero_da_linha)
+        """
+        is_text = isinstance(content, str)
+        token_pattern = _TOKEN_PATTERN if is_text else _TOKEN_PATTERN_BYTES
+        stack = []          # [(ambiente, inicio_do_conteudo, offset_do_begin, linha)]
+        line_number = 1
+        last_pos = 0
+
+        for match in token_pattern.finditer(content):
+            kind = match.group(1)
+            if kind is None:
+                # Escape (\\ ou \%) ou comentário
+                continue
+            env = match.group(2) if is_text else match.group(2).decode('ascii')
+            if env not in EQUATION_ENVIRONMENTS:
                 continue
 
-        return all_equations
-    
-    def _find_equations_by_environment(self, content, begin_env, end_env):
-        # Monta a expressão regular para capturar o conteúdo entre \begin e \end do ambiente
-        escaped_begin = re.escape(f"\\begin{{{begin_env}}}")
-        escaped_end = re.escape(f"\\end{{{end_env}}}")
-        pattern = rf'{escaped_begin}(.*?){escaped_end}'
-        return re.findall(pattern, content, re.DOTALL)
+            # Contagem incremental de linhas: cada trecho do arquivo é percorrido uma só vez
+            line_number += _count_newlines(content, last_pos, match.start())
+            last_pos = match.start()
+
+            if kind in ('begin', b'begin'):
+                stack.append((env, match.end(), match.start(), line_number))
+                continue
+
+            # \end sem \begin correspondente na pilha é ignorado
+            depth = next((i for i in range(len(stack) - 1, -1, -1) if stack[i][0] == env), None)
+            if depth is None:
+                logger.warning(f"'\\end{{{env}}}' sem '\\begin' correspondente em '{source_name}' (linha {line_number}).")
+                continue
+            _, body_start, begin_offset, begin_line = stack[depth]
+            del stack[depth:]
+            if not stack:
+                yield env, content[body_start:match.start()], begin_offset, begin_line
+
+        for env, _, _, begin_line in stack:
+            logger.warning(f"'\\begin{{{env}}}' sem '\\end' em '{source_name}' (linha {begin_line}). Bloco ignorado.")
+
+    @staticmethod
+    def _split_equation_lines(eq_content_raw, is_multiline):
+        # Processa o conteúdo dependendo se é multilinha ou não
+        if is_multiline:
+            # Divide em linhas se o ambiente for multilinha
+            return [line.strip() for line in _LINE_BREAK_PATTERN.split(eq_content_raw) if line.strip()]
+        # Salva como uma lista com uma única string para ambientes de linha única
+        return [eq_content_raw.strip()]
@@ -0,0 +1,193 @@
+# render_cache.py
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando a lógica de cena gerada pelo Animator mudar de forma a alterar o vídeo
+SCENE_LOGIC_VERSION = 1
+
+
+def get_manim_version():
+    """Versão instalada do Manim, sem importá-lo (a importação custa segundos)."""
+    try:
+        from importlib import metadata
+        return metadata.version("manim")
+    except Exception:
+        return "desconhecida"
+
+
+class RenderCache:
+    """
+    Cache de vídeos endereçado por conteúdo.
+
+    Cada vídeo é guardado como '<chave>.mp4', onde a chave é o hash de tudo o que influencia
+    o resultado da renderização. A data de modificação do arquivo marca o último uso, o que
+    permite evicção LRU sem um índice separado e funciona com vários processos ao mesmo tempo.
+    O sufixo é configurável para reaproveitar o mesmo mecanismo com outros artefatos (ex: SVGs).
+
+    O tamanho do cache é mantido como um total corrente, atualizado a cada inserção: a pasta só
+    é varrida na primeira inserção, quando o total passa de max_size_bytes ou a cada
+    evict_interval inserções (para considerar o que outros processos gravaram). A evicção
+    desce até evict_target do limite, então as inserções seguintes não varrem a pasta de novo.
+
+    As inserções vêm das threads de renderização: o total corrente e o contador ficam sob um
+    lock, e uma varredura de evicção por vez é feita em cada instância.
+
+    A pasta só é criada na primeira inserção: consultar o cache (ex: no dry-run do
+    render_plan.py) não grava nada no disco.
+    """
+
+    def __init__(self, cache_dir=".render_cache", max_size_bytes=2 * 1024 ** 3, suffix=".mp4", evict_interval=50,
+                 evict_target=0.9):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.suffix = suffix
+        self.evict_interval = max(1, evict_interval) # Inserções entre duas varreduras de evicção
+        self.evict_target = evict_target
+        self._puts_since_evict = 0
+        self._total_size = None  # Tamanho corrente do cache; None até a primeira varredura
+        self._lock = threading.Lock()        # Protege _puts_since_evict e _total_size
+        self._evict_lock = threading.Lock()  # Serializa as varreduras de evicção
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(eq_lines, setup, template_content, manim_version, quality_flags):
+        """
+        Args:
+            eq_lines (list): Linhas LaTeX da equação.
+            setup (dict): Setup de animação do Designer (dict ou SetupView).
+            template_content (str): Conteúdo do template de cena.
+            manim_version (str): Versão do Manim usada na renderização.
+            quality_flags (list): Flags de qualidade passadas ao Manim (ex: ["-ql"]).
+
+        Returns:
+            str: Chave SHA-256 em hexadecimal.
+        """
+        payload = json.dumps({
+            "lines": list(eq_lines),
+            "setup": dict(setup),
+            "template": template_content,
+            "manim": manim_version,
+            "quality": list(quality_flags),
+            "scene_logic": SCENE_LOGIC_VERSION,
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def get(self, key):
+        """Devolve o caminho do vídeo em cache para a chave, ou None."""
+        path = self._path_for(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path) # Marca como usado recentemente
+        except OSError:
+            pass
+        self.hits += 1
+        return path
+
+    def contains(self, key):
+        """True se a chave está no cache (sem contar acerto nem marcar o uso)."""
+        return os.path.exists(self._path_for(key))
+
+    def put(self, key, video_path):
+        """Copia um vídeo recém-renderizado para o cache e aplica a evicção LRU."""
+        if not os.path.exists(video_path):
+            logger.warning(f"Arquivo '{video_path}' não encontrado. Nada foi adicionado ao cache.")
+            return None
+        path = self._path_for(key)
+        try:
+            replaced_size = os.path.getsize(path)
+        except OSError:
+            replaced_size = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Cópia para um nome temporário + os.replace: leitores concorrentes nunca veem um arquivo pela metade
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            shutil.copyfile(video_path, temp_path)
+            added_size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        with self._lock:
+            self._puts_since_evict += 1
+            if self._total_size is not None:
+                self._total_size += added_size - replaced_size
+            needs_evict = (self._total_size is None or self._total_size > self.max_size_bytes
+                           or self._puts_since_evict >= self.evict_interval)
+            if needs_evict:
+                # Zera já aqui para que as inserções seguintes não disparem outra varredura
+                self._puts_since_evict = 0
+        if needs_evict:
+            self.evict()
+        return path
+
+    def materialize(self, key, dest_path):
+        """
+        Disponibiliza o vídeo em cache em dest_path, via hard link quando possível ou cópia.
+
+        Returns:
+            bool: True se o vídeo foi colocado em dest_path.
+        """
+        cached_path = self.get(key)
+        if cached_path is None:
+            return False
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(cached_path, dest_path)
+        except OSError:
+            shutil.copy2(cached_path, dest_path)
+        return True
+
+    def evict(self):
+        """
+        Remove os vídeos usados há mais tempo se o cache passou de max_size_bytes, até ele
+        ocupar evict_target do limite.
+        """
+        with self._evict_lock:
+            entries = []
+            total_size = 0
+            try:
+                with os.scandir(self.cache_dir) as it:
+                    for entry in it:
+                        if not entry.name.endswith(self.suffix):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total_size += stat.st_size
+            except FileNotFoundError:
+                pass # Cache ainda vazio
+
+            removed = 0
+            if total_size > self.max_size_bytes:
+                target_size = self.max_size_bytes * self.evict_target
+                for _, size, path in sorted(entries):
+                    if total_size <= target_size:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue # Outro processo pode ter removido antes
+                    total_size -= size
+                    removed += 1
+                logger.info(f"Cache '{self.cache_dir}': {removed} arquivo(s) antigo(s) removido(s) por limite de tamanho.")
+            with self._lock:
+                self._total_size = total_size
+                self._puts_since_evict = 0
+        return removed
@@ -0,0 +1,210 @@
+# render_daemon.py
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Nome da qualidade no config do Manim para cada flag de linha de comando
+QUALITY_NAMES = {
+    "-ql": "low_quality",
+    "-qm": "medium_quality",
+    "-qh": "high_quality",
+    "-qp": "production_quality",
+    "-qk": "fourk_quality",
+}
+
+
+def _worker_main(conn, quality_name, media_root, verbosity="WARNING"):
+    """
+    Laço de um worker de renderização. O Manim é importado uma única vez, e cada job
+    recebido pelo pipe é renderizado no mesmo processo.
+
+    Job: {"eq_id", "lines", "setup", "class_name", "output_path", "tex_cache_dir", "tex_cache_max_size_bytes", "preview"}
+    Resposta: {"eq_id", "ok", "output_path" | "error", "elapsed"}
+    """
+    try:
+        from manim import tempconfig
+        import generic_scene
+    except Exception as e:
+        conn.send({"ok": False, "error": f"Falha ao importar o Manim no worker: {e}"})
+        conn.close()
+        return
+
+    media_dir = os.path.join(media_root, f"worker_{os.getpid()}")
+    conn.send({"ok": True, "ready": True})
+
+    try:
+        while True:
+            try:
+                job = conn.recv()
+            except EOFError:
+                break
+            if job is None:
+                break
+
+            start_time = time.monotonic()
+            try:
+                if job.get("tex_cache_dir"):
+                    generic_scene.install_tex_cache(job["tex_cache_dir"], job["tex_cache_max_size_bytes"])
+                # Mesma cena genérica da linha de comando, com os dados do job embutidos na classe
+                scene_class = generic_scene.make_scene_class(
+                    job["class_name"], job["eq_id"],
+                    equations_data={job["eq_id"]: job["lines"]},
+                    animation_setups={job["eq_id"]: job["setup"]},
+                )
+
+                with tempconfig({
+                    "quality": quality_name,
+                    "media_dir": media_dir,
+                    "output_file": job["class_name"],
+                    "disable_caching": True,
+                    "verbosity": verbosity,
+                    # Pré-visualização: só o último quadro, salvo como PNG
+                    "save_last_frame": bool(job.get("preview")),
+                }):
+                    scene = scene_class()
+                    scene.render()
+                    file_writer = scene.renderer.file_writer
+                    movie_path = str(file_writer.image_file_path if job.get("preview") else file_writer.movie_file_path)
+
+                os.makedirs(os.path.dirname(job["output_path"]) or ".", exist_ok=True)
+                shutil.move(movie_path, job["output_path"])
+                conn.send({"eq_id": job["eq_id"], "ok": True, "output_path": job["output_path"],
+                           "elapsed": time.monotonic() - start_time})
+            except Exception as e:
+                conn.send({"eq_id": job["eq_id"], "ok": False, "error": f"{type(e).__name__}: {e}",
+                           "elapsed": time.monotonic() - start_time})
+    finally:
+        shutil.rmtree(media_dir, ignore_errors=True)
+        conn.close()
+
+
+class _WarmWorker:
+    """Um processo de renderização e a ponta local do seu pipe."""
+
+    def __init__(self, context, quality_name, media_root, verbosity):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, quality_name, media_root, verbosity),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs_done = 0
+        self.ready = False
+
+    def wait_ready(self, timeout):
+        if self.ready:
+            return True
+        if not self.conn.poll(timeout):
+            return False
+        message = self.conn.recv()
+        if not message.get("ok"):
+            logger.error(f"Worker de renderização não inicializou: {message.get('error')}")
+            return False
+        self.ready = True
+        return True
+
+    def stop(self, timeout=5):
+        try:
+            self.conn.send(None)
+        except (OSError, EOFError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class RenderWorkerPool:
+    """
+    Pool de processos de renderização "quentes": cada worker importa o Manim uma vez e
+    atende vários jobs pelo pipe, evitando o custo de inicialização por equação.
+
+    Um worker é reciclado (encerrado e substituído) após max_jobs_per_worker jobs, para
+    limitar o crescimento de memória, ou quando trava/estoura o tempo limite de um job.
+    """
+
+    def __init__(self, workers=1, max_jobs_per_worker=50, quality="-ql", media_root=os.path.join("temp", "media"),
+                 startup_timeout=120, verbosity="WARNING"):
+        self.workers = max(1, workers)
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.quality_name = QUALITY_NAMES.get(quality, "low_quality")
+        self.media_root = media_root
+        self.startup_timeout = startup_timeout
+        self.verbosity = verbosity
+        # "spawn" se comporta igual no Windows e no Linux e não herda estado do processo pai
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._all_workers = []
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            os.makedirs(self.media_root, exist_ok=True)
+            for _ in range(self.workers):
+                self._idle.put(self._spawn())
+            self._started = True
+        logger.debug(f"Pool de renderização iniciado com {self.workers} worker(s).")
+
+    def _spawn(self):
+        worker = _WarmWorker(self._context, self.quality_name, self.media_root, self.verbosity)
+        self._all_workers.append(worker)
+        return worker
+
+    def _replace(self, worker):
+        worker.stop(timeout=1)
+        with self._lock:
+            if worker in self._all_workers:
+                self._all_workers.remove(worker)
+            return self._spawn()
+
+    def render(self, job, timeout=None):
+        """
+        Renderiza um job em um worker livre (bloqueia até haver um disponível).
+
+        Returns:
+            dict: Resposta do worker ({"ok": bool, ...}).
+        """
+        self.start()
+        worker = self._idle.get()
+        try:
+            if not worker.wait_ready(self.startup_timeout):
+                worker = self._replace(worker)
+                return {"eq_id": job["eq_id"], "ok": False, "error": "worker não ficou pronto a tempo"}
+
+            try:
+                worker.conn.send(job)
+                if not worker.conn.poll(timeout):
+                    # Job travado: o worker é descartado para não contaminar os próximos jobs
+                    worker = self._replace(worker)
+                    return {"eq_id": job["eq_id"], "ok": False, "error": f"tempo limite de {timeout} s excedido"}
+                result = worker.conn.recv()
+            except (EOFError, OSError) as e:
+                worker = self._replace(worker)
+                return {"eq_id": job["eq_id"], "ok": False, "error": f"worker encerrado inesperadamente ({e})"}
+
+            worker.jobs_done += 1
+            if self.max_jobs_per_worker and worker.jobs_done >= self.max_jobs_per_worker:
+                worker = self._replace(worker)
+            return result
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self):
+        with self._lock:
+            for worker in self._all_workers:
+                worker.stop()
+            self._all_workers = []
+            self._idle = queue.Queue()
+            self._started = False
+        if os.path.isdir(self.media_root) and not os.listdir(self.media_root):
+            os.rmdir(self.media_root)
+        logger.debug("Pool de renderização encerrado.")
@@ -0,0 +1,194 @@
+# render_journal.py
+# Journal de renderização: registro só de acréscimo (JSONL) do estado de cada job.
+#
+# Cada linha é um evento de uma equação: queued (job montado), running (início de cada
+# tentativa), done ou failed (fim do job, com tentativas e duração). As linhas são gravadas
+# com fsync assim que acontecem, então o journal sobrevive a um OOM kill, a um reboot ou a
+# um Ctrl-C no meio da execução; uma linha cortada no fim do arquivo é ignorada. Com
+# Animator(resume=True) as equações cujo último evento é done (com a mesma chave de
+# conteúdo e a saída ainda no lugar) não são renderizadas de novo.
+#
+# O histórico de todas as execuções também mostra as equações que falham sempre:
+#   python render_journal.py render_journal.jsonl --min-runs 2
+import argparse
+import datetime
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+# Numera as execuções deste processo (vários journals podem iniciar execuções no mesmo segundo)
+_run_counter = itertools.count(1)
+
+
+class RenderJournal:
+    """Journal de uma execução; as execuções anteriores são lidas do mesmo arquivo."""
+
+    def __init__(self, path="render_journal.jsonl", fsync=True):
+        self.path = path
+        self.fsync = fsync
+        # Identifica os eventos de cada execução entre as demais do arquivo
+        self.run_id = None
+        self._lock = threading.Lock()
+        self._keys = {}         # {eq_id: chave de conteúdo} dos jobs desta execução
+        self._attempts = {}     # {eq_id: tentativas nesta execução}
+        self._started = {}      # {eq_id: instante da primeira tentativa}
+
+    def _append(self, records):
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        if not lines:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, 'a+b') as f:
+                # Uma execução interrompida no meio de uma gravação deixa a última linha sem '\n'
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        lines = "\n" + lines
+                f.write(lines.encode('utf-8'))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+
+    def _record(self, eq_id, status, **fields):
+        return {"time": round(time.time(), 3), "run": self.run_id, "eq_id": eq_id, "status": status,
+                "key": self._keys.get(eq_id), **fields}
+
+    def queued(self, jobs, keys=None):
+        """
+        Registra os jobs montados, jobs = [(rótulo, [eq_id, ...]), ...], e inicia uma nova
+        execução (o mesmo Animator pode renderizar várias vezes, ex: no modo de observação).
+        """
+        self.run_id = f"{datetime.datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}-{next(_run_counter)}"
+        self._keys.update(keys or {})
+        self._append(self._record(eq_id, "queued", job=label) for label, eq_ids in jobs for eq_id in eq_ids)
+
+    def running(self, eq_ids, attempt):
+        now = time.monotonic()
+        for eq_id in eq_ids:
+            self._attempts[eq_id] = attempt
+            self._started.setdefault(eq_id, now)
+        self._append(self._record(eq_id, "running", attempt=attempt) for eq_id in eq_ids)
+
+    def finished(self, eq_ids, rendered_ids):
+        """Registra o fim de um job: done para as equações em rendered_ids, failed para as demais."""
+        now = time.monotonic()
+        rendered_ids = set(rendered_ids)
+        self._append(self._record(eq_id, "done" if eq_id in rendered_ids else "failed",
+                                  attempts=self._attempts.pop(eq_id, 0),
+                                  seconds=round(now - self._started.pop(eq_id, now), 3))
+                     for eq_id in eq_ids)
+
+    def read(self):
+        """Eventos de todas as execuções, na ordem em que foram gravados."""
+        try:
+            f = open(self.path, 'r', encoding='utf-8', errors='replace')
+        except FileNotFoundError:
+            return
+        skipped = 0
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                if isinstance(record, dict) and record.get("status") in JOB_STATUSES:
+                    yield record
+        if skipped:
+            logger.debug(f"Journal '{self.path}': {skipped} linha(s) incompleta(s) ignorada(s).")
+
+    def completed(self, keys):
+        """
+        Equações de keys ({eq_id: chave}) cujo último evento é done com a mesma chave, ou seja,
+        renderizadas com sucesso a partir do mesmo conteúdo e ainda não invalidadas.
+        """
+        last = {}
+        for record in self.read():
+            if record["eq_id"] in keys:
+                last[record["eq_id"]] = record
+        return {eq_id for eq_id, record in last.items()
+                if record["status"] == "done" and record.get("key") == keys[eq_id]}
+
+    def failure_report(self, min_runs=2):
+        """
+        Equações que terminaram em failed em pelo menos min_runs execuções seguidas, até a mais
+        recente em que apareceram (uma execução com done zera a sequência).
+
+        Returns:
+            list: [{"eq_id", "failed_runs", "streak", "attempts", "failed_seconds", "last_failure"}],
+                  das que falham há mais execuções para as que falham há menos.
+        """
+        history = {}
+        for record in self.read():
+            entry = history.setdefault(record["eq_id"], {"outcomes": {}, "attempts": 0, "failed_seconds": 0.0,
+                                                         "last_failure": None})
+            if record["status"] == "running":
+                entry["attempts"] += 1
+            elif record["status"] in ("done", "failed"):
+                # O último resultado de cada execução (um job pode ser repetido dentro dela)
+                entry["outcomes"].pop(record["run"], None)
+                entry["outcomes"][record["run"]] = record["status"]
+                if record["status"] == "failed":
+                    entry["failed_seconds"] += record.get("seconds") or 0.0
+                    entry["last_failure"] = record["time"]
+
+        report = []
+        for eq_id, entry in history.items():
+            outcomes = list(entry["outcomes"].values())
+            streak = 0
+            for outcome in reversed(outcomes):
+                if outcome != "failed":
+                    break
+                streak += 1
+            if streak >= min_runs:
+                report.append({"eq_id": eq_id, "failed_runs": outcomes.count("failed"), "streak": streak,
+                               "attempts": entry["attempts"], "failed_seconds": round(entry["failed_seconds"], 3),
+                               "last_failure": entry["last_failure"]})
+        report.sort(key=lambda item: (item["streak"], item["failed_seconds"]), reverse=True)
+        return report
+
+
+def format_failure_report(report):
+    """Tabela de texto do failure_report."""
+    if not report:
+        return "Nenhuma equação falhando de forma recorrente."
+    rows = [("Equação", "Seguidas", "Execuções", "Tentativas", "Tempo perdido", "Última falha")]
+    for item in report:
+        last_failure = datetime.datetime.fromtimestamp(item["last_failure"]).strftime("%Y-%m-%d %H:%M") if item["last_failure"] else "-"
+        rows.append((item["eq_id"], str(item["streak"]), str(item["failed_runs"]), str(item["attempts"]),
+                     f"{item['failed_seconds']:.0f} s", last_failure))
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    total_seconds = sum(item["failed_seconds"] for item in report)
+    lines.append(f"\n{len(report)} equação(ões) falhando de forma recorrente, {total_seconds:.0f} s gastos nas falhas.")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatório das equações que falham em execuções seguidas.")
+    parser.add_argument("journal", nargs="?", default="render_journal.jsonl", help="Journal de renderização.")
+    parser.add_argument("--min-runs", type=int, default=2, help="Execuções seguidas com falha para entrar no relatório.")
+    parser.add_argument("--json", help="Grava o relatório completo neste arquivo.")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.journal):
+        parser.error(f"Journal '{args.journal}' não encontrado.")
+    report = RenderJournal(args.journal).failure_report(args.min_runs)
+    print(format_failure_report(report))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+        print(f"Relatório salvo em: {args.json}")
+    return 1 if report else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
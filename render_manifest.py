@@ -0,0 +1,221 @@
+# render_manifest.py
+# Manifesto de renderização para dividir uma execução entre várias máquinas.
+#
+# O manifesto é um JSONL determinístico: uma linha de cabeçalho (qualidade, pré-visualização,
+# número de jobs) e uma linha por equação com eq_id, linhas, setup, origem e o caminho da saída
+# relativo à árvore de saída. Cada máquina renderiza um shard (--shard i/n): a equação vai para
+# o shard hash(eq_id) % n, então a divisão não depende da ordem do manifesto nem da máquina.
+# As saídas de cada shard ficam em <pasta compartilhada>/shards/<i>-of-<n>/; a etapa de merge
+# confere se todo job tem saída e junta tudo em uma única árvore.
+#
+# Uso:
+#   python render_manifest.py export <pasta do projeto> manifest.jsonl --recursive
+#   python render_manifest.py render manifest.jsonl --shard 2/4 --shared-dir /mnt/render
+#   python render_manifest.py merge manifest.jsonl --shards 4 --shared-dir /mnt/render --output videos
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+SHARD_SUMMARY_FILE = "shard.json"
+JOURNAL_FILE = "render_journal.jsonl"
+
+
+def shard_of(eq_id, shard_count):
+    """Índice (1 a shard_count) do shard de eq_id; o mesmo em qualquer máquina e execução."""
+    return int(hashlib.sha1(eq_id.encode('utf-8')).hexdigest()[:8], 16) % shard_count + 1
+
+
+def parse_shard(value):
+    """Converte 'i/n' (ex: '2/4') em (i, n), com 1 <= i <= n."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard inválido '{value}': use i/n (ex: 2/4).") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard inválido '{value}': i deve estar entre 1 e n.")
+    return index, count
+
+
+def shard_dir(shared_dir, index, count):
+    return os.path.join(shared_dir, "shards", f"{index}-of-{count}")
+
+
+def write_manifest(path, header, jobs):
+    """Grava o manifesto (cabeçalho + um job por linha) de forma atômica."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Nome temporário único: duas exportações simultâneas do mesmo manifesto não se misturam
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(dict(header, manifest=MANIFEST_VERSION, jobs=len(jobs)), sort_keys=True, ensure_ascii=False) + "\n")
+            for job in jobs:
+                f.write(json.dumps(job, sort_keys=True, ensure_ascii=False, default=list) + "\n")
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return path
+
+
+def read_manifest(path):
+    """
+    Returns:
+        tuple: (cabeçalho, lista de jobs {"eq_id", "lines", "setup", "location", "output"}).
+
+    Raises:
+        ValueError: Se o arquivo não for um manifesto suportado ou estiver incompleto.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("manifest") != MANIFEST_VERSION:
+            raise ValueError(f"'{path}' não é um manifesto de renderização (versão {MANIFEST_VERSION}).")
+        jobs = [json.loads(line) for line in f if line.strip()]
+    if len(jobs) != header["jobs"]:
+        raise ValueError(f"Manifesto '{path}' incompleto: {len(jobs)} de {header['jobs']} job(s).")
+    return header, jobs
+
+
+def render_shard(manifest_path, shard, shared_dir, animator):
+    """
+    Renderiza os jobs do shard (i, n) em shard_dir(shared_dir, i, n) e grava o resumo do shard.
+
+    Args:
+        animator (Animator): Renderizador; a qualidade e a pré-visualização precisam ser as do manifesto.
+
+    Returns:
+        dict: {"shard", "jobs", "rendered", "missing"}
+    """
+    index, count = shard
+    header, jobs = read_manifest(manifest_path)
+    if (animator.quality, animator.preview) != (header["quality"], header["preview"]):
+        raise ValueError(f"O Animator ({animator.quality}, preview={animator.preview}) difere do manifesto "
+                         f"({header['quality']}, preview={header['preview']}).")
+    jobs = [job for job in jobs if shard_of(job["eq_id"], count) == index]
+    output_dir = shard_dir(shared_dir, index, count)
+    logger.info(f"Shard {index}/{count}: {len(jobs)} de {header['jobs']} job(s) -> {output_dir}")
+
+    if jobs:
+        equations = {job["eq_id"]: job["lines"] for job in jobs}
+        setups = {job["eq_id"]: dict(job["setup"], equation_latex_lines=job["lines"]) for job in jobs}
+        animator.generate_all_scenes(equations, setups, output_dir)
+    missing = [job["eq_id"] for job in jobs if not os.path.exists(os.path.join(output_dir, job["output"]))]
+    summary = {"shard": f"{index}/{count}", "jobs": len(jobs), "rendered": len(jobs) - len(missing), "missing": missing}
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, SHARD_SUMMARY_FILE), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=4, ensure_ascii=False)
+    if missing:
+        logger.warning(f"Shard {index}/{count}: {len(missing)} job(s) sem saída.")
+    return summary
+
+
+def merge_shards(manifest_path, shard_count, shared_dir, output_dir):
+    """
+    Confere que todo job do manifesto tem saída no seu shard e junta as saídas em output_dir,
+    nos mesmos caminhos de uma execução em uma única máquina (hard link quando possível, senão cópia).
+
+    Returns:
+        dict: {"jobs", "merged", "missing": [eq_id], "unfinished_shards": [i]}
+    """
+    _, jobs = read_manifest(manifest_path)
+    unfinished = [index for index in range(1, shard_count + 1)
+                  if not os.path.exists(os.path.join(shard_dir(shared_dir, index, shard_count), SHARD_SUMMARY_FILE))]
+    missing = []
+    merged = 0
+    for job in jobs:
+        source = os.path.join(shard_dir(shared_dir, shard_of(job["eq_id"], shard_count), shard_count), job["output"])
+        if not os.path.exists(source):
+            missing.append(job["eq_id"])
+            continue
+        dest = os.path.join(output_dir, job["output"])
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if os.path.exists(dest):
+            os.remove(dest)
+        try:
+            os.link(source, dest)
+        except OSError:
+            shutil.copy2(source, dest)
+        merged += 1
+
+    if unfinished:
+        logger.warning(f"Shard(s) sem resumo (não concluídos?): {', '.join(map(str, unfinished))}")
+    if missing:
+        logger.error(f"{len(missing)} job(s) sem saída: {', '.join(missing[:20])}{' ...' if len(missing) > 20 else ''}")
+    logger.info(f"Merge: {merged} de {len(jobs)} saída(s) reunida(s) em '{output_dir}'.")
+    return {"jobs": len(jobs), "merged": merged, "missing": missing, "unfinished_shards": unfinished}
+
+
+def main(argv=None):
+    from animator import Animator
+    from designer import Designer
+    from reader import Reader
+    from style_rules import load_rules
+
+    parser = argparse.ArgumentParser(description="Divide a renderização entre máquinas com um manifesto JSONL.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Gera o manifesto do projeto.")
+    export_parser.add_argument("project_dir", help="Pasta do projeto LaTeX.")
+    export_parser.add_argument("manifest", help="Arquivo JSONL a gerar.")
+    export_parser.add_argument("--recursive", action="store_true", help="Inclui os subdiretórios.")
+    export_parser.add_argument("--quality", default="-ql", help="Flag de qualidade do Manim.")
+    export_parser.add_argument("--preview", action="store_true", help="Gera só as pré-visualizações (PNG).")
+    export_parser.add_argument("--rules", help="JSON de regras de estilo do Designer.")
+
+    render_parser = commands.add_parser("render", help="Renderiza um shard do manifesto.")
+    render_parser.add_argument("manifest", help="Manifesto gerado por 'export'.")
+    render_parser.add_argument("--shard", required=True, help="Shard a renderizar, i/n (ex: 2/4).")
+    render_parser.add_argument("--shared-dir", required=True, help="Pasta compartilhada entre as máquinas.")
+    render_parser.add_argument("--workers", type=int, default=1, help="Processos do Manim simultâneos.")
+    render_parser.add_argument("--batch-size", type=int, default=1, help="Equações por processo do Manim.")
+    render_parser.add_argument("--resume", action="store_true",
+                               help="Continua um shard interrompido: pula os jobs concluídos no journal do shard.")
+
+    merge_parser = commands.add_parser("merge", help="Confere e junta as saídas dos shards.")
+    merge_parser.add_argument("manifest", help="Manifesto gerado por 'export'.")
+    merge_parser.add_argument("--shards", type=int, required=True, help="Número de shards (n).")
+    merge_parser.add_argument("--shared-dir", required=True, help="Pasta compartilhada entre as máquinas.")
+    merge_parser.add_argument("--output", default="generated_animations_final", help="Árvore de saída final.")
+    merge_parser.add_argument("--assemble", action="store_true", help="Monta também o vídeo de cada documento.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-7s %(name)s: %(message)s", datefmt="%H:%M:%S")
+    if args.command == "export":
+        reader = Reader(index_path=".scan_index.json")
+        equations = reader.find_equations_in_files(reader.get_tex_files(args.project_dir, recursive=args.recursive))
+        setups = Designer(rules=load_rules(args.rules) if args.rules else None).set_deafult_anim(equations)
+        Animator(quality=args.quality, preview=args.preview).export_manifest(equations, setups, args.manifest)
+        return 0
+
+    if args.command == "render":
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+        header, _ = read_manifest(args.manifest)
+        # O journal fica na pasta do shard, então a retomada funciona em qualquer máquina
+        animator = Animator(quality=header["quality"], preview=header["preview"], render_workers=args.workers,
+                            batch_size=args.batch_size, resume=args.resume,
+                            journal_path=os.path.join(shard_dir(args.shared_dir, *shard), JOURNAL_FILE))
+        summary = render_shard(args.manifest, shard, args.shared_dir, animator)
+        return 1 if summary["missing"] else 0
+
+    report = merge_shards(args.manifest, args.shards, args.shared_dir, args.output)
+    if args.assemble and not report["missing"]:
+        header, jobs = read_manifest(args.manifest)
+        if header["preview"]:
+            logger.warning("Manifesto de pré-visualização: não há vídeos para montar.")
+        else:
+            Animator(quality=header["quality"], cache_dir=None).assemble_document_videos(
+                {job["eq_id"]: job["location"] for job in jobs if job.get("location")}, args.output)
+    return 1 if report["missing"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
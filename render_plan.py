@@ -0,0 +1,308 @@
+# render_plan.py
+# Estimativa do custo de renderização e plano de execução (dry-run).
+#
+# O setup do Designer define quanto tempo cada cena dura (delay_before + duration + delay_after,
+# mais a espera final de generic_scene.py), então o número de quadros de cada equação é
+# conhecido antes de renderizar. O tempo de um job é estimado por um modelo linear
+#     segundos = por_job + por_cena * cenas + por_quadro * quadros
+# calibrado com os tempos gravados nas execuções anteriores. O Animator usa as mesmas
+# estimativas para iniciar os jobs mais longos primeiro (longest job first), o que evita que
+# poucos workers fiquem terminando jobs longos enquanto os demais estão parados.
+#
+# Uso: python render_plan.py <pasta do projeto> --workers 8 --batch-size 10
+import argparse
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+FINAL_WAIT_SECONDS = 1.0  # scene.wait(1) no fim de cada cena (generic_scene.py)
+FADE_OUT_SECONDS = 1.0    # run_time padrão do FadeOut, usado quando show_equation_after é False
+
+# Coeficientes iniciais (por_job, por_cena), antes de haver tempos gravados: importar o Manim
+# custa alguns segundos por processo, e cada cena compila seu LaTeX. Os workers do backend
+# "daemon" já têm o Manim importado.
+DEFAULT_JOB_COEFFICIENTS = {"single": (4.0, 1.0), "batch": (4.0, 1.0), "daemon": (0.2, 1.0)}
+# Segundos por quadro em cada qualidade (cresce com a resolução)
+DEFAULT_FRAME_SECONDS = {"-ql": 0.01, "-qm": 0.025, "-qh": 0.06, "-qp": 0.1, "-qk": 0.25}
+
+
+def scene_seconds(setup):
+    """Duração da cena de uma equação, em segundos de vídeo."""
+    seconds = setup.get("delay_before", 0.5) + setup.get("duration", 1.5) + setup.get("delay_after", 1.0)
+    if not setup.get("show_equation_after", True):
+        seconds += FADE_OUT_SECONDS
+    return seconds + FINAL_WAIT_SECONDS
+
+
+def frame_rate(quality):
+    """Quadros por segundo da flag de qualidade (ex: '-ql' -> 15)."""
+    from animator import QUALITY_DIRS  # Import local: o animator importa este módulo
+    return int(QUALITY_DIRS.get(quality, "480p15").split("p")[1])
+
+
+def estimate_frames(setup, quality="-ql", preview=False):
+    """Quadros renderizados para a equação (1 na pré-visualização, que salva só o último quadro)."""
+    if preview:
+        return 1
+    return math.ceil(scene_seconds(setup) * frame_rate(quality))
+
+
+def timing_key(mode, quality, preview=False):
+    """Chave dos tempos gravados: o custo muda com o tipo de job, a qualidade e a pré-visualização."""
+    return f"{mode} {quality}{' -s' if preview else ''}"
+
+
+class TimingModel:
+    """segundos = per_job + per_scene * cenas + per_frame * quadros."""
+    __slots__ = ("per_job", "per_scene", "per_frame", "samples")
+
+    def __init__(self, per_job, per_scene, per_frame, samples=0):
+        self.per_job = per_job
+        self.per_scene = per_scene
+        self.per_frame = per_frame
+        self.samples = samples
+
+    @classmethod
+    def default(cls, mode, quality, preview=False):
+        per_job, per_scene = DEFAULT_JOB_COEFFICIENTS.get(mode, DEFAULT_JOB_COEFFICIENTS["single"])
+        per_frame = DEFAULT_FRAME_SECONDS.get(quality, DEFAULT_FRAME_SECONDS["-ql"])
+        return cls(per_job, per_scene, per_frame * (5 if preview else 1))
+
+    @classmethod
+    def fit(cls, samples, prior, strength=1.0):
+        """
+        Ajusta os coeficientes aos tempos gravados ([cenas, quadros, segundos]) por mínimos
+        quadrados com regularização em direção a prior. Com poucas amostras, ou quando elas não
+        distinguem os coeficientes (ex: todo job com uma cena), o resultado fica perto de prior.
+        """
+        if not samples:
+            return prior
+        prior_weights = [prior.per_job, prior.per_scene, prior.per_frame]
+        # Quadros têm escala muito maior que cenas: normaliza para a regularização pesar igual
+        scales = [1.0, max(1.0, max(s[0] for s in samples)), max(1.0, max(s[1] for s in samples))]
+        normal = [[strength if i == j else 0.0 for j in range(3)] for i in range(3)]
+        target = [strength * prior_weights[i] * scales[i] for i in range(3)]
+        for scenes, frames, seconds in samples:
+            features = (1.0, scenes / scales[1], frames / scales[2])
+            for i in range(3):
+                target[i] += features[i] * seconds
+                for j in range(3):
+                    normal[i][j] += features[i] * features[j]
+        # Coeficientes negativos não têm sentido: são fixados em zero e os demais reajustados
+        free = [0, 1, 2]
+        while True:
+            solution = _solve([[normal[i][j] for j in free] for i in free], [target[i] for i in free])
+            negative = [index for index, weight in zip(free, solution) if weight < 0]
+            if not negative:
+                break
+            free = [index for index in free if index not in negative]
+        weights = dict(zip(free, solution))
+        return cls(*(weights.get(index, 0.0) / scales[index] for index in range(3)), samples=len(samples))
+
+    def estimate(self, scenes, frames):
+        return self.per_job + self.per_scene * scenes + self.per_frame * frames
+
+    def as_dict(self):
+        return {"per_job": self.per_job, "per_scene": self.per_scene, "per_frame": self.per_frame, "samples": self.samples}
+
+
+def _solve(matrix, vector):
+    # Eliminação de Gauss com pivoteamento parcial (sistema pequeno, simétrico e positivo definido)
+    size = len(vector)
+    rows = [list(row) + [value] for row, value in zip(matrix, vector)]
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(rows[row][column]))
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(column + 1, size):
+            factor = rows[row][column] / rows[column][column]
+            for k in range(column, size + 1):
+                rows[row][k] -= factor * rows[column][k]
+    solution = [0.0] * size
+    for row in reversed(range(size)):
+        solution[row] = (rows[row][size] - sum(rows[row][k] * solution[k] for k in range(row + 1, size))) / rows[row][row]
+    return solution
+
+
+class TimingLog:
+    """
+    Tempos dos jobs bem-sucedidos das execuções anteriores, por timing_key, em um JSON
+    ({chave: [[cenas, quadros, segundos], ...]}). Só as max_samples amostras mais recentes de
+    cada chave são mantidas, então a calibração acompanha mudanças de máquina.
+    """
+
+    def __init__(self, path=".render_timings.json", max_samples=500):
+        self.path = path
+        self.max_samples = max_samples
+        self.samples = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.samples = {key: [list(sample) for sample in samples] for key, samples in json.load(f).items()}
+        except FileNotFoundError:
+            self.samples = {}
+        except (OSError, ValueError, AttributeError, TypeError) as e:
+            logger.warning(f"Tempos de renderização em '{self.path}' ignorados ({e}).")
+            self.samples = {}
+
+    def record(self, key, scenes, frames, seconds):
+        with self._lock:
+            samples = self.samples.setdefault(key, [])
+            samples.append([scenes, frames, round(seconds, 3)])
+            del samples[:-self.max_samples]
+            self._dirty = True
+
+    def model(self, mode, quality, preview=False):
+        """TimingModel calibrado para o tipo de job (os coeficientes padrão se não houver tempos)."""
+        prior = TimingModel.default(mode, quality, preview)
+        with self._lock:
+            samples = list(self.samples.get(timing_key(mode, quality, preview), ()))
+        return TimingModel.fit(samples, prior)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Nome temporário único: execuções simultâneas (ex: shards) gravam o mesmo arquivo
+            temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.samples, f)
+                os.replace(temp_path, self.path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            self._dirty = False
+
+
+def schedule_makespan(job_seconds, workers):
+    """Tempo total estimado ao distribuir os jobs (do mais longo ao mais curto) entre os workers."""
+    loads = [0.0] * max(1, workers)
+    for seconds in sorted(job_seconds, reverse=True):
+        heapq.heappush(loads, heapq.heappop(loads) + seconds)
+    return max(loads)
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class RenderPlan:
+    """
+    Jobs que uma renderização executaria, com quadros e tempo estimados (ver Animator.plan_render).
+
+    Args:
+        jobs (list): [{"label", "mode", "equations", "frames", "seconds"}], na ordem de execução.
+        workers (int): Workers de renderização.
+        cached (int): Equações que viriam do cache de renderização.
+        models (dict): {modo: TimingModel} usados nas estimativas.
+    """
+
+    def __init__(self, jobs, workers, cached=0, models=None):
+        self.jobs = jobs
+        self.workers = workers
+        self.cached = cached
+        self.models = models or {}
+
+    @property
+    def equation_count(self):
+        return sum(len(job["equations"]) for job in self.jobs)
+
+    @property
+    def total_frames(self):
+        return sum(job["frames"] for job in self.jobs)
+
+    @property
+    def total_seconds(self):
+        """Soma dos tempos dos jobs (tempo de um único worker)."""
+        return sum(job["seconds"] for job in self.jobs)
+
+    @property
+    def wall_seconds(self):
+        """Tempo estimado da execução com self.workers workers."""
+        return schedule_makespan([job["seconds"] for job in self.jobs], self.workers) if self.jobs else 0.0
+
+    def to_dict(self):
+        return {
+            "workers": self.workers,
+            "equations": self.equation_count,
+            "cached": self.cached,
+            "frames": self.total_frames,
+            "job_seconds": round(self.total_seconds, 1),
+            "wall_seconds": round(self.wall_seconds, 1),
+            "models": {mode: model.as_dict() for mode, model in self.models.items()},
+            "jobs": [dict(job, equations=list(job["equations"]), seconds=round(job["seconds"], 2)) for job in self.jobs],
+        }
+
+    def format_table(self, limit=None):
+        """Tabela dos jobs (os limit primeiros) seguida dos totais."""
+        lines = [f"{'job':<40} {'modo':<7} {'eqs':>5} {'quadros':>8} {'tempo':>10}"]
+        for job in self.jobs[:limit]:
+            lines.append(f"{job['label'][:40]:<40} {job['mode']:<7} {len(job['equations']):>5} "
+                         f"{job['frames']:>8} {_format_duration(job['seconds']):>10}")
+        if limit is not None and len(self.jobs) > limit:
+            lines.append(f"... mais {len(self.jobs) - limit} job(s)")
+        calibration = ", ".join(f"{mode}: {model.samples} amostra(s)" for mode, model in self.models.items())
+        lines += [
+            "-" * 74,
+            f"{len(self.jobs)} job(s), {self.equation_count} equação(ões) a renderizar, {self.cached} do cache",
+            f"{self.total_frames} quadros; {_format_duration(self.total_seconds)} somando os jobs, "
+            f"~{_format_duration(self.wall_seconds)} com {self.workers} worker(s)",
+            f"Calibração: {calibration or 'nenhum job'}",
+        ]
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    from animator import Animator
+    from designer import Designer
+    from reader import Reader
+    from style_rules import load_rules
+
+    parser = argparse.ArgumentParser(description="Estima quadros e tempo de renderização sem renderizar (dry-run).")
+    parser.add_argument("project_dir", help="Pasta do projeto LaTeX.")
+    parser.add_argument("--recursive", action="store_true", help="Inclui os subdiretórios.")
+    parser.add_argument("--output", default="generated_animations_final", help="Pasta dos vídeos (para o cache).")
+    parser.add_argument("--workers", type=int, default=1, help="Processos do Manim simultâneos.")
+    parser.add_argument("--batch-size", type=int, default=1, help="Equações por processo do Manim.")
+    parser.add_argument("--backend", default="subprocess", choices=("subprocess", "daemon"), help="Backend de renderização.")
+    parser.add_argument("--quality", default="-ql", help="Flag de qualidade do Manim.")
+    parser.add_argument("--preview", action="store_true", help="Planeja só as pré-visualizações (PNG).")
+    parser.add_argument("--rules", help="JSON de regras de estilo do Designer.")
+    parser.add_argument("--timings", default=".render_timings.json", help="Tempos gravados das execuções anteriores.")
+    parser.add_argument("--limit", type=int, default=20, help="Jobs exibidos na tabela.")
+    parser.add_argument("--json", help="Grava o plano completo neste arquivo.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)-7s %(name)s: %(message)s", datefmt="%H:%M:%S")
+    # Dry-run: o índice de varredura e o cache de renderização são só consultados
+    reader = Reader(index_path=".scan_index.json", update_index=False)
+    equations = reader.find_equations_in_files(reader.get_tex_files(args.project_dir, recursive=args.recursive))
+    setups = Designer(rules=load_rules(args.rules) if args.rules else None).set_deafult_anim(equations)
+    animator = Animator(quality=args.quality, render_workers=args.workers, batch_size=args.batch_size,
+                        render_backend=args.backend, preview=args.preview, timings_path=args.timings)
+    plan = animator.plan_render(equations, setups, args.output)
+    print(plan.format_table(args.limit))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(plan.to_dict(), f, indent=4, ensure_ascii=False)
+        print(f"Plano salvo em: {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+# scan_index.py
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+
+def file_digest(path_or_buffer):
+    """Calcula o hash SHA-1 do conteúdo de um arquivo (caminho) ou de um buffer (bytes/mmap)."""
+    digest = hashlib.sha1()
+    if isinstance(path_or_buffer, str):
+        with open(path_or_buffer, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    else:
+        digest.update(path_or_buffer)
+    return digest.hexdigest()
+
+
+class ScanIndex:
+    """
+    Índice persistente das varreduras do Reader.
+
+    Cada arquivo .tex é registrado com mtime, tamanho e hash do conteúdo, junto com os
+    blocos de equação já extraídos. Em uma nova execução, arquivos cujo mtime e tamanho
+    não mudaram são atendidos direto do índice, sem leitura nem parse.
+    """
+
+    def __init__(self, index_path=".scan_index.json", read_only=False):
+        self.index_path = index_path
+        self.read_only = read_only  # Se True, o índice é consultado mas save() não grava nada
+        self.entries = {}   # {caminho: {"mtime_ns", "size", "digest", "blocks"}}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Índice de varredura '{self.index_path}' ilegível ({e}). Será recriado.")
+            return
+        if data.get("version") != INDEX_VERSION:
+            logger.warning(f"Índice de varredura '{self.index_path}' em versão antiga. Será recriado.")
+            return
+        self.entries = data.get("files", {})
+
+    def save(self):
+        if not self._dirty or self.read_only:
+            return
+        # Descarta arquivos que não existem mais
+        self.entries = {path: entry for path, entry in self.entries.items() if os.path.exists(path)}
+        index_dir = os.path.dirname(self.index_path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        # Escrita atômica: um índice corrompido por interrupção seria pior que nenhum. O nome
+        # temporário é único, então dois processos gravando o mesmo índice não se misturam.
+        temp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": INDEX_VERSION, "files": self.entries}, f)
+            os.replace(temp_path, self.index_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._dirty = False
+
+    def lookup(self, tex_file):
+        """
+        Devolve os blocos registrados para o arquivo se ele não mudou desde a última varredura.
+
+        Returns:
+            list | None: [(ambiente, linhas, offset, linha)] ou None se o arquivo precisa ser reprocessado.
+        """
+        entry = self.entries.get(tex_file)
+        try:
+            stat = os.stat(tex_file)
+        except OSError:
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            # mtime mudou (ex: checkout ou touch); se o conteúdo é o mesmo, o índice continua válido
+            if entry["size"] != stat.st_size or file_digest(tex_file) != entry["digest"]:
+                self.misses += 1
+                return None
+            entry["mtime_ns"] = stat.st_mtime_ns
+            self._dirty = True
+
+        self.hits += 1
+        return [tuple(block) for block in entry["blocks"]]
+
+    def store(self, tex_file, blocks, digest, stat=None):
+        """Registra o resultado do parse de um arquivo."""
+        if stat is None:
+            stat = os.stat(tex_file)
+        self.entries[tex_file] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "digest": digest,
+            "blocks": [list(block) for block in blocks],
+        }
+        self._dirty = True
@@ -0,0 +1,185 @@
+# style_rules.py
+# Motor de regras do Designer: atribui animation_type, color, scale e duration a todas as
+# equações em uma única passagem, conforme o arquivo, o ambiente, uma regex ou o número de linhas.
+#
+# As regras são avaliadas em ordem e todas as que casam são aplicadas (a última vence, como no
+# CSS). Equações que casam com o mesmo conjunto de regras compartilham o mesmo dict de estilo.
+import fnmatch
+import json
+import os
+import re
+
+# Tokens que contam para a complexidade: comandos (\frac, \alpha), símbolos escapados e
+# caracteres visíveis. Chaves, espaços, '^', '_' e '&' só organizam o layout.
+_TOKEN_PATTERN = re.compile(r'\\[A-Za-z]+|\\.|[^\s{}^_&\\]')
+# Comandos que não desenham nada (rótulos, espaçamento, delimitadores de tamanho)
+_IGNORED_PATTERN = re.compile(r'\\(?:label|tag|eqref|ref)\s*\{[^}]*\}|\\(?:nonumber|notag|left|right|quad|qquad)\b|\\[,;:!]')
+
+# Campos do setup que uma regra pode definir
+STYLE_FIELDS = ("animation_type", "color", "scale", "duration", "position",
+                "delay_before", "delay_after", "show_equation_after")
+
+
+def count_tokens(eq_lines):
+    """Número aproximado de glifos desenhados pela equação."""
+    return len(_TOKEN_PATTERN.findall(_IGNORED_PATTERN.sub(' ', "\n".join(eq_lines))))
+
+
+def estimate_duration(eq_lines, base=0.5, seconds_per_token=0.08, minimum=1.0, maximum=10.0):
+    """
+    Duração da animação proporcional à complexidade da equação (tokens desenhados), e não
+    apenas ao número de linhas: 'a=b' e uma fração com somatório em uma linha não levam o
+    mesmo tempo para serem escritas.
+    """
+    return round(min(maximum, max(minimum, base + count_tokens(eq_lines) * seconds_per_token)), 2)
+
+
+class StyleRule:
+    """
+    Uma regra de estilo: as condições informadas precisam casar todas (as omitidas não restringem).
+
+    Args:
+        style (dict): Campos do setup atribuídos às equações que casam (ver STYLE_FIELDS).
+        file (str | list): Padrão(ões) glob do arquivo de origem (caminho ou nome do arquivo).
+        environment (str | list): Ambiente(s) LaTeX (ex: "align*").
+        pattern (str): Regex procurada no LaTeX da equação (linhas unidas por '\\n').
+        min_lines, max_lines (int): Faixa do número de linhas.
+    """
+    __slots__ = ("style", "files", "environments", "pattern", "min_lines", "max_lines")
+
+    def __init__(self, style, file=None, environment=None, pattern=None, min_lines=None, max_lines=None):
+        unknown = set(style) - set(STYLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Campo(s) de estilo desconhecido(s): {', '.join(sorted(unknown))}")
+        self.style = dict(style)
+        self.files = (file,) if isinstance(file, str) else tuple(file or ())
+        self.environments = frozenset((environment,) if isinstance(environment, str) else environment or ())
+        self.pattern = re.compile(pattern) if pattern else None
+        self.min_lines = min_lines
+        self.max_lines = max_lines
+
+    @classmethod
+    def from_dict(cls, data):
+        """Cria a regra a partir de {"match": {...condições...}, "style": {...}}."""
+        return cls(data["style"], **data.get("match", {}))
+
+    @property
+    def needs_location(self):
+        return bool(self.files or self.environments)
+
+    def matches_file(self, tex_file):
+        if not self.files:
+            return True
+        if tex_file is None:
+            return False
+        name = os.path.basename(tex_file)
+        return any(fnmatch.fnmatch(tex_file, p) or fnmatch.fnmatch(name, p) for p in self.files)
+
+    def matches_environment(self, environment):
+        return not self.environments or environment in self.environments
+
+    def matches_lines(self, line_count):
+        return ((self.min_lines is None or line_count >= self.min_lines)
+                and (self.max_lines is None or line_count <= self.max_lines))
+
+
+def load_rules(path):
+    """Lê uma lista de regras de um arquivo JSON ([{"match": {...}, "style": {...}}, ...])."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [StyleRule.from_dict(item) for item in json.load(f)]
+
+
+class RuleEngine:
+    """
+    Conjunto de regras pré-compilado. As condições por arquivo e por ambiente são avaliadas uma
+    vez por arquivo/ambiente distinto, não por equação; os estilos resultantes são memorizados
+    por combinação de regras, então milhares de equações compartilham poucos dicts.
+    """
+
+    def __init__(self, rules):
+        self.rules = [rule if isinstance(rule, StyleRule) else StyleRule.from_dict(rule) for rule in rules]
+        self._needs_location = any(rule.needs_location for rule in self.rules)
+        # {(arquivo, ambiente, nº de linhas): (regras que já casaram, regexes que ainda precisam ser testadas)}
+        self._plans = {}
+        self._styles = {}  # {índices das regras que casaram: estilo combinado}
+
+    def _plan(self, tex_file, environment, line_count):
+        key = (tex_file, environment, line_count)
+        plan = self._plans.get(key)
+        if plan is None:
+            candidates = [(index, rule) for index, rule in enumerate(self.rules)
+                          if rule.matches_file(tex_file) and rule.matches_environment(environment)
+                          and rule.matches_lines(line_count)]
+            plan = self._plans[key] = (
+                tuple(index for index, rule in candidates if rule.pattern is None),
+                tuple((index, rule.pattern.search) for index, rule in candidates if rule.pattern is not None),
+            )
+        return plan
+
+    def _style_for_rules(self, matched):
+        style = self._styles.get(matched)
+        if style is None:
+            style = {}
+            # A ordem das regras define quem vence, independentemente da ordem da avaliação
+            for index in sorted(matched):
+                style.update(self.rules[index].style)
+            self._styles[matched] = style
+        return style
+
+    def _match(self, eq_lines, tex_file, environment):
+        matched, searches = self._plan(tex_file, environment, len(eq_lines))
+        if searches:
+            text = "\n".join(eq_lines)
+            matched += tuple(index for index, search in searches if search(text))
+        return self._style_for_rules(matched) if matched else None
+
+    def style_for(self, eq_lines, location=None):
+        """
+        Returns:
+            dict | None: Estilo combinado (compartilhado; não deve ser alterado) ou None se nenhuma regra casar.
+        """
+        location = location or {}
+        return self._match(eq_lines, location.get("file"), location.get("environment"))
+
+    def apply(self, equations, locations=None):
+        """
+        Avalia as regras para todas as equações.
+
+        Args:
+            equations (Mapping): {eq_id: linhas} (dict ou EquationStore).
+            locations (Mapping): {eq_id: {"file", "environment", ...}}; necessário para regras por
+                                 arquivo ou ambiente (padrão: a origem guardada no EquationStore).
+
+        Returns:
+            dict: {eq_id: estilo} apenas das equações com pelo menos uma regra.
+        """
+        if locations is None and hasattr(equations, "iter_sources"):
+            # EquationStore: arquivo e ambiente lidos direto dos arrays, sem montar um dict por equação
+            sources = equations.iter_sources()
+        else:
+            locations = locations if self._needs_location and locations is not None else {}
+            sources = ((eq_id, eq_lines, *self._source_of(locations.get(eq_id))) for eq_id, eq_lines in equations.items())
+
+        # Mesmo laço de _match, sem a chamada por equação
+        styles = {}
+        plans, plan_for, style_for_rules = self._plans, self._plan, self._style_for_rules
+        needs_location = self._needs_location
+        for eq_id, eq_lines, tex_file, environment in sources:
+            if not needs_location:
+                tex_file = environment = None
+            plan = plans.get((tex_file, environment, len(eq_lines)))
+            if plan is None:
+                plan = plan_for(tex_file, environment, len(eq_lines))
+            matched, searches = plan
+            if searches:
+                text = "\n".join(eq_lines)
+                matched += tuple(index for index, search in searches if search(text))
+            if matched:
+                styles[eq_id] = style_for_rules(matched)
+        return styles
+
+    @staticmethod
+    def _source_of(location):
+        if not location:
+            return None, None
+        return location.get("file"), location.get("environment")
@@ -0,0 +1,38 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deduplicator import Deduplicator
+
+
+class NormalizeLatexTest(unittest.TestCase):
+    def test_math_spacing_is_ignored(self):
+        self.assertEqual(Deduplicator.normalize_latex(["a + b = c"]), Deduplicator.normalize_latex(["a+b  =c"]))
+
+    def test_text_arguments_keep_spacing(self):
+        for left, right in [(r"\text{a b}", r"\text{ab}"),
+                            (r"f(x) = 1 \text{if }x", r"f(x) = 1 \text{if}x"),
+                            (r"\operatorname{arg max}", r"\operatorname{argmax}"),
+                            (r"\mathrm{d t}", r"\mathrm{dt}")]:
+            self.assertNotEqual(Deduplicator.normalize_latex([left]), Deduplicator.normalize_latex([right]), left)
+
+    def test_line_break_is_not_a_text_command(self):
+        # Depois de '\\', 'text{ b }' é modo matemático e os espaços junto às chaves não contam
+        self.assertEqual(Deduplicator.normalize_latex([r"a\\text{ b }"]), Deduplicator.normalize_latex([r"a\\text{b}"]))
+
+    def test_control_space_before_text_is_kept(self):
+        self.assertNotEqual(Deduplicator.normalize_latex([r"a\ \text{b}"]), Deduplicator.normalize_latex([r"a\text{b}"]))
+
+
+class DeduplicateTest(unittest.TestCase):
+    def test_text_mode_variants_are_not_merged(self):
+        equations = {"a.tex_1": [r"x = 1 \text{if }y"], "a.tex_2": [r"x = 1 \text{if}y"], "b.tex_1": [r"x=1\text{if }y"]}
+        setups = {eq_id: {"color": "#FFFFFF"} for eq_id in equations}
+        unique_equations, _ = Deduplicator().deduplicate(equations, setups)
+        self.assertEqual(sorted(unique_equations), ["a.tex_1", "a.tex_2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
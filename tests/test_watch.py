@@ -0,0 +1,44 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from watch import diff_equations
+
+
+def scan(*blocks):
+    """{eq_id: (linhas, origem)} de uma varredura, com blocks = (eq_id, ambiente) na ordem do documento."""
+    return {eq_id: ([eq_id], {"environment": environment, "offset": offset})
+            for offset, (eq_id, environment) in enumerate(blocks)}
+
+
+class DiffEquationsTest(unittest.TestCase):
+    def test_edited_block_is_modified(self):
+        old = scan(("a", "equation"), ("b", "equation"), ("c", "equation"))
+        new = scan(("a", "equation"), ("b2", "equation"), ("c", "equation"))
+        self.assertEqual(diff_equations(old, new), ([], [("b", "b2")], []))
+
+    def test_blocks_are_paired_by_environment(self):
+        old = scan(("a", "equation"), ("b", "equation"))
+        new = scan(("a", "equation"), ("n", "align"), ("b2", "equation"))
+        self.assertEqual(diff_equations(old, new), (["n"], [("b", "b2")], []))
+
+    def test_environment_change_keeps_id(self):
+        old = scan(("a", "equation"), ("b", "equation"))
+        new = scan(("a", "equation"), ("b", "align"))
+        self.assertEqual(diff_equations(old, new), ([], [("b", "b")], []))
+
+    def test_moved_block_is_not_a_change(self):
+        old = scan(("a", "equation"), ("b", "equation"), ("c", "equation"))
+        new = scan(("b", "equation"), ("a", "equation"), ("c", "equation"))
+        self.assertEqual(diff_equations(old, new), ([], [], []))
+
+    def test_added_and_removed(self):
+        old = scan(("a", "equation"), ("b", "align"))
+        new = scan(("a", "equation"), ("c", "equation"))
+        self.assertEqual(diff_equations(old, new), (["c"], [], ["b"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
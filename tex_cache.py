@@ -0,0 +1,177 @@
+# tex_cache.py
+# Cache compartilhado de compilação LaTeX -> SVG. É instalado dentro do processo do Manim
+# pelo módulo de cena genérico (generic_scene.py), e é consultado antes de chamar latex/dvisvgm.
+# A pasta 'Tex' do próprio Manim fica no media_dir de cada job e não é compartilhada
+# quando as cenas rodam em paralelo; este diretório é comum a todas as execuções e workers.
+import hashlib
+import os
+import time
+from pathlib import Path
+
+from render_cache import RenderCache
+
+STATS_FILE_NAME = "stats.log"
+COMPILE_TIMES_FILE_NAME = "compile_times.log"
+# Os logs de estatísticas só crescem: acima deste tamanho, rotate_stats os renomeia para .old
+STATS_MAX_BYTES = 1024 ** 2
+ROTATED_SUFFIX = ".old"
+
+_installed = {}
+
+
+def make_tex_key(expression, environment, tex_template):
+    """Chave do SVG: expressão, ambiente e o template LaTeX completo (preâmbulo e compilador)."""
+    template_fingerprint = "|".join(str(getattr(tex_template, attr, "")) for attr in (
+        "body", "preamble", "tex_compiler", "output_format", "placeholder_text",
+    ))
+    payload = "\0".join([expression, str(environment or ""), template_fingerprint])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _record(cache_dir, event, file_name=STATS_FILE_NAME):
+    # Um byte por evento, anexado com O_APPEND: seguro entre processos e barato de contar
+    try:
+        fd = os.open(os.path.join(cache_dir, file_name), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, event)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+
+def _read_from(path, offset=0):
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return f.read()
+    except OSError:
+        return b""
+
+
+def stats_snapshot(cache_dir):
+    """
+    Posição atual dos logs de estatísticas, para read_stats(cache_dir, since=snapshot)
+    contar apenas os eventos gravados depois dela.
+    """
+    snapshot = {}
+    for file_name in (STATS_FILE_NAME, COMPILE_TIMES_FILE_NAME):
+        try:
+            stat = os.stat(os.path.join(cache_dir, file_name))
+            snapshot[file_name] = (stat.st_ino, stat.st_size)
+        except OSError:
+            snapshot[file_name] = None
+    return snapshot
+
+
+def _read_log(cache_dir, file_name, since):
+    path = os.path.join(cache_dir, file_name)
+    mark = since.get(file_name) if since is not None else None
+    if mark is None:
+        return _read_from(path)
+    inode, offset = mark
+    if _inode(path) == inode:
+        return _read_from(path, offset)
+    # O log foi rotacionado depois do snapshot: o começo do intervalo está no arquivo antigo
+    rotated_path = path + ROTATED_SUFFIX
+    previous = _read_from(rotated_path, offset) if _inode(rotated_path) == inode else b""
+    return previous + _read_from(path)
+
+
+def read_stats(cache_dir, since=None):
+    """
+    Args:
+        since (dict): Resultado de stats_snapshot; só os eventos posteriores a ele são contados.
+                      Se None, conta tudo desde a última rotação dos logs.
+
+    Returns:
+        dict: {"hits", "misses", "hit_rate", "compile_seconds"} de todos os processos que usaram o
+              cache no intervalo (inclusive execuções simultâneas com o mesmo cache_dir);
+              compile_seconds é o tempo gasto compilando LaTeX nas faltas.
+    """
+    data = _read_log(cache_dir, STATS_FILE_NAME, since)
+    hits = data.count(b"h")
+    misses = data.count(b"m")
+    total = hits + misses
+    try:
+        # Cada linha é gravada inteira com O_APPEND, então o snapshot sempre cai no fim de uma linha
+        compile_seconds = sum(float(line) for line in _read_log(cache_dir, COMPILE_TIMES_FILE_NAME, since).splitlines()
+                              if line.strip())
+    except ValueError:
+        compile_seconds = 0.0
+    return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0,
+            "compile_seconds": compile_seconds}
+
+
+def rotate_stats(cache_dir, max_bytes=STATS_MAX_BYTES):
+    """
+    Renomeia para '.old' (substituindo a rotação anterior) os logs de estatísticas maiores que
+    max_bytes; os processos seguintes passam a gravar em arquivos novos.
+
+    Returns:
+        int: Número de logs rotacionados.
+    """
+    rotated = 0
+    for file_name in (STATS_FILE_NAME, COMPILE_TIMES_FILE_NAME):
+        path = os.path.join(cache_dir, file_name)
+        try:
+            if os.path.getsize(path) <= max_bytes:
+                continue
+            os.replace(path, path + ROTATED_SUFFIX)
+            rotated += 1
+        except OSError:
+            continue
+    return rotated
+
+
+def reset_stats(cache_dir):
+    for file_name in (STATS_FILE_NAME, COMPILE_TIMES_FILE_NAME):
+        for stats_path in (os.path.join(cache_dir, file_name), os.path.join(cache_dir, file_name + ROTATED_SUFFIX)):
+            if os.path.exists(stats_path):
+                os.remove(stats_path)
+
+
+def install(cache_dir, max_size_bytes=512 * 1024 ** 2):
+    """
+    Substitui tex_to_svg_file do Manim por uma versão que consulta o cache compartilhado.
+    Pode ser chamada várias vezes no mesmo processo; apenas a primeira tem efeito.
+    """
+    if cache_dir in _installed:
+        return _installed[cache_dir]
+
+    from manim import config
+    from manim.mobject.text import tex_mobject
+    from manim.utils import tex_file_writing
+
+    # Há muitos SVGs pequenos: a evicção (que varre o diretório) roda a cada 50 inserções
+    cache = RenderCache(cache_dir, max_size_bytes, suffix=".svg", evict_interval=50)
+    original_tex_to_svg_file = tex_file_writing.tex_to_svg_file
+
+    def cached_tex_to_svg_file(expression, environment=None, tex_template=None):
+        template = tex_template if tex_template is not None else config.tex_template
+        key = make_tex_key(expression, environment, template)
+        # O SVG é copiado para a pasta Tex do próprio job: uma evicção concorrente não o afeta
+        local_path = os.path.join(config.get_dir("tex_dir"), f"{key}.svg")
+        if cache.materialize(key, local_path):
+            _record(cache_dir, b"h")
+            return Path(local_path)
+        _record(cache_dir, b"m")
+        start_time = time.perf_counter()
+        svg_path = original_tex_to_svg_file(expression, environment, tex_template)
+        # Uma linha por compilação; escritas pequenas com O_APPEND não se misturam entre processos
+        _record(cache_dir, f"{time.perf_counter() - start_time:.6f}\n".encode('ascii'), COMPILE_TIMES_FILE_NAME)
+        cache.put(key, str(svg_path))
+        return svg_path
+
+    tex_file_writing.tex_to_svg_file = cached_tex_to_svg_file
+    # tex_mobject importa a função pelo nome; é preciso trocar a referência lá também
+    tex_mobject.tex_to_svg_file = cached_tex_to_svg_file
+    _installed[cache_dir] = cache
+    return cache
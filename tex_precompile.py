@@ -0,0 +1,263 @@
+# tex_precompile.py
+# Pré-compilação do LaTeX das equações, um documento por arquivo .tex.
+#
+# Cada MathTex do Manim roda latex e dvisvgm separadamente: um arquivo com 300 equações custa
+# 600 processos. Aqui todas as equações de um documento viram páginas de um único documento
+# LaTeX (uma página por equação, recortada pelo pacote preview, como faz o standalone[preview]
+# do template do Manim), compilado uma vez; um único dvisvgm gera um SVG por página. Os SVGs
+# são gravados no cache de tex_cache.py com a mesma chave que o MathTex usaria, então as cenas
+# os encontram prontos e não chamam o LaTeX.
+#
+# Executado pelo Animator em um processo próprio, que importa o Manim uma única vez:
+#     python tex_precompile.py <job.json>
+# O job é {"cache_dir", "max_size_bytes", "workers", "timeout", "documents": [[expressão, ...], ...]}
+# e o resumo {"documents", "equations", "seeded", "cached", "failed", "latex_runs"} é impresso
+# em JSON na última linha da saída.
+import bisect
+import concurrent.futures
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import tex_cache
+from render_cache import RenderCache
+
+logger = logging.getLogger(__name__)
+
+# Substitui o \documentclass[preview]{standalone} do template: o standalone junta o documento
+# inteiro em uma página, e com o pacote preview cada ambiente preview vira uma página recortada
+PAGED_DOCUMENT_CLASS = "\\documentclass{article}\n\\usepackage[active,tightpage]{preview}"
+_PAGE_FILE_PATTERN = re.compile(r'^page-(\d+)\.svg$')
+_ERROR_LINE_PATTERN = re.compile(r'^l\.(\d+)', re.MULTILINE)
+
+
+class _CapturedTexCall(Exception):
+    """Interrompe o MathTex no momento em que ele chamaria o LaTeX."""
+
+
+def capture_tex_calls(expressions):
+    """
+    Constrói um MathTex para cada expressão, como o módulo de cena genérico, e captura os
+    argumentos que ele passaria a tex_to_svg_file, sem compilar. Assim a expressão final
+    (após os ajustes do próprio Manim), o ambiente e o template são exatamente os da cena.
+
+    Returns:
+        list: (expressão, ambiente, template) por expressão, ou None se o MathTex falhar antes.
+    """
+    from manim import MathTex, config
+    from manim.mobject.text import tex_mobject
+    from manim.utils import tex_file_writing
+
+    def capture(expression, environment=None, tex_template=None):
+        raise _CapturedTexCall(expression, environment, tex_template if tex_template is not None else config.tex_template)
+
+    originals = (tex_file_writing.tex_to_svg_file, tex_mobject.tex_to_svg_file)
+    tex_file_writing.tex_to_svg_file = tex_mobject.tex_to_svg_file = capture
+    calls = []
+    try:
+        for expression in expressions:
+            try:
+                MathTex(expression)
+                calls.append(None)
+            except _CapturedTexCall as captured:
+                calls.append(captured.args)
+            except Exception as e:
+                logger.debug(f"MathTex falhou antes da compilação ({e}); a equação será compilada na cena.")
+                calls.append(None)
+    finally:
+        tex_file_writing.tex_to_svg_file, tex_mobject.tex_to_svg_file = originals
+    return calls
+
+
+def build_paged_document(calls, template):
+    """
+    Monta o documento com uma página por (expressão, ambiente).
+
+    Returns:
+        tuple: (código LaTeX, linha inicial de cada página) ou None se o template não for o
+               standalone[preview] padrão do Manim.
+    """
+    documentclass = getattr(template, "documentclass", "")
+    body = template.body
+    if "standalone" not in documentclass or "preview" not in documentclass or body.count(template.placeholder_text) != 1:
+        return None
+    prefix, suffix = body.split(template.placeholder_text)
+    if documentclass not in prefix:
+        return None
+
+    parts = [prefix.replace(documentclass, PAGED_DOCUMENT_CLASS)]
+    page_lines = []
+    line = parts[0].count("\n") + 1
+    for expression, environment in calls:
+        # O trecho do ambiente é o mesmo que o template geraria para a expressão sozinha
+        block = template.get_texcode_for_expression_in_env(expression, environment)[len(prefix):-len(suffix) or None]
+        page = f"\\begin{{preview}}\n{block}\n\\end{{preview}}\n"
+        page_lines.append(line)
+        parts.append(page)
+        line += page.count("\n")
+    parts.append(suffix)
+    return "".join(parts), page_lines
+
+
+def _compile_command(template, tex_file, work_dir):
+    # Mesmas flags que o Manim usa em tex_file_writing.compile_tex
+    compiler, output_format = template.tex_compiler, template.output_format
+    if compiler in ("latex", "pdflatex", "luatex", "lualatex"):
+        return [compiler, "-interaction=batchmode", f"-output-format={output_format[1:]}",
+                f"-output-directory={work_dir}", tex_file]
+    if compiler == "xelatex":
+        return [compiler, *(["-no-pdf"] if output_format == ".xdv" else []), "-interaction=batchmode",
+                f"-output-directory={work_dir}", tex_file]
+    raise ValueError(f"Compilador LaTeX '{compiler}' não suportado na pré-compilação.")
+
+
+def _failed_pages(log_path, page_lines):
+    # Cada erro do LaTeX no log traz a linha do documento ('l.123'); ela identifica a página
+    try:
+        with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+            log = f.read()
+    except OSError:
+        return set()
+    return {bisect.bisect_right(page_lines, int(number)) - 1 for number in _ERROR_LINE_PATTERN.findall(log)} - {-1}
+
+
+def compile_pages(calls, template, work_dir, timeout=None):
+    """
+    Compila as páginas em uma execução do LaTeX e uma do dvisvgm. Se alguma equação tiver erro,
+    ela é retirada e o documento é recompilado uma vez sem ela.
+
+    Returns:
+        tuple: ({índice: caminho do SVG}, índices que falharam, execuções do LaTeX)
+    """
+    remaining = list(range(len(calls)))
+    failed = set()
+    latex_runs = 0
+    for attempt in range(2):
+        document = build_paged_document([calls[index] for index in remaining], template)
+        if document is None:
+            logger.warning("Template LaTeX diferente do standalone[preview] do Manim; pré-compilação ignorada.")
+            return {}, set(range(len(calls))), latex_runs
+        source, page_lines = document
+        tex_file = os.path.join(work_dir, f"document_{attempt}.tex")
+        with open(tex_file, 'w', encoding='utf-8') as f:
+            f.write(source)
+
+        latex_runs += 1
+        result = subprocess.run(_compile_command(template, tex_file, work_dir), cwd=work_dir,
+                                capture_output=True, timeout=timeout)
+        bad_pages = _failed_pages(os.path.splitext(tex_file)[0] + ".log", page_lines)
+        if result.returncode == 0 and not bad_pages:
+            break
+        if not bad_pages or attempt == 1:
+            # Erro sem linha identificável (ou persistente): as cenas compilam essas equações sozinhas
+            return {}, failed | set(remaining), latex_runs
+        failed.update(remaining[page] for page in bad_pages)
+        remaining = [index for page, index in enumerate(remaining) if page not in bad_pages]
+        if not remaining:
+            return {}, failed, latex_runs
+
+    output_file = os.path.splitext(tex_file)[0] + template.output_format
+    pages_dir = os.path.join(work_dir, "pages")
+    os.makedirs(pages_dir, exist_ok=True)
+    subprocess.run(["dvisvgm", *(["--pdf"] if template.output_format == ".pdf" else []), "--page=1-", "-n", "-v", "0",
+                    "-o", os.path.join(pages_dir, "page-%p.svg"), output_file],
+                   cwd=work_dir, capture_output=True, timeout=timeout, check=True)
+
+    pages = {}
+    for name in os.listdir(pages_dir):
+        match = _PAGE_FILE_PATTERN.match(name)
+        if match:
+            pages[int(match.group(1))] = os.path.join(pages_dir, name)
+    if sorted(pages) != list(range(1, len(remaining) + 1)):
+        # Uma equação que ocupou mais de uma página desalinharia todas as seguintes
+        logger.warning(f"O dvisvgm gerou {len(pages)} página(s) para {len(remaining)} equação(ões); SVGs descartados.")
+        return {}, failed | set(remaining), latex_runs
+    return {index: pages[page + 1] for page, index in enumerate(remaining)}, failed, latex_runs
+
+
+def precompile_document(expressions, cache, timeout=None, captured_calls=None):
+    """
+    Pré-compila as equações de um documento e grava os SVGs no cache.
+
+    Args:
+        captured_calls (list): Resultado de capture_tex_calls(expressions), se já disponível.
+
+    Returns:
+        dict: {"equations", "seeded", "cached", "failed", "latex_runs"}
+    """
+    if captured_calls is None:
+        captured_calls = capture_tex_calls(expressions)
+    summary = {"equations": len(expressions), "seeded": 0, "cached": 0, "failed": 0, "latex_runs": 0}
+    calls, keys = [], []
+    for call in captured_calls:
+        if call is None:
+            summary["failed"] += 1
+            continue
+        expression, environment, template = call
+        key = tex_cache.make_tex_key(expression, environment, template)
+        if cache.contains(key) or key in keys:
+            summary["cached"] += 1
+            continue
+        calls.append(call)
+        keys.append(key)
+    if not calls:
+        return summary
+
+    # Todas as expressões de um documento usam o mesmo template (o config.tex_template do Manim)
+    template = calls[0][2]
+    work_dir = tempfile.mkdtemp(prefix="tex_precompile_")
+    start_time = time.perf_counter()
+    try:
+        svg_paths, failed, summary["latex_runs"] = compile_pages([call[:2] for call in calls], template, work_dir, timeout)
+        for index, svg_path in svg_paths.items():
+            cache.put(keys[index], svg_path)
+        summary["seeded"] += len(svg_paths)
+        summary["failed"] += len(failed)
+    except (OSError, ValueError, subprocess.SubprocessError) as e:
+        logger.warning(f"Falha na pré-compilação de {len(calls)} equação(ões): {e}")
+        summary["failed"] += len(calls)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        tex_cache._record(cache.cache_dir, f"{time.perf_counter() - start_time:.6f}\n".encode('ascii'),
+                          tex_cache.COMPILE_TIMES_FILE_NAME)
+    return summary
+
+
+def precompile(documents, cache_dir, max_size_bytes=512 * 1024 ** 2, workers=1, timeout=None):
+    """
+    Pré-compila cada documento (lista de expressões) em paralelo.
+
+    Returns:
+        dict: Totais de todos os documentos, mais "documents".
+    """
+    cache = RenderCache(cache_dir, max_size_bytes, suffix=".svg", evict_interval=50)
+    # O MathTex não é seguro entre threads: as chamadas são capturadas antes, na thread principal
+    totals = {"documents": len(documents), "equations": 0, "seeded": 0, "cached": 0, "failed": 0, "latex_runs": 0}
+    prepared = [(expressions, capture_tex_calls(expressions)) for expressions in documents]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(precompile_document, expressions, cache, timeout, calls) for expressions, calls in prepared]
+        for future in futures:
+            for field, value in future.result().items():
+                totals[field] += value
+    return totals
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    with open(argv[0], 'r', encoding='utf-8') as f:
+        job = json.load(f)
+    summary = precompile(job["documents"], job["cache_dir"], job.get("max_size_bytes", 512 * 1024 ** 2),
+                         job.get("workers", 1), job.get("timeout"))
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
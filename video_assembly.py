@@ -0,0 +1,137 @@
+# video_assembly.py
+# Junta os vídeos das equações de um documento em um único vídeo, sem re-codificar.
+#
+# O caminho normal usa o concat demuxer do ffmpeg com cópia de streams (-c copy): os pacotes
+# de cada clipe são apenas copiados para o arquivo final, então juntar centenas de clipes
+# leva segundos. Isso só é válido quando todos os clipes têm o mesmo codec, resolução, formato
+# de pixel e taxa de quadros; caso contrário os clipes são normalizados pelo primeiro e
+# re-codificados com o filtro concat.
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import uuid
+
+logger = logging.getLogger(__name__)
+
+FFMPEG = "ffmpeg"
+FFPROBE = "ffprobe"
+
+# Campos que precisam ser iguais em todos os clipes para a cópia de streams
+_VIDEO_FIELDS = ("codec_name", "profile", "width", "height", "pix_fmt", "r_frame_rate", "time_base")
+_AUDIO_FIELDS = ("codec_name", "sample_rate", "channels")
+
+
+def probe_streams(path, ffprobe=FFPROBE):
+    """
+    Returns:
+        list: Um dict por stream do arquivo ({"codec_type", "codec_name", "width", ...}).
+    """
+    result = subprocess.run(
+        [ffprobe, "-v", "error", "-show_entries",
+         "stream=codec_type,codec_name,profile,width,height,pix_fmt,r_frame_rate,time_base,sample_rate,channels",
+         "-of", "json", path],
+        capture_output=True, text=True, check=True)
+    return json.loads(result.stdout or "{}").get("streams", [])
+
+
+def stream_signature(streams):
+    """Parâmetros de codificação relevantes para a concatenação, na ordem dos streams."""
+    signature = []
+    for stream in streams:
+        fields = _VIDEO_FIELDS if stream.get("codec_type") == "video" else _AUDIO_FIELDS
+        signature.append((stream.get("codec_type"),) + tuple(stream.get(field) for field in fields))
+    return tuple(signature)
+
+
+def find_incompatibility(paths, ffprobe=FFPROBE):
+    """
+    Compara os parâmetros de codificação dos clipes com os do primeiro.
+
+    Returns:
+        str | None: Descrição da primeira diferença encontrada, ou None se todos forem compatíveis.
+    """
+    reference = None
+    for path in paths:
+        signature = stream_signature(probe_streams(path, ffprobe))
+        if reference is None:
+            reference = signature
+        elif signature != reference:
+            return f"'{os.path.basename(path)}' difere de '{os.path.basename(paths[0])}': {signature} != {reference}"
+    return None
+
+
+def _write_concat_list(paths, list_path):
+    # Formato do concat demuxer; aspas simples no caminho são escritas como '\''
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write("ffconcat version 1.0\n")
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+
+def _copy_command(list_path, dest_path, ffmpeg):
+    return [ffmpeg, "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+            "-c", "copy", "-movflags", "+faststart", dest_path]
+
+
+def _reencode_command(paths, dest_path, reference, ffmpeg):
+    # Todos os clipes são levados à resolução e à taxa de quadros do primeiro (com barras se
+    # a proporção for diferente). Os clipes do Manim não têm áudio, então só o vídeo é mantido.
+    width, height = reference.get("width"), reference.get("height")
+    frame_rate = reference.get("r_frame_rate") or "30"
+    command = [ffmpeg, "-y", "-v", "error"]
+    for path in paths:
+        command += ["-i", path]
+    filters = []
+    for index in range(len(paths)):
+        filters.append(f"[{index}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                       f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={frame_rate},format=yuv420p[v{index}]")
+    filters.append("".join(f"[v{index}]" for index in range(len(paths))) + f"concat=n={len(paths)}:v=1:a=0[out]")
+    return command + ["-filter_complex", ";".join(filters), "-map", "[out]",
+                      "-c:v", "libx264", "-pix_fmt", "yuv420p", "-movflags", "+faststart", dest_path]
+
+
+def concat_videos(paths, dest_path, ffmpeg=FFMPEG, ffprobe=FFPROBE, timeout=None):
+    """
+    Concatena os vídeos na ordem recebida.
+
+    Args:
+        paths (list): Clipes a concatenar, na ordem do documento.
+        dest_path (str): Vídeo final; só é substituído quando a concatenação termina com sucesso.
+        timeout (float): Tempo máximo do ffmpeg, em segundos.
+
+    Returns:
+        str: "copy" se os streams foram copiados, "reencode" se foi preciso re-codificar.
+
+    Raises:
+        ValueError: Se paths estiver vazio.
+        subprocess.CalledProcessError / subprocess.TimeoutExpired: Se o ffmpeg ou o ffprobe falharem.
+    """
+    if not paths:
+        raise ValueError("Nenhum vídeo para concatenar.")
+    dest_dir = os.path.dirname(dest_path) or "."
+    os.makedirs(dest_dir, exist_ok=True)
+    temp_path = os.path.join(dest_dir, f".{uuid.uuid4().hex}.tmp{os.path.splitext(dest_path)[1]}")
+
+    incompatibility = find_incompatibility(paths, ffprobe)
+    list_fd, list_path = tempfile.mkstemp(prefix="concat_", suffix=".txt")
+    os.close(list_fd)
+    try:
+        if incompatibility is None:
+            mode = "copy"
+            _write_concat_list(paths, list_path)
+            command = _copy_command(list_path, temp_path, ffmpeg)
+        else:
+            mode = "reencode"
+            logger.warning(f"Clipes incompatíveis para cópia de streams ({incompatibility}). Re-codificando.")
+            reference = next((s for s in probe_streams(paths[0], ffprobe) if s.get("codec_type") == "video"), {})
+            command = _reencode_command(paths, temp_path, reference, ffmpeg)
+        subprocess.run(command, capture_output=True, text=True, check=True, timeout=timeout)
+        os.replace(temp_path, dest_path)
+        return mode
+    finally:
+        for path in (list_path, temp_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,457 @@
+# watch.py
+# Modo de observação: acompanha a pasta do projeto LaTeX e, a cada gravação, re-renderiza
+# apenas as equações novas ou alteradas do arquivo modificado.
+#
+# No Linux os eventos vêm do inotify (via ctypes, sem dependências); nos outros sistemas, ou se
+# o inotify não estiver disponível, a pasta é varrida periodicamente (mtime e tamanho). Várias
+# gravações seguidas (editores gravam em etapas) são agrupadas antes do processamento. As
+# equações do arquivo são comparadas com as da varredura anterior: as novas e as alteradas vão
+# para o Animator, e os vídeos das removidas são apagados do output_dir. Como o ID de uma
+# equação vem do hash do seu conteúdo, uma equação editada troca de ID; a troca é registrada
+# em output_dir/renamed_equations.json ({ID antigo: ID atual}).
+#
+# Uso: python watch.py <pasta do projeto> --recursive --output videos
+import argparse
+import ctypes
+import ctypes.util
+import difflib
+import fnmatch
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import uuid
+
+from animator import Animator
+from designer import Designer
+from equation_store import EquationStore
+from metrics import METRICS
+from reader import Reader
+
+logger = logging.getLogger(__name__)
+
+# Constantes de <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len (seguido do nome)
+RENAMES_FILE = "renamed_equations.json"
+
+
+def _matches(name, patterns):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def _list_files(directory, recursive, patterns):
+    """{caminho: (mtime_ns, tamanho)} dos arquivos que casam com patterns."""
+    files = {}
+    for current_dir, sub_dirs, names in os.walk(directory):
+        if not recursive:
+            sub_dirs.clear()
+        for name in names:
+            if not _matches(name, patterns):
+                continue
+            path = os.path.join(current_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files[path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+class InotifyWatcher:
+    """Observa a pasta com o inotify do Linux. Lança OSError se o inotify não estiver disponível."""
+
+    def __init__(self, directory, recursive=False, patterns=("*.tex",)):
+        self.directory = os.path.normpath(directory)
+        self.recursive = recursive
+        self.patterns = patterns
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1: {os.strerror(errno)}")
+        self._watches = {}  # {descritor do watch: diretório}
+        try:
+            self._add_tree(self.directory)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch('{directory}'): {os.strerror(errno)}")
+        self._watches[wd] = directory
+
+    def _add_tree(self, directory):
+        self._add_watch(directory)
+        if self.recursive:
+            for current_dir, sub_dirs, _ in os.walk(directory):
+                for sub_dir in sub_dirs:
+                    self._add_watch(os.path.join(current_dir, sub_dir))
+
+    def wait(self, timeout=None):
+        """
+        Espera por mudanças nos arquivos observados.
+
+        Returns:
+            set: Caminhos alterados, criados ou removidos (vazio se o tempo limite acabar).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if ready:
+                changed = self._read_events()
+                if changed:
+                    return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + name_length].rstrip(b'\0'))
+            offset += _EVENT_HEADER.size + name_length
+
+            if mask & _IN_Q_OVERFLOW:
+                # Eventos perdidos: todos os arquivos são tratados como alterados
+                logger.warning("Fila do inotify cheia; reprocessando todos os arquivos.")
+                changed.update(_list_files(self.directory, self.recursive, self.patterns))
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & _IN_IGNORED:
+                del self._watches[wd]
+                continue
+            path = os.path.join(directory, name) if name else directory
+            if mask & _IN_ISDIR:
+                if self.recursive and mask & (_IN_CREATE | _IN_MOVED_TO):
+                    # Pasta nova (ou movida para dentro do projeto): passa a ser observada
+                    try:
+                        self._add_tree(path)
+                    except OSError as e:
+                        logger.warning(f"Não foi possível observar '{path}': {e}")
+                    changed.update(_list_files(path, True, self.patterns))
+                elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                    changed.add(path)
+            elif _matches(name, self.patterns):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """Observa a pasta comparando mtime e tamanho dos arquivos a cada interval segundos."""
+
+    def __init__(self, directory, recursive=False, patterns=("*.tex",), interval=1.0):
+        self.directory = os.path.normpath(directory)
+        self.recursive = recursive
+        self.patterns = patterns
+        self.interval = interval
+        self._state = _list_files(self.directory, recursive, patterns)
+
+    def wait(self, timeout=None):
+        """Mesma interface de InotifyWatcher.wait."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            sleep_time = self.interval if deadline is None else min(self.interval, max(0.0, deadline - time.monotonic()))
+            time.sleep(sleep_time)
+            state = _list_files(self.directory, self.recursive, self.patterns)
+            changed = {path for path in state.keys() | self._state.keys() if state.get(path) != self._state.get(path)}
+            self._state = state
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+
+    def close(self):
+        pass
+
+
+def create_watcher(directory, recursive=False, patterns=("*.tex",), poll_interval=1.0, force_polling=False):
+    """InotifyWatcher no Linux; PollingWatcher nos outros sistemas ou se o inotify falhar."""
+    if not force_polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory, recursive, patterns)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify indisponível ({e}); observando a pasta por varredura periódica.")
+    return PollingWatcher(directory, recursive, patterns, poll_interval)
+
+
+def _document_order(equations):
+    return sorted(equations, key=lambda eq_id: equations[eq_id][1].get("offset") or 0)
+
+
+def diff_equations(old, new):
+    """
+    Compara as equações de um arquivo entre duas varreduras ({eq_id: (linhas, origem)}).
+
+    Os IDs estáveis vêm do conteúdo, então uma equação editada aparece com outro ID. As
+    sequências de IDs (na ordem do documento) são alinhadas como em um diff: dentro de um
+    trecho substituído, a k-ésima equação antiga e a k-ésima nova do mesmo ambiente formam uma
+    alteração; o que sobra são equações novas ou removidas. Mudar só a posição não conta.
+
+    Returns:
+        tuple: (novas, alteradas, removidas); novas e removidas são listas de IDs e alteradas é
+               uma lista de (ID antigo, ID novo), iguais quando só o ambiente mudou.
+    """
+    old_ids, new_ids = _document_order(old), _document_order(new)
+    added, modified, removed = [], [], []
+    matcher = difflib.SequenceMatcher(None, old_ids, new_ids, autojunk=False)
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == "equal":
+            modified += [(eq_id, eq_id) for eq_id in old_ids[old_start:old_end]
+                         if old[eq_id][1].get("environment") != new[eq_id][1].get("environment")]
+            continue
+        # Pares por ambiente, na ordem do documento: (ambiente, ordinal) identifica o bloco editado
+        unmatched_old = {}
+        for eq_id in old_ids[old_start:old_end]:
+            unmatched_old.setdefault(old[eq_id][1].get("environment"), []).append(eq_id)
+        for eq_id in new_ids[new_start:new_end]:
+            candidates = unmatched_old.get(new[eq_id][1].get("environment"))
+            if candidates:
+                modified.append((candidates.pop(0), eq_id))
+            else:
+                added.append(eq_id)
+        removed += [eq_id for candidates in unmatched_old.values() for eq_id in candidates]
+    # Uma equação que só mudou de lugar existe nas duas varreduras, mas o alinhamento pode
+    # tê-la dado como nova, removida ou par de uma alteração
+    pairs = []
+    for old_id, new_id in modified:
+        if old_id == new_id or (old_id not in new and new_id not in old):
+            pairs.append((old_id, new_id))
+        elif old_id not in new:
+            removed.append(old_id)
+        elif new_id not in old:
+            added.append(new_id)
+    return [eq_id for eq_id in added if eq_id not in old], pairs, [eq_id for eq_id in removed if eq_id not in new]
+
+
+class ProjectWatcher:
+    """
+    Mantém o output_dir sincronizado com o projeto LaTeX enquanto ele é editado.
+
+    Args:
+        project_dir (str): Pasta do projeto LaTeX.
+        reader, designer, animator: Instâncias configuradas (padrão: construtores sem argumentos).
+                                    O Reader precisa de IDs estáveis (stable_ids=True), para que
+                                    as equações não alteradas mantenham o ID entre as varreduras.
+        output_dir (str): Pasta dos vídeos.
+        recursive (bool): Observa também os subdiretórios.
+        debounce (float): Segundos sem novos eventos antes de processar um grupo de gravações.
+        poll_interval (float): Intervalo da varredura periódica (quando o inotify não é usado).
+        force_polling (bool): Usa a varredura periódica mesmo no Linux.
+    """
+
+    def __init__(self, project_dir, reader=None, designer=None, animator=None, output_dir="generated_animations_final",
+                 recursive=False, debounce=0.5, poll_interval=1.0, force_polling=False):
+        self.reader = reader or Reader()
+        if not self.reader.stable_ids:
+            raise ValueError("O modo de observação requer Reader(stable_ids=True).")
+        self.designer = designer or Designer()
+        self.animator = animator or Animator()
+        self.project_dir = os.path.normpath(project_dir)
+        self.output_dir = output_dir
+        self.recursive = recursive
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.force_polling = force_polling
+        self.equations = {}  # {arquivo .tex: {eq_id: (linhas, origem)}} da última varredura
+        self._stop_event = threading.Event()
+
+    def initial_scan(self):
+        """Varre o projeto inteiro e renderiza tudo (o cache de renderização evita refazer o que não mudou)."""
+        tex_files = self.reader.get_tex_files(self.project_dir, recursive=self.recursive)
+        self.equations = {}
+        for eq_id, eq_lines, location in self.reader.iter_equations(tex_files):
+            self.equations.setdefault(location["file"], {})[eq_id] = (eq_lines, location)
+        pending = {eq_id: entry for equations in self.equations.values() for eq_id, entry in equations.items()}
+        logger.info(f"Observando '{self.project_dir}': {len(self.equations)} arquivo(s), {len(pending)} equação(ões).")
+        self._render(pending, set(self.equations))
+
+    def process_changes(self, paths):
+        """
+        Reprocessa os arquivos alterados: renderiza as equações novas ou alteradas, remove os
+        vídeos das equações que sumiram e registra os IDs das equações editadas.
+
+        Returns:
+            dict: {"added", "modified", "removed"}, listas de IDs (alteradas com o ID atual), e
+                  "renamed", {ID antigo: ID atual} das equações editadas.
+        """
+        start_time = time.monotonic()
+        changed_files = {os.path.normpath(path) for path in paths if _matches(os.path.basename(path), ("*.tex",))}
+        # Arquivos que sumiram (ex: pasta removida ou movida) também contam como alterados
+        changed_files.update(tex_file for tex_file in self.equations if not os.path.exists(tex_file))
+
+        changes = {"added": [], "modified": [], "removed": [], "renamed": {}}
+        pending = {}
+        affected_files = set()
+        for tex_file in sorted(changed_files):
+            old = self.equations.get(tex_file, {})
+            new = {}
+            if os.path.exists(tex_file):
+                for eq_id, eq_lines, location in self.reader.iter_equations([tex_file]):
+                    new[eq_id] = (eq_lines, location)
+            if new:
+                self.equations[tex_file] = new
+            else:
+                self.equations.pop(tex_file, None)
+
+            added, modified, removed = diff_equations(old, new)
+            if not (added or modified or removed):
+                logger.debug(f"'{tex_file}': nenhuma equação mudou.")
+                continue
+            logger.info(f"'{tex_file}': {len(added)} nova(s), {len(modified)} alterada(s), {len(removed)} removida(s).")
+            changes["added"] += added
+            changes["modified"] += [new_id for _, new_id in modified]
+            changes["removed"] += removed
+            changes["renamed"].update((old_id, new_id) for old_id, new_id in modified if old_id != new_id)
+            pending.update((eq_id, new[eq_id]) for eq_id in added + [new_id for _, new_id in modified])
+            affected_files.add(tex_file)
+
+        # Os vídeos com o ID antigo de uma equação editada saem junto com os das removidas
+        stale_ids = changes["removed"] + list(changes["renamed"])
+        if stale_ids:
+            self.animator.remove_equation_outputs(stale_ids, self.output_dir)
+        if changes["renamed"] or changes["removed"]:
+            self._record_renames(changes["renamed"], changes["removed"])
+        if affected_files:
+            self._render(pending, affected_files)
+            elapsed = time.monotonic() - start_time
+            METRICS.observe("watch_update_seconds", elapsed)
+            logger.info(f"Atualização concluída em {elapsed:.1f} s.")
+        return changes
+
+    def _record_renames(self, renamed, removed):
+        """
+        Atualiza output_dir/renamed_equations.json: cada ID antigo aponta para o ID atual da
+        equação (uma equação editada várias vezes não deixa cadeias) e os IDs que apontam para
+        uma equação removida saem do registro.
+        """
+        path = os.path.join(self.output_dir, RENAMES_FILE)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                renames = json.load(f)
+        except (OSError, ValueError):
+            renames = {}
+        renames = {old_id: renamed.get(current_id, current_id) for old_id, current_id in renames.items()}
+        renames.update(renamed)
+        removed = set(removed)
+        renames = {old_id: current_id for old_id, current_id in renames.items()
+                   if current_id not in removed and old_id != current_id}
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(renames, f, indent=4, ensure_ascii=False, sort_keys=True)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _render(self, pending, affected_files):
+        # Os vídeos dos documentos afetados são remontados com todas as equações do arquivo
+        document_locations = {eq_id: location for tex_file in affected_files
+                              for eq_id, (_, location) in self.equations.get(tex_file, {}).items()}
+        if pending:
+            store = EquationStore()
+            for eq_id, (eq_lines, location) in pending.items():
+                store.add(eq_id, eq_lines, location)
+            setups = self.designer.set_deafult_anim(store)
+            self.animator.generate_all_scenes(store, setups, self.output_dir, equation_locations=document_locations)
+        elif self.animator.assemble_documents and not self.animator.preview:
+            self.animator.assemble_document_videos(document_locations, self.output_dir)
+
+        for tex_file in affected_files - set(self.equations):
+            self._remove_document_video(tex_file)
+
+    def _remove_document_video(self, tex_file):
+        # Só quando nenhum outro arquivo observado tem o mesmo nome (ver Animator._document_names)
+        name = os.path.splitext(os.path.basename(tex_file))[0]
+        if any(os.path.splitext(os.path.basename(other))[0] == name for other in self.equations):
+            return
+        document_path = os.path.join(self.output_dir, 'documents', f'{name}.mp4')
+        if os.path.exists(document_path):
+            os.remove(document_path)
+            logger.info(f"Vídeo do documento removido: {document_path}")
+
+    def run(self):
+        """Varre o projeto e processa as mudanças até stop() ou Ctrl-C."""
+        self._stop_event.clear()
+        self.initial_scan()
+        watcher = create_watcher(self.project_dir, self.recursive, poll_interval=self.poll_interval,
+                                 force_polling=self.force_polling)
+        logger.info(f"Aguardando alterações ({type(watcher).__name__}). Ctrl-C para sair.")
+        try:
+            while not self._stop_event.is_set():
+                # Tempo limite curto para que stop() seja atendido
+                changed = watcher.wait(timeout=1.0)
+                if not changed:
+                    continue
+                # Agrupa as gravações em sequência até debounce segundos sem eventos
+                while True:
+                    more = watcher.wait(timeout=self.debounce)
+                    if not more:
+                        break
+                    changed |= more
+                self.process_changes(changed)
+        except KeyboardInterrupt:
+            logger.info("Observação encerrada.")
+        finally:
+            watcher.close()
+            self.animator.shutdown_render_pool()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-renderiza as equações alteradas a cada gravação dos arquivos .tex.")
+    parser.add_argument("project_dir", help="Pasta do projeto LaTeX.")
+    parser.add_argument("--output", default="generated_animations_final", help="Pasta dos vídeos.")
+    parser.add_argument("--recursive", action="store_true", help="Inclui os subdiretórios.")
+    parser.add_argument("--debounce", type=float, default=0.5, help="Segundos sem gravações antes de atualizar.")
+    parser.add_argument("--poll", action="store_true", help="Usa varredura periódica em vez do inotify.")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Intervalo da varredura periódica, em segundos.")
+    parser.add_argument("--workers", type=int, default=1, help="Processos do Manim simultâneos.")
+    parser.add_argument("--batch-size", type=int, default=1, help="Equações por processo do Manim.")
+    parser.add_argument("--assemble", action="store_true", help="Mantém também o vídeo de cada documento.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-7s %(name)s: %(message)s", datefmt="%H:%M:%S")
+    animator = Animator(render_workers=args.workers, batch_size=args.batch_size, assemble_documents=args.assemble)
+    watcher = ProjectWatcher(args.project_dir, reader=Reader(index_path=".scan_index.json"), animator=animator,
+                             output_dir=args.output, recursive=args.recursive, debounce=args.debounce,
+                             poll_interval=args.poll_interval, force_polling=args.poll)
+    watcher.run()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())